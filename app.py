@@ -8,6 +8,27 @@ import plotly.express as px
 import plotly.graph_objects as go
 from sklearn.linear_model import LinearRegression
 import numpy as np
+import os
+import time
+from staffing import optimize_employees_milp, optimize_employees_rule_based, unmet_hours_frame, StaffingParameters, derive_forecast_staff, SWEEP_PARAMETERS, OPERATION_COLUMNS
+from forecasting import FORECASTERS, MONTH_NUMBERS, SITE_COLUMN, DEFAULT_SITE, RunningLinearTrend, forecast_series, series_from_frame, backtest_matrix, select_best_models, bootstrap_forecast_paths, prediction_intervals
+from sensitivity import sweep_staffing, sensitivity_heatmap, tornado_table
+from data_store import SharedStore, content_hash, object_size
+from jobs import JobRunner, hedged_call
+from telemetry import Telemetry
+from exports import EXPORT_FORMATS, export_tables
+from streaming_stats import AppendOnlyCovariance
+from tables import DEFAULT_PAGE_SIZE, TableIndex, with_numeric_values
+from run_history import RunHistory
+from history_store import HistoryStore
+from forecast_cache import ForecastCache
+from dashboards import add_interval_band, executive_dashboard, operation_trend_chart
+from reports import REPORT_FORMATS, archive_reports, generate_reports
+from shifts import WEEKDAYS, ShiftParameters, compute_shift_plan, monthly_headcount, optimize_employees_queueing
+from hierarchy import RECONCILIATION_METHODS, Hierarchy, hierarchical_forecast, forecast_frame
+from differences import changed_cells, diff_frame, differences_markdown, missing_rows
+from diagnostics import TOTAL_OPERATIONS, fit_pairwise_regressions, regression_matrix, pair_values
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 env = dotenv_values(".env")
 if "OPENAI_API_KEY" in st.secrets:
@@ -36,11 +57,123 @@ div[data-testid="stDataFrame"] td {
 </style>
 """, unsafe_allow_html=True)
 
-# Кэшируем загрузку данных для оптимизации производительности
-@st.cache_data
-def load_data():
+# Замеры времени и памяти по этапам перезапуска (общие для всех сессий).
+# tracemalloc действует на весь процесс, поэтому учет аллокаций - настройка приложения (TRACK_ALLOCATIONS=1 в .env
+# или окружении), а не переключатель сессии
+TRACK_ALLOCATIONS = (env.get("TRACK_ALLOCATIONS") or os.environ.get("TRACK_ALLOCATIONS", "")).lower() in ("1", "true", "yes")
+
+@st.cache_resource
+def get_telemetry():
+    Telemetry.set_allocation_tracking(TRACK_ALLOCATIONS)
+    return Telemetry()
+
+telemetry = get_telemetry()
+rerun_started = time.perf_counter()
+
+def rerun():
+    """
+    Перезапуск скрипта: длительность прерванного прохода записывается до st.rerun(), иначе она теряется
+    """
+    telemetry.record('rerun.total', time.perf_counter() - rerun_started)
+    st.rerun()
+
+# Общее для всех сессий хранилище данных и производных результатов - сессии держат только ключи
+@st.cache_resource
+def get_shared_store():
+    return SharedStore()
+
+# Фоновые задачи оптимизации и прогноза - выполняются вне потока скрипта и переживают перезапуски;
+# одинаковые одновременные запросы разных сессий получают одну и ту же задачу
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(max_workers=4)
+
+# История запусков оптимизации и прогноза - локальная база, переживающая сессии и перезапуски
+RUN_HISTORY_PATH = "run_history.sqlite"
+
+@st.cache_resource
+def get_run_history():
+    return RunHistory(RUN_HISTORY_PATH)
+
+# Постоянный кэш прогнозов - одинаковые запросы любых сессий не пересчитываются
+FORECAST_CACHE_PATH = "forecast_cache.sqlite"
+FORECAST_CACHE_VERSION = 3  # Увеличивается при изменении вида результатов - старые записи не используются
+
+@st.cache_resource
+def get_forecast_cache():
+    return ForecastCache(FORECAST_CACHE_PATH)
+
+shared_store = get_shared_store()
+job_runner = get_job_runner()
+run_history = get_run_history()
+forecast_cache = get_forecast_cache()
+run_ctx = get_script_run_ctx()
+session_id = run_ctx.session_id if run_ctx else "local"
+shared_store.touch(session_id)
+shared_store.collect()
+
+# Функции для хранения результатов сессии в общем хранилище
+def set_session_artifacts(name, values, kinds):
+    """
+    Сохраняет объекты в общее хранилище, а в session_state - только их ключи
+    """
+    keys = tuple(shared_store.put(value, kind) for value, kind in zip(values, kinds)) if values is not None else None
+    st.session_state[name] = keys
+    shared_store.attach(session_id, name, keys)
+
+def get_session_artifacts(name):
+    """
+    Возвращает объекты сессии из общего хранилища (None, если их нет).
+    Артефакты, удаленные после долгого простоя сессии, восстанавливаются или сессия получает сообщение
+    """
+    keys = st.session_state.get(name)
+    if keys is None:
+        return None
+    if not all(key in shared_store for key in keys):
+        if not restore_session_artifacts(name):
+            return None
+        keys = st.session_state[name]
+    # Ссылка сессии обновляется при каждом обращении - после возврата сессии артефакты снова под защитой
+    shared_store.attach(session_id, name, keys)
+    return shared_store.get_many(keys)
+
+# Артефакты прогноза сессии (восстанавливаются из постоянного кэша прогнозов)
+FORECAST_ARTIFACTS = ('forecast_data', 'forecast_backtest', 'forecast_intervals')
+
+def restore_session_artifacts(name):
+    """
+    Восстанавливает артефакты, удаленные из общего хранилища: прогноз - из постоянного кэша,
+    иначе прогноз пересчитывается заново (или сбрасывается, если был загружен из истории) с сообщением.
+    Возвращает True, если артефакты снова доступны
+    """
+    if name in FORECAST_ARTIFACTS:
+        cache_key = st.session_state.get('forecast_cache_key')
+        cached_forecast = forecast_cache.get(cache_key) if cache_key else None
+        if cached_forecast is not None:
+            store_forecast_result(cached_forecast)
+            return True
+        for forecast_name in FORECAST_ARTIFACTS:
+            st.session_state[forecast_name] = None
+        if cache_key:
+            st.info("The forecast was released from memory after a long period of inactivity and is being recomputed.")
+        else:
+            st.session_state.show_forecast = False
+            st.warning("The forecast loaded from run history was released from memory after a long period "
+                       "of inactivity - please load it again.")
+        return False
+    st.session_state[name] = None
+    st.warning("Some results of this session were released from memory after a long period of inactivity - "
+               "please run them again.")
+    return False
+
+# История площадок на диске (memmap площадка x период x колонка) - строится из Excel один раз,
+# сессии отображают в память только срез выбранной площадки
+HISTORY_STORE_PATH = "history_store"
+SOURCE_DATA_PATH = "df.xlsx"
+
+def read_source_data():
     # Загружаем данные из Excel файла
-    df = pd.read_excel("df.xlsx")
+    df = pd.read_excel(SOURCE_DATA_PATH)
     # Используем первую строку как заголовки колонок
     df.columns = df.iloc[0]  
     # Удаляем первую строку, которая стала заголовками
@@ -49,48 +182,116 @@ def load_data():
     df = df.reset_index(drop=True)  
     return df
 
+@st.cache_resource
+def get_history_store():
+    # Перестраиваем хранилище, если его нет или исходный файл изменился
+    if HistoryStore.is_stale(HISTORY_STORE_PATH, SOURCE_DATA_PATH):
+        HistoryStore.from_frame(HISTORY_STORE_PATH, read_source_data())
+    return HistoryStore(HISTORY_STORE_PATH)
+
+# Кэшируем загрузку данных для оптимизации производительности
+# (cache_resource - один экземпляр таблицы площадки на процесс вместо копии на каждый перезапуск)
+@st.cache_resource(max_entries=16)
+def load_data(site):
+    return get_history_store().frame(site)
+
+# Результаты оптимизации и прогноза относятся к одной площадке - при смене площадки сбрасываются
+def reset_site_results():
+    """
+    Очищает результаты и отвязывает незавершенные задачи прежней площадки. Сами задачи не отменяются:
+    одна задача может быть общей для нескольких сессий, ее результат остается в их распоряжении
+    """
+    for name in ('optimization_data', 'optimization_source', 'ai_optimization', 'optimization_job', 'optimization_run_id',
+                 'forecast_job', 'forecast_cache_key', 'last_calculated_month'):
+        st.session_state[name] = None
+    st.session_state.show_optimization = False
+    st.session_state.show_forecast = False
+    for name in FORECAST_ARTIFACTS:
+        set_session_artifacts(name, None, ())
+    for name in ('optimized_df', 'ai_optimized_df'):
+        shared_store.attach(session_id, name, None)
+
 # Загружаем данные
-df = load_data()
+history_store = get_history_store()
+if len(history_store.sites) > 1:
+    selected_site = st.sidebar.selectbox("Site:", history_store.sites, key="selected_site", on_change=reset_site_results)
+else:
+    selected_site = history_store.sites[0]
+with telemetry.span('load_data'):
+    df_key = shared_store.put(load_data(selected_site), 'dataset', pinned=True)
+df = shared_store.get(df_key)
+shared_store.attach(session_id, 'df', df_key)
 
-# Выводим DataFrame на главную страницу с центрированием
-st.subheader("Warehouse Operations and Employee Data")
+# Индекс таблицы для постраничного показа - один на процесс для одинаковых данных
+@st.cache_resource(max_entries=32)
+def get_table_index(data_key, _table):
+    return TableIndex(_table)
 
-# Отображаем основную таблицу с полным контролем стиля
-# Преобразуем все числовые колонки в числовой тип для правильного выравнивания
-df_display = df.copy()
-for col in df_display.columns[1:]:  # Пропускаем колонку Month
-    df_display[col] = pd.to_numeric(df_display[col], errors='coerce').fillna(0).astype(int)
-
-# Конфигурируем колонки для правильного отображения
-column_config = {
-    "Month": st.column_config.TextColumn(
-        "Month",
-        width="medium",
-        help="Месяц",
-    )
-}
+# Конфигурация колонок таблицы - строится один раз для набора колонок
+@st.cache_data
+def build_column_config(label_columns, value_columns, help_text):
+    column_config = {
+        col: st.column_config.TextColumn(col, width="medium", help="Месяц" if i == 0 else col)
+        for i, col in enumerate(label_columns)
+    }
+    for col in value_columns:
+        column_config[col] = st.column_config.NumberColumn(
+            col,
+            width="small",
+            format="%d",
+            help=f"{help_text}: {col}",
+        )
+    return column_config
 
-# Настройка для числовых колонок
-for col in df_display.columns[1:]:
-    column_config[col] = st.column_config.NumberColumn(
-        col,
-        width="small",
-        format="%d",
-        help=f"Количество: {col}",
+# Функция постраничного отображения таблицы
+def show_paged_table(name, data_key, table, help_text, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Отображает только текущую страницу таблицы; фильтры по площадке и месяцу,
+    выбор ролей/операций и сортировка выполняются на сервере по индексу
+    """
+    index = get_table_index(data_key, table)
+    
+    with st.popover("Filter & sort"):
+        filters = {
+            col: st.multiselect(f"{col}:", index.filter_values(col), key=f"{name}_filter_{col}")
+            for col in index.label_columns
+        }
+        columns = st.multiselect("Columns (roles / operations):", index.value_columns, key=f"{name}_columns")
+        sort_by = st.selectbox("Sort by:", [None] + index.columns, format_func=lambda col: col or "Original order",
+                               key=f"{name}_sort")
+        descending = st.toggle("Descending", key=f"{name}_descending")
+    
+    positions = index.query(filters, sort_by, ascending=not descending)
+    pages = max(1, -(-len(positions) // page_size))
+    # Фильтры могли сократить число страниц - сохраненный номер страницы прижимаем к новому максимуму
+    if st.session_state.get(f"{name}_page", 1) > pages:
+        st.session_state[f"{name}_page"] = pages
+    page = st.number_input("Page", 1, pages, key=f"{name}_page") if pages > 1 else 1
+    page_df = index.page(positions, page, page_size, columns)
+    
+    st.dataframe(
+        page_df,
+        use_container_width=True,
+        column_config=build_column_config(tuple(index.label_columns), tuple(page_df.columns[len(index.label_columns):]), help_text),
+        hide_index=True
     )
+    if pages > 1 or len(positions) < len(index):
+        st.caption(f"Rows {(page - 1) * page_size + 1 if len(positions) else 0}–{min(page * page_size, len(positions))} "
+                   f"of {len(positions)} (total {len(index)})")
 
-st.dataframe(
-    df, 
-    use_container_width=True, 
-    column_config=column_config,
-    hide_index=True
-)
+# Выводим DataFrame на главную страницу с центрированием
+st.subheader("Warehouse Operations and Employee Data")
+
+with telemetry.span('render.main_table'):
+    show_paged_table('main_table', df_key, df, "Количество")
 
 # Модифицируем функцию для работы с OpenAI API
-def optimize_employees_with_ai(df):
+@telemetry.timed('llm.optimize')
+def optimize_employees_with_ai(df, timeout=None):
     """
     Функция отправляет данные в OpenAI для получения рекомендаций
-    по оптимальному количеству сотрудников
+    по оптимальному количеству сотрудников.
+    При ошибке API выбрасывает RuntimeError (вместо текста ошибки, который разбирался бы как таблица)
     """
     # Подготавливаем данные для отправки в формате строки
     data_text = df.to_string(index=False)
@@ -172,68 +373,36 @@ Month Direct_Overloading_20 Cross_Docking_20 Direct_Overloading_40 Cross_Docking
                 {"role": "user", "content": prompt}
             ],
             max_tokens=1000,  
-            temperature=0.1   # Снижена для более стабильных результатов
+            temperature=0.1,   # Снижена для более стабильных результатов
+            timeout=timeout
         )
         
         return response.choices[0].message.content
     except Exception as e:
-        return f"Error when calling OpenAI API: {str(e)}"
+        raise RuntimeError(f"Error when calling OpenAI API: {str(e)}")
 
-# Функция для анализа различий между исходными и оптимизированными данными
-def analyze_differences(original_df, optimized_df):
+# Функция для тепловой карты изменений численности по месяцам и ролям
+def create_differences_heatmap(diff):
     """
-    Анализирует различия между исходными и оптимизированными DataFrame
+    Изменение численности (после - до) по ролям и месяцам, сумма по площадкам
     """
-    try:
-        # Создаем детальный анализ различий
-        analysis = []
-        
-        # Проверяем все колонки с числовыми данными (количество сотрудников) - обновленные названия
-        employee_columns = ['Director', 'Sales', 'Operation_manager', 'Loader', 'Forklift_Operator']
-        
-        analysis.append("Analysis of average values for each job position (May–September):")
-        analysis.append("")
-        
-        for col in employee_columns:
-            if col in original_df.columns and col in optimized_df.columns:
-                try:
-                    # Преобразуем в числовой формат и вычисляем средние значения
-                    orig_mean = pd.to_numeric(original_df[col], errors='coerce').mean()
-                    opt_mean = pd.to_numeric(optimized_df[col], errors='coerce').mean()
-                    
-                    if pd.notna(orig_mean) and pd.notna(opt_mean):  # Проверяем, что значения не NaN
-                        diff_abs = opt_mean - orig_mean
-                        if orig_mean > 0:
-                            diff_percent = (diff_abs / orig_mean) * 100
-                            percent_str = f" ({diff_percent:+.1f}%)"
-                        else:
-                            percent_str = ""
-                        
-                        if diff_abs > 0.1:  # Учитываем погрешность для средних значений
-                            direction = "⬆️ Increase"
-                        elif diff_abs < -0.1:
-                            direction = "⬇️ Decrease"
-                        else:
-                            direction = "➡️ No significant change"
-                        
-                        analysis.append(f"**{col}**: {direction}")
-                        analysis.append(f"   - Average before: {orig_mean:.1f} чел.")
-                        analysis.append(f"   - Average after: {opt_mean:.1f} чел.")
-                        analysis.append(f"   - Average difference: {diff_abs:+.1f} чел.{percent_str}")
-                        analysis.append("")
-                except Exception as e:
-                    analysis.append(f"**{col}**: Analysis error - {str(e)}")
-                    analysis.append("")
-        
-        return "\n".join(analysis)
-        
-    except Exception as e:
-        return f"Error analyzing data: {str(e)}"
+    changes = diff.pivot_table(index='Role', columns='Month', values='Change', aggfunc='sum', sort=False)
+    return px.imshow(
+        changes,
+        text_auto='+.0f',
+        aspect="auto",
+        labels={'x': 'Month', 'y': 'Role', 'color': 'Change'},
+        title='Change in headcount by month (optimized - original)',
+        color_continuous_scale='RdBu_r',
+        color_continuous_midpoint=0
+    )
 
 # Функция для получения оптимизированного DataFrame
+@telemetry.timed('parse.optimized_dataframe')
 def get_optimized_dataframe(original_df, optimized_data):
     """
-    Преобразует оптимизированные данные в DataFrame
+    Преобразует оптимизированные данные в DataFrame.
+    Вызывается и из фоновых задач, поэтому не обращается к Streamlit: неразобранный ответ - исходная таблица
     """
     try:
         import io
@@ -267,178 +436,104 @@ def get_optimized_dataframe(original_df, optimized_data):
                             data_rows.append(row[:len(original_df.columns)])
         
         if data_rows:
-            optimized_df = pd.DataFrame(data_rows, columns=original_df.columns)
+            # Значения из текста ответа приводятся к числам: иначе объединение с прогнозом дает
+            # колонки со смесью строк и чисел, которые не выгружаются в Parquet и попадают в Excel как текст
+            optimized_df = with_numeric_values(pd.DataFrame(data_rows, columns=original_df.columns))
             return optimized_df
         else:
             # Если не удалось распарсить, возвращаем исходные данные
             return original_df
-    except Exception as e:
-        st.error(f"Error processing optimized data: {str(e)}")
+    except Exception:
         return original_df
 
+# Ключ оптимизированной таблицы сессии: разбор ответа оптимизации - один раз на процесс для одинаковых данных
+def get_optimized_key(optimization_data=None, name='optimized_df'):
+    optimization_data = optimization_data or st.session_state.optimization_data
+    optimized_key = shared_store.derive(
+        'optimized_df',
+        (df_key, content_hash(optimization_data)),
+        lambda: get_optimized_dataframe(df, optimization_data)
+    )
+    shared_store.attach(session_id, name, optimized_key)
+    return optimized_key
+
 # Функция для прогнозирования операций с помощью линейной регрессии
-def predict_future_operations(df, target_month, use_optimized_data=True):
+def predict_future_operations(df, target_month, models=None, trend=None, baseline=None):
     """
-    Прогнозирует количество операций и сотрудников на указанный месяц
+    Прогнозирует количество операций и сотрудников на указанный месяц.
+    Выполняется в фоновой задаче, поэтому не обращается к Streamlit: ошибки выбрасываются
+    и показываются сессии при получении результата задачи.
+    models - словарь {(площадка, колонка операции): модель из FORECASTERS}, по умолчанию линейная регрессия
+    trend - RunningLinearTrend с накопленными статистиками вместо переобучения регрессии
+    baseline - строка базового месяца для пересчета персонала (по умолчанию последняя строка df)
     """
-    try:
-        # Данные для прогнозирования (уже оптимизированные если необходимо)
-        if use_optimized_data and st.session_state.get('optimization_data'):
-            optimized_df = get_optimized_dataframe(df, st.session_state.optimization_data)
-            if len(optimized_df) > 0 and len(optimized_df.columns) == len(df.columns):
-                df = optimized_df
-        
-        # Преобразуем месяцы в числовой формат
-        month_mapping = {
-            'May': 5, 'June': 6, 'July': 7, 'August': 8, 'September': 9,
-            'October': 10, 'November': 11, 'December': 12
-        }
-        
-        # Подготавливаем данные для обучения - очищаем от пробелов
-        months_numeric = []
-        for month in df[df.columns[0]]:
-            month_clean = str(month).strip()  # Убираем пробелы
-            if month_clean in month_mapping:
-                months_numeric.append(month_mapping[month_clean])
+    # Преобразуем месяцы в числовой формат
+    month_mapping = {
+        'May': 5, 'June': 6, 'July': 7, 'August': 8, 'September': 9,
+        'October': 10, 'November': 11, 'December': 12
+    }
+    
+    # Подготавливаем данные для обучения - очищаем от пробелов
+    months_numeric = []
+    for month in df[df.columns[0]]:
+        month_clean = str(month).strip()  # Убираем пробелы
+        if month_clean in month_mapping:
+            months_numeric.append(month_mapping[month_clean])
+        else:
+            raise ValueError(f"Unknown month: '{month_clean}'. Available: {list(month_mapping.keys())}")
+    X = np.array(months_numeric).reshape(-1, 1)  # Месяцы как признак
+    
+    # Прогнозируем каждый тип операций - обновленные колонки
+    predictions = {}
+    operation_columns = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40', 'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service', 'Goods_Storage', 'Additional_Service']
+    employee_columns = ['Director', 'Sales', 'Operation_manager', 'Loader', 'Forklift_Operator']
+    
+    target_month_num = month_mapping[target_month]
+    X_pred = np.array([[target_month_num]])
+    
+    # Линейный прогноз по накопленным статистикам - без переобучения на всей истории
+    trend_predictions = dict(zip(trend.columns, trend.predict(target_month_num))) if trend is not None else {}
+    
+    # Модели выбираются по площадке таблицы (без колонки Site - одна площадка)
+    site = df[SITE_COLUMN].iloc[-1] if SITE_COLUMN in df.columns else DEFAULT_SITE
+    
+    # Прогнозируем операции с помощью чистой линейной регрессии без коррекции роста
+    for col in operation_columns:
+        if col in df.columns:
+            model_name = (models or {}).get((site, col), 'linear')
+            if model_name != 'linear':
+                # Прогноз выбранной моделью на нужное число месяцев вперед от конца истории
+                horizon = target_month_num - months_numeric[-1]
+                pred_value = forecast_series(pd.to_numeric(df[col], errors='coerce').fillna(0), model_name, horizon)[-1]
+            elif col in trend_predictions:
+                pred_value = trend_predictions[col]
             else:
-                st.error(f"Unknown month: '{month_clean}'. Available: {list(month_mapping.keys())}")
-                return None, None
-        X = np.array(months_numeric).reshape(-1, 1)  # Месяцы как признак
-        
-        # Прогнозируем каждый тип операций - обновленные колонки
-        predictions = {}
-        operation_columns = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40', 'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service', 'Goods_Storage', 'Additional_Service']
-        employee_columns = ['Director', 'Sales', 'Operation_manager', 'Loader', 'Forklift_Operator']
-        
-        target_month_num = month_mapping[target_month]
-        X_pred = np.array([[target_month_num]])
-        
-        # Прогнозируем операции с помощью чистой линейной регрессии без коррекции роста
-        for col in operation_columns:
-            if col in df.columns:
-                y = pd.to_numeric(df[col], errors='coerce')
                 model = LinearRegression()
-                model.fit(X, y)
+                model.fit(X, pd.to_numeric(df[col], errors='coerce'))
                 pred_value = model.predict(X_pred)[0]
-                # Используем чистую линейную регрессию без дополнительных коэффициентов роста
-                predictions[col] = max(0, int(round(pred_value)))
-        
-        # Прогнозируем количество сотрудников на основе роста/падения операций от базового уровня (сентябрь)
-        # Получаем базовые данные (последний месяц - сентябрь)
-        baseline_data = df.iloc[-1]  # Последняя строка - сентябрь
-        
-        for col in employee_columns:
-            if col in df.columns:
-                # Получаем базовое количество сотрудников из сентября
-                baseline_employees = pd.to_numeric(baseline_data[col], errors='coerce') or 0
-                
-                if col == 'Director':
-                    # Директор всегда 1
-                    predictions[col] = 1
-                elif col == 'Sales':
-                    # Продавец всегда 1  
-                    predictions[col] = 1
-                elif col == 'Operation_manager':
-                    # Для Operation_manager - зависимость от офисных операций
-                    office_operations = ['Other_revenue', 'Reloading_Service', 'Goods_Storage', 'Additional_Service']
-                    
-                    # Базовые офисные операции (сентябрь)
-                    baseline_office_ops = sum([pd.to_numeric(baseline_data[op_col], errors='coerce') or 0 for op_col in office_operations])
-                    
-                    # Прогнозируемые офисные операции
-                    predicted_office_ops = sum([predictions.get(op_col, 0) for op_col in office_operations if op_col in predictions])
-                    
-                    # Коэффициент изменения операций
-                    if baseline_office_ops > 0:
-                        ops_change_ratio = predicted_office_ops / baseline_office_ops
-                    else:
-                        ops_change_ratio = 1.0
-                    
-                    # Корректируем количество менеджеров на основе изменения операций
-                    if ops_change_ratio >= 1.2:  # Рост больше 20%
-                        staff_change = 1 + (ops_change_ratio - 1) * 0.4  # 40% от роста операций
-                    elif ops_change_ratio <= 0.8:  # Падение больше 20%
-                        staff_change = 1 + (ops_change_ratio - 1) * 0.3  # 30% от падения операций
-                    else:
-                        staff_change = 1.0  # Нет значительных изменений
-                    
-                    predicted_managers = baseline_employees * staff_change
-                    # Верхнее ограничение - уровень сентября (оптимизированные данные)
-                    predictions[col] = max(2, min(baseline_employees, int(round(predicted_managers))))
-                    
-                elif col == 'Loader':
-                    # Для Loader - зависимость от ручных операций
-                    manual_operations = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40']
-                    
-                    # Базовые ручные операции (сентябрь)
-                    baseline_manual_ops = sum([pd.to_numeric(baseline_data[op_col], errors='coerce') or 0 for op_col in manual_operations])
-                    
-                    # Прогнозируемые ручные операции
-                    predicted_manual_ops = sum([predictions.get(op_col, 0) for op_col in manual_operations if op_col in predictions])
-                    
-                    # Коэффициент изменения операций
-                    if baseline_manual_ops > 0:
-                        ops_change_ratio = predicted_manual_ops / baseline_manual_ops
-                    else:
-                        ops_change_ratio = 1.0
-                    
-                    # Корректируем количество грузчиков на основе изменения операций
-                    if ops_change_ratio >= 1.15:  # Рост больше 15%
-                        staff_change = 1 + (ops_change_ratio - 1) * 0.6  # 60% от роста операций
-                    elif ops_change_ratio <= 0.85:  # Падение больше 15%
-                        staff_change = 1 + (ops_change_ratio - 1) * 0.4  # 40% от падения операций
-                    else:
-                        staff_change = 1.0  # Нет значительных изменений
-                    
-                    predicted_loaders = baseline_employees * staff_change
-                    # Верхнее ограничение - уровень сентября (оптимизированные данные)
-                    predictions[col] = max(2, min(baseline_employees, int(round(predicted_loaders))))
-                    
-                elif col == 'Forklift_Operator':
-                    # Для Forklift_Operator - зависимость от паллетных операций
-                    pallet_operations = ['Pallet_Direct_Overloading', 'Pallet_Cross_Docking']
-                    
-                    # Базовые паллетные операции (сентябрь)
-                    baseline_pallet_ops = sum([pd.to_numeric(baseline_data[op_col], errors='coerce') or 0 for op_col in pallet_operations])
-                    
-                    # Прогнозируемые паллетные операции
-                    predicted_pallet_ops = sum([predictions.get(op_col, 0) for op_col in pallet_operations if op_col in predictions])
-                    
-                    # Если нет паллетных операций, то минимум операторов
-                    if predicted_pallet_ops == 0:
-                        predictions[col] = 1
-                    else:
-                        # Коэффициент изменения операций
-                        if baseline_pallet_ops > 0:
-                            ops_change_ratio = predicted_pallet_ops / baseline_pallet_ops
-                        else:
-                            ops_change_ratio = 1.0
-                        
-                        # Корректируем количество операторов на основе изменения операций
-                        if ops_change_ratio >= 1.2:  # Рост больше 20%
-                            staff_change = 1 + (ops_change_ratio - 1) * 0.7  # 70% от роста операций
-                        elif ops_change_ratio <= 0.8:  # Падение больше 20%
-                            staff_change = 1 + (ops_change_ratio - 1) * 0.5  # 50% от падения операций
-                        else:
-                            staff_change = 1.0  # Нет значительных изменений
-                        
-                        predicted_operators = baseline_employees * staff_change
-                        # Верхнее ограничение - уровень сентября (оптимизированные данные)
-                        predictions[col] = max(1, min(baseline_employees, int(round(predicted_operators))))
-        
-        # Создаем строку результата
-        result_row = [target_month]
-        for col in df.columns[1:]:
-            result_row.append(predictions.get(col, 0))
-        
-        # Создаем DataFrame с прогнозом
-        forecast_df = pd.DataFrame([result_row], columns=df.columns)
-        
-        return forecast_df, predictions
-        
-    except Exception as e:
-        st.error(f"Error during forecasting: {str(e)}")
-        return None, None
+            # Используем чистую линейную регрессию без дополнительных коэффициентов роста
+            predictions[col] = max(0, int(round(pred_value)))
+    
+    # Прогнозируем количество сотрудников на основе роста/падения операций от базового уровня (сентябрь)
+    # Получаем базовые данные (последний месяц - сентябрь или предыдущий прогнозный месяц)
+    baseline_data = df.iloc[-1] if baseline is None else baseline
+    baseline_values = {col: pd.to_numeric(baseline_data[col], errors='coerce') or 0 for col in df.columns[1:]}
+    
+    # Правила пересчета персонала (Director/Sales - всегда 1, остальные от изменения своих операций)
+    forecast_staff = derive_forecast_staff(baseline_values, predictions)
+    for col in employee_columns:
+        if col in df.columns:
+            predictions[col] = int(forecast_staff[col])
+    
+    # Создаем строку результата
+    result_row = [target_month]
+    for col in df.columns[1:]:
+        result_row.append(predictions.get(col, 0))
+    
+    # Создаем DataFrame с прогнозом
+    forecast_df = pd.DataFrame([result_row], columns=df.columns)
+    
+    return forecast_df, predictions
 
 # Функция для создания сравнительного анализа
 def create_comparison_analysis(original_df, optimized_df, forecast_df, forecast_month):
@@ -569,7 +664,13 @@ def create_performance_metrics(original_df, optimized_df, forecast_df):
         st.error(f"Error creating performance metrics: {str(e)}")
         return None
 
-def create_comprehensive_charts(df, optimized_df=None):
+# Накопитель ковариаций по площадке: один на процесс, при обновлении истории площадки
+# в него добавляются только новые строки, без повторного прохода по истории
+@st.cache_resource
+def get_covariance_accumulator(site, columns):
+    return AppendOnlyCovariance(columns)
+
+def create_comprehensive_charts(df, optimized_df=None, site=DEFAULT_SITE):
     """
     Создает расширенные графики для анализа данных
     """
@@ -612,7 +713,7 @@ def create_comprehensive_charts(df, optimized_df=None):
         
         # График 3: Корреляционная матрица
         numeric_cols = operation_columns + ['Operation_manager', 'Loader', 'Forklift_Operator']
-        correlation_data = df[numeric_cols].apply(pd.to_numeric, errors='coerce').corr()
+        correlation_data = get_covariance_accumulator(site, tuple(numeric_cols)).sync(df).correlation()
         
         fig_corr = px.imshow(correlation_data, 
                            text_auto=True, 
@@ -627,295 +728,27 @@ def create_comprehensive_charts(df, optimized_df=None):
         return None, None, None
 
 # Функция для создания директорской аналитики
+@telemetry.timed('dashboard.executive')
 def create_executive_dashboard(original_df, combined_df, selected_operation, selected_month):
     """
     Создает яркую и простую визуализацию для директора
     Использует original_df для данных персонала (реальные показатели) и combined_df для операций
     """
     try:
-        months_order = ["May", "June", "July", "August", "September", "October", "November", "December"]
-        month_idx = months_order.index(selected_month)
-        
-        # Для исторических месяцев (May-September) берем данные из первой таблицы
-        if month_idx < len(original_df):
-            # Данные операций из combined_df (могут включать прогнозы)
-            month_operations_data = combined_df.iloc[month_idx] if month_idx < len(combined_df) else combined_df.iloc[-1]
-            # Данные персонала из original_df (реальные показатели)
-            month_staff_data = original_df.iloc[month_idx] if month_idx < len(original_df) else original_df.iloc[-1]
-        elif month_idx < len(combined_df):
-            # Для прогнозных месяцев используем combined_df, но предупреждаем о прогнозных данных персонала
-            month_operations_data = combined_df.iloc[month_idx]
-            month_staff_data = combined_df.iloc[month_idx]
-        else:
+        dashboard = executive_dashboard(original_df, combined_df, selected_operation, selected_month)
+        if dashboard is None:
             return False
         
-        # Получаем данные за месяц - операции из combined_df, персонал из original_df
-        operation_value = pd.to_numeric(month_operations_data[selected_operation], errors='coerce') or 0
-        
-        # Ключевые метрики
-        operation_columns = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40', 
-                           'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service', 
-                           'Goods_Storage', 'Additional_Service']
-        employee_columns = ['Director', 'Sales', 'Operation_manager', 'Loader', 'Forklift_Operator']
-        
-        # Операции берем из combined_df (могут включать прогнозы)
-        total_operations = sum([pd.to_numeric(month_operations_data[col], errors='coerce') or 0 for col in operation_columns])
-        # Персонал берем из original_df (реальные показатели)
-        total_employees = sum([pd.to_numeric(month_staff_data[col], errors='coerce') or 0 for col in employee_columns])
-            
         # Метрики в карточках
-        col1, col2, col3, col4 = st.columns(4)
-            
-        # Рассчитываем изменения по сравнению с предыдущим месяцем для всех метрик
-        delta_operation = None
-        delta_total_ops = None
-        delta_staff = None 
-        delta_productivity = None
-        
-        if month_idx > 0:
-            # Получаем данные предыдущего месяца
-            if month_idx - 1 < len(original_df):  
-                prev_month_operations_data = original_df.iloc[month_idx - 1] if month_idx - 1 < len(original_df) else combined_df.iloc[month_idx - 1]
-                prev_month_staff_data = original_df.iloc[month_idx - 1] if month_idx - 1 < len(original_df) else original_df.iloc[-1]
-            else:  
-                prev_month_operations_data = combined_df.iloc[month_idx - 1]
-                prev_month_staff_data = combined_df.iloc[month_idx - 1]
-            
-            # Расчеты для выбранной операции
-            prev_operation_value = pd.to_numeric(prev_month_operations_data[selected_operation], errors='coerce') or 0
-            if prev_operation_value > 0:
-                change_operation = ((operation_value - prev_operation_value) / prev_operation_value * 100)
-                delta_operation = f"{change_operation:+.1f}%"
-            
-            # Расчеты для Total Operations
-            prev_total_operations = sum([pd.to_numeric(prev_month_operations_data[col], errors='coerce') or 0 for col in operation_columns])
-            if prev_total_operations > 0:
-                change_total_ops = ((total_operations - prev_total_operations) / prev_total_operations * 100)
-                delta_total_ops = f"{change_total_ops:+.1f}%"
-            
-            # Расчеты для Total Staff
-            prev_total_employees = sum([pd.to_numeric(prev_month_staff_data[col], errors='coerce') or 0 for col in employee_columns])
-            if prev_total_employees > 0:
-                change_staff = ((total_employees - prev_total_employees) / prev_total_employees * 100)
-                delta_staff = f"{change_staff:+.1f}%"
-            
-            # Расчеты для Productivity
-            prev_productivity = prev_total_operations / prev_total_employees if prev_total_employees > 0 else 0
-            productivity = total_operations / total_employees if total_employees > 0 else 0
-            if prev_productivity > 0:
-                change_productivity = ((productivity - prev_productivity) / prev_productivity * 100)
-                delta_productivity = f"{change_productivity:+.1f}%"
-        
-        with col1:
-            st.metric(
-                label=f"{selected_operation}",
-                value=f"{int(operation_value)}",
-                delta=delta_operation
-            )
-        
-        with col2:
-            st.metric(
-                label="Total Operations",
-                value=f"{int(total_operations)}",
-                delta=delta_total_ops
-            )
-        
-        with col3:
-            st.metric(
-                label="Total Staff",
-                value=f"{int(total_employees)}",
-                delta=delta_staff
-            )
-        
-        with col4:
-            productivity = total_operations / total_employees if total_employees > 0 else 0
-            st.metric(
-                label="Productivity",
-                value=f"{productivity:.1f}",
-                delta=delta_productivity,
-                help="Operations per employee - shows how many warehouse operations each employee handles on average per month. Higher values indicate better efficiency."
-            )
-            
-        # График 1: Обзор всех операций за месяц
-        operation_values = [pd.to_numeric(month_operations_data[col], errors='coerce') or 0 for col in operation_columns]
-        operation_labels = [
-            'Direct 20ft', 'Cross 20ft', 'Direct 40ft', 'Cross 40ft',
-            'Pallet Direct', 'Pallet Cross', 'Revenue Ops', 'Reload Service', 
-            'Storage', 'Additional'
-        ]
-            
-        # Фильтруем операции с нулевыми значениями
-        filtered_values = []
-        filtered_labels = []
-        colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', '#54A0FF', '#5F27CD', '#00D2D3', '#FF9F43']
-        filtered_colors = []
-        
-        for i, (value, label) in enumerate(zip(operation_values, operation_labels)):
-            if value > 0:
-                filtered_values.append(value)
-                filtered_labels.append(f"{label}: {int(value)}")
-                filtered_colors.append(colors[i % len(colors)])
-        
-        if filtered_values:
-            fig_all_ops = go.Figure(data=[
-                go.Pie(
-                    labels=filtered_labels,
-                    values=filtered_values,
-                    hole=0.3,
-                    marker=dict(
-                        colors=filtered_colors,
-                        line=dict(color='#FFFFFF', width=2)
-                    ),
-                    textinfo='label+percent',
-                    textposition='auto',
-                    hovertemplate='%{label}<br>%{value} operations<br>%{percent}<extra></extra>'
-                )
-            ])
-            
-            fig_all_ops.update_layout(
-                title={
-                    'text': f"All Operations Overview - {selected_month} 2025",
-                    'x': 0.5,
-                    'font': {'size': 20, 'color': '#2E86C1'}
-                },
-                font=dict(size=12),
-                height=500,
-                showlegend=True,
-                legend=dict(
-                    orientation="v",
-                    yanchor="middle",
-                    y=0.5,
-                    xanchor="left",
-                    x=1.05
-                )
-            )
-            
-            st.plotly_chart(fig_all_ops, use_container_width=True)
-        
-        # График 2: Соотношение выбранной операции к общему объему
-        if operation_value > 0 and total_operations > operation_value:
-            fig_pie = go.Figure(data=[
-                go.Pie(
-                    labels=[selected_operation, "Other Operations"],
-                    values=[operation_value, total_operations - operation_value],
-                    hole=0.4,
-                    marker=dict(
-                        colors=['#FF6B6B', '#4ECDC4'],
-                        line=dict(color='#FFFFFF', width=3)
-                    )
-                )
-            ])
-            
-            fig_pie.update_layout(
-                title={
-                    'text': f"{selected_operation} Share in Total Operations",
-                    'x': 0.5,
-                    'font': {'size': 20, 'color': '#2E86C1'}
-                },
-                font=dict(size=14),
-                height=400,
-                showlegend=True
-            )
-            
-            st.plotly_chart(fig_pie, use_container_width=True)
-        
-        # График 3: Распределение сотрудников (реальные данные)
-        employee_values = [pd.to_numeric(month_staff_data[col], errors='coerce') or 0 for col in employee_columns]
-        
-        fig_bar = go.Figure(data=[
-            go.Bar(
-                x=employee_columns,
-                y=employee_values,
-                marker=dict(
-                    color=['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57'],
-                    line=dict(color='#FFFFFF', width=2)
-                ),
-                text=employee_values,
-                textposition='auto'
-            )
-        ])
-        
-        fig_bar.update_layout(
-            title={
-                'text': f"Staff Distribution in {selected_month}",
-                'x': 0.5,
-                'font': {'size': 20, 'color': '#2E86C1'}
-            },
-            xaxis_title="Employee Type",
-            yaxis_title="Number of Employees",
-            font=dict(size=14),
-            height=400,
-            showlegend=False
-        )
-        
-        st.plotly_chart(fig_bar, use_container_width=True)
+        for metric_column, metric in zip(st.columns(len(dashboard['metrics'])), dashboard['metrics']):
+            with metric_column:
+                st.metric(**metric)
         
-        # График 4: Сравнение с предыдущим месяцем
-        if month_idx > 0:
-            prev_month_name = months_order[month_idx - 1]
-            
-            # Правильно определяем источник данных для предыдущего месяца
-            if month_idx - 1 < len(original_df):  # Предыдущий месяц - исторические данные
-                prev_month_operations_data = original_df.iloc[month_idx - 1] if month_idx - 1 < len(original_df) else combined_df.iloc[month_idx - 1]
-            else:  # Предыдущий месяц - прогнозные данные
-                prev_month_operations_data = combined_df.iloc[month_idx - 1]
-            
-            prev_operation_value = pd.to_numeric(prev_month_operations_data[selected_operation], errors='coerce') or 0
-            
-            change = ((operation_value - prev_operation_value) / prev_operation_value * 100) if prev_operation_value > 0 else 0
-            
-            # Отладочная информация убрана - после успешной отладки
-            # st.write(f"📊 **Month Comparison for {selected_operation}:**")
-            # st.write(f"   • {prev_month_name}: {int(prev_operation_value)} operations")
-            # st.write(f"   • {selected_month}: {int(operation_value)} operations")
-            # st.write(f"   • Formula: ({int(operation_value)} - {int(prev_operation_value)}) / {int(prev_operation_value)} × 100 = **{change:+.1f}%**")
-            
-            fig_comparison = go.Figure(data=[
-                go.Bar(
-                    x=[prev_month_name, selected_month],
-                    y=[prev_operation_value, operation_value],
-                    marker=dict(
-                        color=[
-                            '#95A5A6',  # Серый для предыдущего месяца
-                            '#E74C3C' if change < 0 else '#27AE60'  # Красный при снижении, зеленый при росте
-                        ],
-                        line=dict(color='#FFFFFF', width=2)
-                    ),
-                    text=[int(prev_operation_value), int(operation_value)],
-                    textposition='auto'
-                )
-            ])
-            
-            fig_comparison.update_layout(
-                title={
-                    'text': f"{selected_operation}: Month-to-Month Comparison",
-                    'x': 0.5,
-                    'font': {'size': 20, 'color': '#2E86C1'}
-                },
-                xaxis_title="Month",
-                yaxis_title="Operations",
-                font=dict(size=14),
-                height=400,
-                showlegend=False,
-                annotations=[
-                    dict(
-                        x=1,
-                        y=max(prev_operation_value, operation_value) * 1.1,
-                        text=f"Change: {change:+.1f}%",
-                        showarrow=True,
-                        arrowhead=2,
-                        arrowcolor='#E74C3C' if change < 0 else '#27AE60',
-                        font=dict(size=16, color='#E74C3C' if change < 0 else '#27AE60')
-                    )
-                ]
-            )
-            
-            st.plotly_chart(fig_comparison, use_container_width=True)
+        for fig in dashboard['figures']:
+            st.plotly_chart(fig, use_container_width=True)
         
         return True
         
-        return False
-        
     except Exception as e:
         st.error(f"Error creating executive dashboard: {str(e)}")
         return False
@@ -926,27 +759,15 @@ def create_dependency_charts(df):
     Создает графики зависимости количества работников от объема операций
     """
     try:
-        # Подготавливаем данные для визуализации - обновленные колонки
-        operation_columns = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40', 'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service', 'Goods_Storage', 'Additional_Service']
-        employee_columns = ['Operation_manager', 'Loader', 'Forklift_Operator']
-        
-        # Создаем суммарные операции
-        total_operations = df[operation_columns].apply(pd.to_numeric, errors='coerce').sum(axis=1)
+        fits = compute_regression_diagnostics(df)
         
         # График 1: Зависимость Loader от общего объема операций
-        fig1 = px.scatter(x=total_operations, y=pd.to_numeric(df['Loader'], errors='coerce'),
-                         labels={'x': 'Total volume of operations', 'y': 'Number of Loaders'},
-                         title='Dependence of the number of loaders on the volume of operations',
-                         trendline='ols')
-        fig1.update_traces(marker=dict(size=12, color='blue'))
+        fig1 = create_pair_chart(df, fits, 'Loader', TOTAL_OPERATIONS,
+                                 title='Dependence of the number of loaders on the volume of operations', color='blue')
         
         # График 2: Зависимость Operation_manager от Additional_Service - обновленное название
-        fig2 = px.scatter(x=pd.to_numeric(df['Additional_Service'], errors='coerce'),
-                         y=pd.to_numeric(df['Operation_manager'], errors='coerce'),
-                         labels={'x': 'Additional Services', 'y': 'Number of Operation Managers'},
-                         title='Operation Managers dependence on additional services',
-                         trendline='ols')
-        fig2.update_traces(marker=dict(size=12, color='green'))
+        fig2 = create_pair_chart(df, fits, 'Operation_manager', 'Additional_Service',
+                                 title='Operation Managers dependence on additional services', color='green')
         
         return fig1, fig2
         
@@ -954,28 +775,351 @@ def create_dependency_charts(df):
         st.error(f"Error during plot creation: {str(e)}")
         return None, None
 
+# Кэшируем регрессии всех пар роль x операция - пересчет только при изменении данных
+@st.cache_data
+def compute_regression_diagnostics(df):
+    return fit_pairwise_regressions(df)
+
+# Функция для графика зависимости одной роли от одной операции
+def create_pair_chart(df, fits, role, operation, title=None, color='blue'):
+    """
+    Точечный график пары с линией регрессии по уже рассчитанным коэффициентам
+    """
+    fit = fits[(fits['Role'] == role) & (fits['Operation'] == operation)].iloc[0]
+    x, y = pair_values(df, role, operation)
+    x_line = np.array([x.min(), x.max()])
+    
+    fig = px.scatter(x=x, y=y,
+                     labels={'x': operation.replace('_', ' '), 'y': f'Number of {role.replace("_", " ")}s'},
+                     title=title or f'{role} vs {operation} (R² = {fit["R2"]:.2f})')
+    fig.update_traces(marker=dict(size=12, color=color))
+    fig.add_trace(go.Scatter(x=x_line, y=fit['Intercept'] + fit['Slope'] * x_line, mode='lines',
+                             name='Linear fit', line=dict(color=color, dash='dash')))
+    return fig
+
+# Функция для отображения матрицы эластичностей персонала по операциям
+def show_elasticity_matrix(df):
+    """
+    Отображает матрицу роль x операция (эластичность, наклон или R²) с детализацией по паре
+    """
+    try:
+        fits = compute_regression_diagnostics(df)
+        metric = st.radio("Metric:", ['Elasticity', 'R2', 'Slope'], horizontal=True, key="elasticity_metric")
+        matrix = regression_matrix(fits, metric)
+        fig_matrix = px.imshow(
+            matrix,
+            text_auto='.2f',
+            aspect="auto",
+            labels={'x': 'Operation', 'y': 'Role', 'color': metric},
+            title=f'{metric} of headcount with respect to operation volume',
+            color_continuous_scale='Viridis' if metric == 'R2' else 'RdBu_r',
+            color_continuous_midpoint=None if metric == 'R2' else 0
+        )
+        st.plotly_chart(fig_matrix, use_container_width=True)
+        st.caption("Elasticity: % change in headcount per 1% change in operations, at the mean of the period.")
+        
+        # Детализация выбранной пары
+        col1, col2 = st.columns(2)
+        with col1:
+            role = st.selectbox("Role:", list(matrix.index), index=list(matrix.index).index('Loader'), key="elasticity_role")
+        with col2:
+            operation = st.selectbox("Operation:", list(matrix.columns), index=len(matrix.columns) - 1, key="elasticity_operation")
+        st.plotly_chart(create_pair_chart(df, fits, role, operation), use_container_width=True)
+        
+    except Exception as e:
+        st.error(f"Error during elasticity analysis: {str(e)}")
+
+# Кэшируем перебор сценариев what-if - пересчет только при изменении данных
+@st.cache_data
+def run_sensitivity_sweep(df):
+    return sweep_staffing(df)
+
+# Функция для отображения what-if анализа чувствительности
+def show_sensitivity_analysis(df):
+    """
+    Отображает тепловую карту и торнадо-диаграмму чувствительности численности к параметрам расчета
+    """
+    try:
+        sweep = run_sensitivity_sweep(df)
+        st.caption(f"{len(sweep)} parameter combinations evaluated for all months (totals over May–September)")
+        
+        role = st.selectbox(
+            "Headcount to analyse:",
+            ['Total_staff', 'Loader', 'Forklift_Operator', 'Operation_manager'],
+            key="sensitivity_role"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            x_param = st.selectbox("Heatmap X parameter:", SWEEP_PARAMETERS, index=2, key="sensitivity_x")
+        with col2:
+            y_param = st.selectbox("Heatmap Y parameter:", SWEEP_PARAMETERS, index=0, key="sensitivity_y")
+        
+        if x_param != y_param:
+            heatmap = sensitivity_heatmap(sweep, x_param, y_param, role)
+            fig_heatmap = px.imshow(
+                heatmap,
+                text_auto='.1f',
+                aspect="auto",
+                labels={'x': x_param, 'y': y_param, 'color': role},
+                title=f'{role}: {y_param} vs {x_param} (mean over other parameters)',
+                color_continuous_scale='RdYlGn_r'
+            )
+            st.plotly_chart(fig_heatmap, use_container_width=True)
+        else:
+            st.info("Select two different parameters for the heatmap")
+        
+        # Торнадо-диаграмма: изменение по одному параметру при остальных базовых
+        tornado = tornado_table(sweep, role=role)
+        fig_tornado = go.Figure()
+        fig_tornado.add_trace(go.Bar(
+            y=tornado['Parameter'],
+            x=tornado['Low change'],
+            orientation='h',
+            name='Low value (-25%)',
+            marker_color='#4ECDC4'
+        ))
+        fig_tornado.add_trace(go.Bar(
+            y=tornado['Parameter'],
+            x=tornado['High change'],
+            orientation='h',
+            name='High value (+25%)',
+            marker_color='#FF6B6B'
+        ))
+        fig_tornado.update_layout(
+            title=f'{role} sensitivity to each parameter',
+            xaxis_title='Change in headcount vs baseline',
+            barmode='overlay',
+            height=400
+        )
+        st.plotly_chart(fig_tornado, use_container_width=True)
+        
+    except Exception as e:
+        st.error(f"Error during sensitivity analysis: {str(e)}")
+
+# Варианты расписания смен для почасового расчета
+SHIFT_PATTERNS = {
+    "One day shift (08-16)": {'Day': (8, 16)},
+    "Two shifts (06-14, 14-22)": {'Early': (6, 14), 'Late': (14, 22)},
+}
+
+# Почасовой расчет смен для всех площадок хранилища одним батчем - пересчет только при смене параметров
+@st.cache_data
+def compute_network_shift_plan(target_wait_hours, shift_pattern):
+    """
+    Возвращает (почасовая потребность в грузчиках (площадки, периоды, дни, 24), итоговая таблица по площадкам и месяцам)
+    """
+    store = get_history_store()
+    cube = store.site_cube(OPERATION_COLUMNS)
+    n_sites, n_periods, _ = cube.shape
+    params = ShiftParameters(target_wait_hours=target_wait_hours, shifts=SHIFT_PATTERNS[shift_pattern])
+    plan = compute_shift_plan(np.asarray(cube, dtype=float).reshape(n_sites * n_periods, -1), params)
+    loaders, forklifts = monthly_headcount(plan)
+    summary = pd.DataFrame({
+        'Site': np.repeat(store.sites, n_periods),
+        'Month': np.tile([period.strip() for period in store.periods], n_sites),
+        'Loader': loaders,
+        'Forklift_Operator': forklifts,
+        'Peak brigades': plan['shift_brigades'].max(axis=(1, 2)),
+        'Overloaded hours': plan['overloaded'].sum(axis=(1, 2)),
+    })
+    return plan['hourly_loaders'].reshape(n_sites, n_periods, *plan['hourly_loaders'].shape[1:]), summary
+
+# Функция для отображения почасового плана смен
+def show_shift_plan(df):
+    """
+    Отображает почасовую потребность в грузчиках по дням недели и месячную численность по пиковым сменам
+    """
+    try:
+        col1, col2 = st.columns(2)
+        with col1:
+            target_wait_minutes = st.number_input("Target average truck wait (minutes):", min_value=5, max_value=240,
+                                                  value=60, step=5, key="shift_target_wait")
+        with col2:
+            shift_pattern = st.selectbox("Shift pattern:", list(SHIFT_PATTERNS), key="shift_pattern")
+        
+        hourly_loaders, summary = compute_network_shift_plan(target_wait_minutes / 60, shift_pattern)
+        site_summary = summary[summary['Site'] == selected_site].reset_index(drop=True)
+        st.caption(f"M/M/c (Erlang C) queues per hour for {len(summary)} site-months x {len(WEEKDAYS)} days x 24 hours; "
+                   f"at most {ShiftParameters.max_parallel_operations} manual operations run in parallel")
+        
+        # Почасовая потребность выбранного месяца: дни недели x часы
+        month_index = st.selectbox("Month:", range(len(site_summary)), format_func=lambda i: site_summary['Month'][i],
+                                   key="shift_month")
+        site_index = history_store.sites.index(selected_site)
+        month_hours = pd.DataFrame(hourly_loaders[site_index, month_index], index=WEEKDAYS)
+        month_hours = month_hours.loc[:, (month_hours > 0).any()]
+        fig_hours = px.imshow(
+            month_hours,
+            text_auto='.0f',
+            aspect="auto",
+            labels={'x': 'Hour', 'y': 'Day', 'color': 'Loaders'},
+            title=f"Loaders required by hour - {site_summary['Month'][month_index]}",
+            color_continuous_scale='YlOrRd'
+        )
+        st.plotly_chart(fig_hours, use_container_width=True)
+        
+        # Месячная численность по пиковым сменам рядом с текущей таблицей
+        comparison = site_summary.drop(columns='Site').rename(
+            columns={'Loader': 'Loader (shifts)', 'Forklift_Operator': 'Forklift_Operator (shifts)'}
+        )
+        for role in ['Loader', 'Forklift_Operator']:
+            comparison.insert(comparison.columns.get_loc(f'{role} (shifts)'), f'{role} (table)',
+                              pd.to_numeric(df[role], errors='coerce').to_numpy()[:len(comparison)])
+        st.dataframe(comparison, use_container_width=True, hide_index=True)
+        if comparison['Overloaded hours'].sum() > 0:
+            st.warning("In some hours the wait target cannot be met even with all parallel manual operations running.")
+        
+        if len(history_store.sites) > 1:
+            st.markdown("**All sites (monthly headcount from peak shifts):**")
+            st.dataframe(summary.pivot_table(index='Site', columns='Month', values='Loader', sort=False),
+                         use_container_width=True)
+        
+    except Exception as e:
+        st.error(f"Error during shift planning: {str(e)}")
+
+# Бюджет задержки оптимизации по умолчанию и доля бюджета до хеджированного запроса
+OPTIMIZATION_BUDGET_SECONDS = 20
+HEDGE_AFTER_FRACTION = 0.5
+
 # Создаем боковую панель (sidebar)
 st.sidebar.header("Control Panel")
 
+# Выбор метода оптимизации: AI, точный локальный MILP-решатель или почасовая модель очередей по сменам
+optimization_method = st.sidebar.radio(
+    "Optimisation method:",
+    ["AI (gpt-4o)", "Exact MILP (local)", "Shift queueing (local)"],
+    key="optimization_method"
+)
+
+# Функция оптимизации с бюджетом задержки
+def optimize_employees_with_budget(df, budget_seconds, hedge_fraction=HEDGE_AFTER_FRACTION):
+    """
+    Запрос к AI с бюджетом задержки: при опоздании отправляется хеджированный второй запрос,
+    а если не успевает и он - результат считается локально по тем же формулам.
+    Возвращает (текст таблицы, источник: primary/hedge/fallback)
+    """
+    return hedged_call(
+        lambda timeout: optimize_employees_with_ai(df, timeout=timeout),
+        budget=budget_seconds,
+        hedge_after=budget_seconds * hedge_fraction,
+        fallback=lambda: optimize_employees_rule_based(df).to_string(index=False)
+    )
+
+# Сохранение запуска в историю из фоновой задачи
+def record_job_run(report, kind, input_hash, tables, **kwargs):
+    """
+    Сохраняет запуск один раз - внутри задачи, общей для всех сессий с тем же запросом.
+    Возвращает (идентификатор запуска или None, текст ошибки сохранения или None)
+    """
+    try:
+        return run_history.record_run(kind, input_hash, tables, timings=report.stage_timings(), **kwargs), None
+    except Exception as e:
+        return None, str(e)
+
+# Функция фоновой задачи оптимизации
+def run_optimization_job(report, df, input_key, optimization_method, budget_seconds, site):
+    """
+    Выполняет оптимизацию в фоновом потоке и сохраняет запуск в историю.
+    Возвращает (текст оптимизированной таблицы, источник результата, идентификатор запуска, ошибка сохранения)
+    """
+    report(0.1, "Analyzing data...")
+    if optimization_method == "Exact MILP (local)":
+        # Точная оптимизация в том же текстовом формате таблицы, что и ответ AI
+        result_data, result_source = optimize_employees_milp(df).to_string(index=False), 'milp'
+    elif optimization_method == "Shift queueing (local)":
+        # Loader и Forklift_Operator - по пиковым сменам почасовой модели очередей
+        result_data, result_source = optimize_employees_queueing(df).to_string(index=False), 'queueing'
+    else:
+        # Получаем НОВЫЕ оптимизированные данные от OpenAI в пределах бюджета задержки
+        result_data, result_source = optimize_employees_with_budget(df, budget_seconds)
+    
+    # Локальный расчет вместо опоздавшего AI уже показан сессии - в историю не попадает
+    if result_source == 'fallback':
+        return result_data, result_source, None, None
+    run_id, history_error = record_job_run(
+        report, 'optimization', input_key,
+        {'optimized': get_optimized_dataframe(df, result_data)},
+        model={"AI (gpt-4o)": 'gpt-4o', "Shift queueing (local)": 'erlang_c'}.get(optimization_method, 'milp'),
+        source=result_source,
+        parameters={'method': optimization_method, 'budget_seconds': budget_seconds},
+        output_text=result_data,
+        site=site
+    )
+    return result_data, result_source, run_id, history_error
+
+# Бюджет задержки запроса к AI (после него - локальный расчет по формулам)
+optimization_budget = st.sidebar.slider(
+    "AI latency budget (seconds):",
+    min_value=5,
+    max_value=60,
+    value=OPTIMIZATION_BUDGET_SECONDS,
+    key="optimization_budget",
+    disabled=optimization_method != "AI (gpt-4o)"
+)
+
+# Замена результата оптимизации сессии
+def replace_optimization_result(optimization_data, optimization_source, run_id=None):
+    """
+    Ставит новый результат оптимизации. Ответ AI для сверки и незавершенная задача относятся
+    к прежнему результату, поэтому сбрасываются - иначе сверка и получение задачи работали бы с ними
+    """
+    st.session_state.optimization_data = optimization_data
+    st.session_state.optimization_source = optimization_source
+    st.session_state.optimization_run_id = run_id
+    st.session_state.ai_optimization = None
+    st.session_state.optimization_job = None
+
 # Добавляем кнопку оптимизации с полной очисткой кеша
 if st.sidebar.button("Employees number optimisation"):
     # Полная очистка всех кешей при повторном нажатии
     st.session_state.forecast_data = None
+    st.session_state.forecast_job = None
     st.session_state.show_forecast = False
-    st.session_state.optimization_data = None  # Очищаем старые данные оптимизации
+    replace_optimization_result(None, None)  # Очищаем старые данные оптимизации
     st.session_state.show_optimization = False  # Сбрасываем флаг показа
     st.session_state.last_calculated_month = None  # Очищаем кеш прогноза
     
-    # Показываем индикатор загрузки
-    with st.spinner('Analyzing data with AI... Please wait for fresh optimization results.'):
-        # Получаем НОВЫЕ оптимизированные данные от OpenAI
-        optimized_data = optimize_employees_with_ai(df)
-        
-        # Сохраняем новые данные в session_state
-        st.session_state.optimization_data = optimized_data
+    if optimization_method == "AI (gpt-4o)":
+        # Сразу показываем локальный расчет по тем же формулам, что и в запросе к AI;
+        # ответ AI приходит в фоне и сверяется с ним поячеечно
+        replace_optimization_result(optimize_employees_rule_based(df).to_string(index=False), 'local')
         st.session_state.show_optimization = True
-        # Принудительное обновление страницы
-        st.rerun()
+    
+    # Запускаем оптимизацию в фоне - интерфейс остается доступным
+    optimization_request = ('optimization', optimization_method, df_key, optimization_budget)
+    st.session_state.optimization_job = job_runner.submit(
+        optimization_request, 'optimization', run_optimization_job, df, df_key, optimization_method,
+        optimization_budget, selected_site
+    )
+
+# Забираем результат завершенной фоновой оптимизации
+optimization_job = job_runner.get(st.session_state.get('optimization_job'))
+if optimization_job is None:
+    st.session_state.optimization_job = None
+elif optimization_job.done:
+    st.session_state.optimization_job = None
+    if optimization_job.error is None:
+        # Запуск уже сохранен в историю внутри задачи (один раз для всех сессий)
+        result_data, result_source, run_id, history_error = optimization_job.result
+        if st.session_state.get('optimization_source') == 'local' and result_source == 'fallback':
+            # AI не ответил в пределах бюджета - остается уже показанный локальный расчет
+            st.sidebar.warning("AI did not respond within the latency budget - keeping the local calculation.")
+            result_data = None
+        elif st.session_state.get('optimization_source') == 'local':
+            # Ответ AI сохраняется для сверки с локальным расчетом, не заменяя его
+            st.session_state.ai_optimization = (result_data, result_source, run_id)
+        else:
+            # Сохраняем новые данные в session_state
+            replace_optimization_result(result_data, result_source, run_id)
+            st.session_state.show_optimization = True
+        
+        if result_data is not None:
+            if history_error:
+                st.sidebar.warning(f"Could not save the run to history: {history_error}")
+    elif st.session_state.get('optimization_source') == 'local':
+        st.sidebar.warning(f"AI request failed ({optimization_job.error}) - keeping the local calculation.")
+    else:
+        st.sidebar.error(f"Optimization failed: {optimization_job.error}")
 
 # Добавляем секцию прогнозирования
 st.sidebar.subheader("Forecasting")
@@ -998,36 +1142,71 @@ if 'show_optimization' not in st.session_state:
 if 'optimization_data' not in st.session_state:
     st.session_state.optimization_data = None
 
+# Выбор модели прогноза: конкретная модель или автоматический выбор по бэктесту
+forecast_model = st.sidebar.selectbox(
+    "Forecast model:",
+    list(FORECASTERS) + ["auto"],
+    key="forecast_model",
+    help="'auto' picks the best model per operation by rolling-origin backtest error"
+)
+if forecast_model in FORECASTERS and FORECASTERS[forecast_model][1] > len(df):
+    st.sidebar.caption(f"'{forecast_model}' needs at least {FORECASTERS[forecast_model][1]} months of history - "
+                       f"with {len(df)} months the linear model is used instead.")
+
 if st.sidebar.button("Create forecast", disabled=not optimization_done):
     st.session_state.show_forecast = True
     st.session_state.forecast_data = None  # Сбрасываем кэш
+    st.session_state.forecast_job = None
 
-# Добавляем выбор одной операции
-forecast_created = st.session_state.get('show_forecast', False)
-
-if forecast_created:
-    st.sidebar.subheader("Operation Analysis")
-    
-    operation_keys = [
-        'Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40', 
-        'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service', 
-        'Goods_Storage', 'Additional_Service'
-    ]
-    
-    selected_operation = st.sidebar.selectbox(
-        "Select operation for detailed analysis:",
-        ["Select operation..."] + operation_keys,
-        key="selected_operation"
-    )
-    
-    # Добавляем выбор месяца для директорской аналитики
-    if selected_operation != "Select operation...":
-        selected_month_analysis = st.sidebar.selectbox(
-            "Select month for executive dashboard:",
-            ["May", "June", "July", "August", "September", "October", "November", "December"],
-            key="selected_month_analysis"
+# Функция сверки ответа AI с локальным расчетом
+def show_ai_reconciliation(original_df, local_data, ai_data, ai_source, ai_run_id=None):
+    """
+    Поячеечно сравнивает таблицу AI с показанным локальным расчетом и подсвечивает расхождения
+    """
+    try:
+        local_df = shared_store.get(get_optimized_key(local_data))
+        ai_df = shared_store.get(get_optimized_key(ai_data, name='ai_optimized_df'))
+        value_columns = list(original_df.columns[1:])
+        reconciliation = diff_frame(local_df, ai_df, roles=value_columns)
+        disagreements = reconciliation[changed_cells(reconciliation)]
+        
+        if disagreements.empty:
+            st.success(f"AI result received ({ai_source}) - it matches the local calculation in all "
+                       f"{len(reconciliation)} cells.")
+            return
+        
+        # Строки, которых нет в ответе AI (или нет в локальном расчете), перечисляем отдельно
+        missing_in_ai = missing_rows(reconciliation, 'After')
+        extra_in_ai = missing_rows(reconciliation, 'Before')
+        missing_text = "".join(
+            f" {label}: {', '.join(f'{site} {month}' if site != DEFAULT_SITE else month for site, month in rows)}."
+            for label, rows in (("Rows missing from the AI answer", missing_in_ai), ("Rows only in the AI answer", extra_in_ai))
+            if rows
         )
-
+        st.warning(f"AI result received ({ai_source}) - {len(disagreements)} of {len(reconciliation)} cells "
+                   f"differ from the local calculation.{missing_text}")
+        with st.expander("🔍 AI reconciliation", expanded=True):
+            # Таблица AI с подсветкой ячеек, отличающихся от локального расчета
+            ai_values = ai_df.copy()
+            ai_values[value_columns] = ai_values[value_columns].apply(pd.to_numeric, errors='coerce')
+            local_values = local_df[value_columns].apply(pd.to_numeric, errors='coerce')
+            differs = ai_values[value_columns].ne(local_values.reindex(ai_values.index))
+            highlight = pd.DataFrame('', index=ai_values.index, columns=ai_values.columns)
+            highlight[value_columns] = differs.replace({True: 'background-color: #FFE08A', False: ''})
+            st.markdown("**AI table (cells that differ from the local calculation are highlighted):**")
+            st.dataframe(ai_values.style.apply(lambda _: highlight, axis=None), use_container_width=True, hide_index=True)
+            
+            st.markdown("**Disagreements (Before = local, After = AI):**")
+            st.dataframe(disagreements.rename(columns={'Role': 'Column', 'Before': 'Local', 'After': 'AI'}).round(1),
+                         use_container_width=True, hide_index=True)
+            
+            if st.button("Use AI result", key="use_ai_result"):
+                replace_optimization_result(ai_data, ai_source, ai_run_id)
+                st.session_state.forecast_data = None
+                st.session_state.show_forecast = False
+                rerun()
+    except Exception as e:
+        st.error(f"Error reconciling the AI result: {str(e)}")
 
 # Отображаем результаты оптимизации, если они есть
 if st.session_state.show_optimization and st.session_state.optimization_data:
@@ -1036,86 +1215,53 @@ if st.session_state.show_optimization and st.session_state.optimization_data:
     # Создаем секцию для результатов оптимизации
     st.subheader("🤖 AI-Powered Employee Optimization Results")
     
+    # Помечаем результат, полученный не от основного запроса к AI
+    optimization_source = st.session_state.get('optimization_source')
+    if optimization_source == 'fallback':
+        st.warning("AI did not respond within the latency budget - the table below is the local rule-based "
+                   "calculation of the same formulas.")
+    elif optimization_source == 'hedge':
+        st.caption("Result returned by the hedged (second) AI request.")
+    elif optimization_source == 'local':
+        if st.session_state.get('optimization_job'):
+            st.info("Showing the instant local calculation - the AI result is being requested in the background "
+                    "and will be reconciled with it.")
+        elif st.session_state.get('ai_optimization'):
+            show_ai_reconciliation(df, optimized_data, *st.session_state.ai_optimization)
+    
     # Выводим оптимизированную таблицу
     st.markdown("### Optimised number of employees:")
     
     try:
-        # Пытаемся создать DataFrame из ответа AI
-        import io
-        # Парсим данные, полученные от AI
-        lines = optimized_data.strip().split('\n')
-        
-        # Парсим данные как таблицу без заголовков
-        # И присваиваем заголовки из исходной таблицы
-        data_rows = []
-        for line in lines:
-            if line.strip():  # Пропускаем пустые строки
-                # Разбиваем по пробелам/табуляциям
-                parts = line.split()
-                
-                # Пропускаем строки заголовков и некорректные строки
-                if (len(parts) >= 15 and 
-                    not parts[0] == 'Month' and  # Пропускаем заголовок
-                    not all(part.isalpha() for part in parts[:3]) and  # Пропускаем текстовые строки
-                    parts[0] in ['May', 'June', 'July', 'August', 'September']):  # Проверяем, что месяц валиден
-                    
-                    if len(parts) >= 16:  # Полная таблица с месяцем
-                        data_rows.append(parts[:len(df.columns)])
-                    elif len(parts) == 15:  # Старый формат - добавляем месяц в начало
-                        months = ['May', 'June', 'July', 'August', 'September']
-                        month_idx = len(data_rows)
-                        if month_idx < len(months):
-                            parts = [months[month_idx]] + parts
-                        data_rows.append(parts[:len(df.columns)])  # Берем только нужное количество колонок
-        
-        # Создаем DataFrame с правильными заголовками
-        if data_rows:
-            optimized_df = pd.DataFrame(data_rows, columns=df.columns)
-        else:
-            # Если не удалось распарсить, пробуем стандартный метод
-            optimized_df = pd.read_csv(io.StringIO(optimized_data), sep='\s+', header=None)
-            # Подгоняем количество колонок
-            if len(optimized_df.columns) == len(df.columns):
-                optimized_df.columns = df.columns
-            else:
-                # Если колонок не совпадает, берем первые N
-                optimized_df = optimized_df.iloc[:, :len(df.columns)]
-                optimized_df.columns = df.columns
+        # Разобранная таблица берется из общего хранилища: разбор и хеш ответа - один раз на процесс
+        with telemetry.span('parse.optimization_display'):
+            optimized_key = get_optimized_key()
+            optimized_df = shared_store.get(optimized_key)
+        if optimized_key == df_key:
+            # Ответ не разобран (или совпадает с исходной таблицей) - показываем его как есть
+            with st.expander("Raw optimization response"):
+                st.code(optimized_data)
             
-        # Отображаем оптимизированную таблицу с правильным форматированием
-        # Преобразуем числовые колонки
-        optimized_df_display = optimized_df.copy()
-        for col in optimized_df_display.columns[1:]:  # Пропускаем колонку Month
-            optimized_df_display[col] = pd.to_numeric(optimized_df_display[col], errors='coerce').fillna(0).astype(int)
-        
-        # Конфигурация колонок
-        column_config_opt = {
-            "Month": st.column_config.TextColumn(
-                "Month",
-                width="medium",
-                help="Месяц",
-            )
-        }
-        
-        for col in optimized_df_display.columns[1:]:
-            column_config_opt[col] = st.column_config.NumberColumn(
-                col,
-                width="small",
-                format="%d",
-                help=f"Оптимизированное количество: {col}",
-            )
+        # Отображаем оптимизированную таблицу постранично
+        with telemetry.span('render.optimized_table'):
+            show_paged_table('optimized_table', optimized_key, optimized_df, "Оптимизированное количество")
         
-        st.dataframe(
-            optimized_df_display, 
-            use_container_width=True, 
-            column_config=column_config_opt,
-            hide_index=True
-        )
-        
-        # Анализируем различия
+        # Анализируем различия: по каждому месяцу и роли одним проходом, текст и график - поверх таблицы изменений
         st.markdown("### Differences analysis:")
-        differences = analyze_differences(df, optimized_df)
-        st.markdown(differences)
+        differences = diff_frame(df, optimized_df)
+        st.markdown(differences_markdown(differences))
+        st.plotly_chart(create_differences_heatmap(differences), use_container_width=True)
+        with st.expander("Changes by month and role"):
+            st.dataframe(differences.round(1), use_container_width=True, hide_index=True)
+        
+        # Часы, которые MILP не покрывает в пределах ограничений ролей
+        if optimization_source == 'milp':
+            unmet = shared_store.get(shared_store.derive('unmet_hours', (df_key,), lambda: unmet_hours_frame(df)))
+            if not unmet.empty:
+                st.warning(f"Demand not covered within the role limits (at most {StaffingParameters.max_manager} Operation_managers, "
+                           f"{StaffingParameters.max_parallel_operations} manual operations in parallel): {unmet['Total'].sum():,.0f} hours in "
+                           f"{len(unmet)} months. More staff in these roles would not help without another shift.")
+                st.dataframe(unmet.round(1), use_container_width=True, hide_index=True)
         
     except Exception as e:
         # Если не удалось распарсить как таблицу, выводим как текст
@@ -1125,48 +1271,166 @@ if st.session_state.show_optimization and st.session_state.optimization_data:
     
     st.divider()
     
+# What-if анализ, эластичности и план смен: расчет только при раскрытом разделе
+with st.expander("🔬 What-if sensitivity analysis", key="sensitivity_expander", on_change="rerun") as sensitivity_expander:
+    if sensitivity_expander.open:
+        show_sensitivity_analysis(df)
+
+with st.expander("📐 Staff vs operations elasticity", key="elasticity_expander", on_change="rerun") as elasticity_expander:
+    if elasticity_expander.open:
+        show_elasticity_matrix(df)
+
+with st.expander("🕒 Shift plan (hourly queueing)", key="shift_expander", on_change="rerun") as shift_expander:
+    if shift_expander.open:
+        show_shift_plan(df)
+
+# Горизонт и параметры интервалов прогноза
+FORECAST_MONTHS = ["October", "November", "December"]
+BOOTSTRAP_RESAMPLES = 2000
+INTERVAL_LEVEL = 0.9
+
+# Функция для построения прогноза на октябрь-декабрь
+@telemetry.timed('forecast.build')
+def build_forecast(base_df, forecast_model, report=None):
+    """
+    Прогнозирует октябрь-декабрь (каждый месяц на основе предыдущего).
+    Возвращает (таблица прогноза, объединенная таблица, матрица бэктеста или None, интервалы) или None.
+    report(progress, message) - необязательное обновление прогресса фоновой задачи
+    """
+    report = report or (lambda progress, message='': None)
+    
+    # Модели прогноза по рядам (площадка, колонка операции)
+    backtest = None
+    if forecast_model == "auto":
+        report(0.05, "Backtesting forecast models...")
+        # Без st.cache_data: задача выполняется вне потока скрипта, результат кэшируется вместе с прогнозом
+        backtest = backtest_matrix(series_from_frame(base_df, OPERATION_COLUMNS))
+        forecast_models = select_best_models(backtest).to_dict()
+    else:
+        forecast_models = {key: forecast_model for key in series_from_frame(base_df, OPERATION_COLUMNS)}
+    
+    # Прогнозируем все оставшиеся месяцы (каждый месяц на основе предыдущего): история не копируется,
+    # линейный тренд обновляется прогнозным месяцем, персонал пересчитывается от предыдущей строки
+    forecast_months = FORECAST_MONTHS
+    forecast_data = []
+    baseline = base_df.iloc[-1]  # Начинаем с последнего исторического месяца
+    trend = RunningLinearTrend.from_frame(base_df, OPERATION_COLUMNS)
+    
+    for i, month in enumerate(forecast_months):
+        report(0.3 + 0.2 * i, f"Forecasting {month}...")
+        month_forecast, _ = predict_future_operations(base_df, month, models=forecast_models, trend=trend,
+                                                      baseline=baseline)
+        forecast_data.append(month_forecast.iloc[0].tolist())
+        
+        # Обновляем статистики регрессии прогнозным месяцем за O(колонок)
+        trend.update(MONTH_NUMBERS[month], month_forecast[OPERATION_COLUMNS].iloc[0].to_numpy(dtype=float))
+        
+        # Следующий месяц считается от прогнозного
+        baseline = month_forecast.iloc[0]
+    
+    if not forecast_data or len(forecast_data) != 3:  # Убеждаемся, что у нас точно 3 месяца
+        return None
+    
+    # Создаем общий DataFrame с прогнозами
+    full_forecast_df = pd.DataFrame(forecast_data, columns=base_df.columns)
+    # Объединяем с историческими данными для графиков
+    combined_df = pd.concat([base_df, full_forecast_df], ignore_index=True)
+    
+    # Интервалы прогноза: бутстреп остатков тех же моделей, что и у точечного прогноза
+    report(0.9, "Computing prediction intervals...")
+    paths = bootstrap_forecast_paths(base_df, forecast_months, n_resamples=BOOTSTRAP_RESAMPLES, models=forecast_models)
+    intervals = prediction_intervals(paths, forecast_months, level=INTERVAL_LEVEL)
+    
+    return full_forecast_df, combined_df, backtest, intervals
+
+def forecast_cache_key(data_key, optimization_data, forecast_model):
+    """
+    Ключ кэша прогноза: входная таблица, ответ оптимизации, модель и горизонт с параметрами интервалов
+    """
+    optimization_hash = content_hash(optimization_data) if optimization_data else None
+    return content_hash((FORECAST_CACHE_VERSION, data_key, optimization_hash, forecast_model, FORECAST_MONTHS,
+                         BOOTSTRAP_RESAMPLES, INTERVAL_LEVEL))
+
+def build_forecast_cached(report, cache_key, base_df, forecast_model, site, optimization_run_id):
+    """
+    Строит прогноз в фоне. Результат сохраняется в постоянный кэш и в историю запусков внутри задачи -
+    один раз, даже если сессия уже закрыта или задача общая для нескольких сессий.
+    Возвращает (результат прогноза, идентификатор запуска, ошибка сохранения) или None
+    """
+    result = build_forecast(base_df, forecast_model, report)
+    if result is None:
+        return None
+    forecast_cache.put(cache_key, result)
+    full_forecast_df, combined_df, _, _ = result
+    run_id, history_error = record_job_run(
+        report, 'forecast', content_hash(base_df),
+        {'forecast': full_forecast_df, 'combined': combined_df},
+        model=forecast_model,
+        parameters={'model': forecast_model, 'optimization_run_id': optimization_run_id},
+        site=site
+    )
+    return result, run_id, history_error
+
+def store_forecast_result(result):
+    """
+    Сохраняет результат прогноза в артефакты сессии
+    """
+    full_forecast_df, combined_df, backtest, intervals = result
+    set_session_artifacts('forecast_data', (full_forecast_df, combined_df), ('forecast', 'combined'))
+    set_session_artifacts('forecast_backtest', (backtest,) if backtest is not None else None, ('backtest',))
+    set_session_artifacts('forecast_intervals', intervals, ('interval_lower', 'interval_upper'))
+
 # Показываем прогноз октябрь-декабрь, если он был создан
 if st.session_state.show_forecast:
+    full_forecast_df = None
     # Проверяем, нужно ли пересчитать прогноз
-    if st.session_state.forecast_data is None:
-        
-        with st.spinner('Creating forecasts for October, November, December...'):
+    forecast_job = job_runner.get(st.session_state.get('forecast_job'))
+    if get_session_artifacts('forecast_data') is not None:
+        # Используем сохраненные данные
+        full_forecast_df, combined_df = get_session_artifacts('forecast_data')
+    elif forecast_job is not None and forecast_job.done:
+        # Забираем результат фоновой задачи прогноза
+        st.session_state.forecast_job = None
+        if forecast_job.error is not None:
+            # Без повторной отправки той же задачи при следующем перезапуске
+            st.session_state.show_forecast = False
+            st.error(f"Error during forecasting: {forecast_job.error}")
+        elif forecast_job.result is None:
+            st.session_state.show_forecast = False
+            st.error("The forecast could not be built for all of October-December - check that the table has "
+                     "known month names and numeric values.")
+        else:
+            # Запуск уже сохранен в историю внутри задачи
+            forecast_result, _, history_error = forecast_job.result
+            full_forecast_df, combined_df, _, _ = forecast_result
+            store_forecast_result(forecast_result)
+            if history_error:
+                st.warning(f"Could not save the run to history: {history_error}")
+    elif forecast_job is not None:
+        st.info("Creating forecasts for October, November, December in the background...")
+    else:
+        # Сначала ищем готовый прогноз в постоянном кэше - без разбора ответа оптимизации и пересчета
+        cache_key = forecast_cache_key(df_key, st.session_state.get('optimization_data'), forecast_model)
+        st.session_state.forecast_cache_key = cache_key
+        cached_forecast = forecast_cache.get(cache_key)
+        if cached_forecast is not None:
+            full_forecast_df, combined_df, _, _ = cached_forecast
+            store_forecast_result(cached_forecast)
+        else:
             # Получаем оптимизированные данные для прогноза
             base_df = df  # Исходные данные
             if st.session_state.get('optimization_data'):
-                optimized_df = get_optimized_dataframe(df, st.session_state.optimization_data)
+                optimized_df = shared_store.get(get_optimized_key())
                 if len(optimized_df) > 0 and len(optimized_df.columns) == len(df.columns):
                     base_df = optimized_df  # Используем оптимизированные данные
             
-            # Прогнозируем все оставшиеся месяцы (каждый месяц на основе предыдущего)
-            forecast_months = ["October", "November", "December"]
-            forecast_data = []
-            cumulative_df = base_df.copy()  # Начинаем с базовых данных
-            
-            for month in forecast_months:
-                # Прогнозируем на основе обновленных данных
-                month_forecast, _ = predict_future_operations(cumulative_df, month, use_optimized_data=False)
-                if month_forecast is not None:
-                    forecast_row = month_forecast.iloc[0].tolist()
-                    forecast_data.append(forecast_row)
-                    
-                    # Добавляем прогноз к кумулятивным данным для следующего месяца
-                    new_row_df = pd.DataFrame([forecast_row], columns=cumulative_df.columns)
-                    cumulative_df = pd.concat([cumulative_df, new_row_df], ignore_index=True)
-            
-            if forecast_data and len(forecast_data) == 3:  # Убеждаемся, что у нас точно 3 месяца
-                # Создаем общий DataFrame с прогнозами
-                full_forecast_df = pd.DataFrame(forecast_data, columns=base_df.columns)
-                
-                # Проверяем, что таблица содержит точно 3 строки
-                if len(full_forecast_df) == 3:
-                    # Объединяем с историческими данными для графиков
-                    combined_df = pd.concat([base_df, full_forecast_df], ignore_index=True)
-                    
-                    st.session_state.forecast_data = (full_forecast_df, combined_df)
-    else:
-        # Используем сохраненные данные
-        full_forecast_df, combined_df = st.session_state.forecast_data
+            # Прогноз строится в фоне; одинаковые одновременные запросы разных сессий выполняются один раз
+            forecast_request = ('forecast', content_hash(base_df), forecast_model)
+            st.session_state.forecast_job = job_runner.submit(
+                forecast_request, 'forecast', build_forecast_cached, cache_key, base_df, forecast_model,
+                selected_site, st.session_state.get('optimization_run_id')
+            )
+            st.info("Creating forecasts for October, November, December in the background...")
     
     if full_forecast_df is not None and len(full_forecast_df) > 0:
         # Создаем секцию для результатов прогноза
@@ -1187,35 +1451,23 @@ if st.session_state.show_forecast:
         if len(forecast_df_display) == 3:
             forecast_df_display[forecast_df_display.columns[0]] = expected_months
         
-        for col in forecast_df_display.columns[1:]:  # Пропускаем колонку Month
-            forecast_df_display[col] = pd.to_numeric(forecast_df_display[col], errors='coerce').fillna(0).astype(int)
-        
-        # Конфигурация колонок
-        column_config_forecast = {
-            "Month": st.column_config.TextColumn(
-                "Month",
-                width="medium",
-                help="Месяц прогноза",
-            )
-        }
-        
-        for col in forecast_df_display.columns[1:]:
-            column_config_forecast[col] = st.column_config.NumberColumn(
-                col,
-                width="small",
-                format="%d",
-                help=f"Прогнозное количество: {col}",
-            )
-        
-        # Обрезаем до 3 строк окончательно
-        forecast_df_final = forecast_df_display.head(3).copy()
-        
-        st.dataframe(
-            forecast_df_final, 
-            use_container_width=True, 
-            column_config=column_config_forecast,
-            hide_index=True
-        )
+        with telemetry.span('render.forecast_table'):
+            # Ключ индекса - хеш именно показываемой таблицы (после обрезки и замены месяцев)
+            show_paged_table('forecast_table', content_hash(forecast_df_display), forecast_df_display, "Прогнозное количество")
+        
+        # Результаты бэктеста при автоматическом выборе моделей
+        if get_session_artifacts('forecast_backtest') is not None:
+            with st.expander("Model backtest errors (MAE, rolling origin)"):
+                backtest, = get_session_artifacts('forecast_backtest')
+                # Модели, которым не хватило истории ни для одной точки отсечения, не показываются
+                skipped_models = [model for model in backtest.columns if backtest[model].isna().all()]
+                backtest_display = backtest.drop(columns=skipped_models).round(1)
+                backtest_display['selected'] = select_best_models(backtest)
+                st.dataframe(backtest_display, use_container_width=True)
+                if skipped_models:
+                    st.caption("Not evaluated - not enough history: " + ", ".join(
+                        f"{model} (needs at least {FORECASTERS[model][1]} months)" for model in skipped_models
+                    ) + f". The data has {len(df)} months.")
         
         # Создаем основной график
         st.markdown("### Employee Numbers Trend (May - December 2025):")
@@ -1271,6 +1523,12 @@ if st.session_state.show_forecast:
                         line=dict(color=colors_emp[i], width=3, dash='dot'),
                         marker=dict(size=8, symbol='diamond')
                     ))
+                    
+                    # Интервал прогноза
+                    if get_session_artifacts('forecast_intervals') is not None:
+                        lower, upper = get_session_artifacts('forecast_intervals')
+                        add_interval_band(fig_employees, forecast_months, lower[col], upper[col], colors_emp[i],
+                                          f'{col} ({INTERVAL_LEVEL:.0%} interval)')
         
         fig_employees.update_layout(
             title='Employee Numbers Trends (May-December 2025)',
@@ -1280,89 +1538,392 @@ if st.session_state.show_forecast:
             height=500
         )
         
-        st.plotly_chart(fig_employees, use_container_width=True)
+        with telemetry.span('render.employee_forecast_chart'):
+            st.plotly_chart(fig_employees, use_container_width=True)
         
         
         st.divider()
 
-# Отображение анализа выбранной операции
-if st.session_state.get('show_forecast') and 'selected_operation' in st.session_state:
-    selected_op = st.session_state.get('selected_operation', "")
+# Анализ выбранной операции и директорская аналитика - фрагменты: смена операции или месяца
+# перезапускает только свой раздел, без основной таблицы, разбора оптимизации и прогноза
+@st.fragment
+def show_operation_analysis():
+    """
+    Выбор операции, ее тренд и вложенный фрагмент директорской аналитики
+    """
+    if get_session_artifacts('forecast_data') is None:
+        return
+    full_forecast_df, combined_df = get_session_artifacts('forecast_data')
     
-    if selected_op and selected_op != "Select operation..." and st.session_state.forecast_data:
-        full_forecast_df, combined_df = st.session_state.forecast_data
-        
-        # Отображаем тренд выбранной операции
-        st.header("Operation Trend Analysis")
-        st.subheader(f"Trend for: {selected_op}")
+    # Отображаем тренд выбранной операции
+    st.header("Operation Trend Analysis")
+    selected_op = st.selectbox(
+        "Select operation for detailed analysis:",
+        ["Select operation..."] + OPERATION_COLUMNS,
+        key="selected_operation"
+    )
+    if selected_op == "Select operation...":
+        return
+    st.subheader(f"Trend for: {selected_op}")
+    
+    if selected_op in combined_df.columns:
+        # График: Тренд выбранной операции по месяцам (история, прогноз и интервал прогноза)
+        fig_trend = operation_trend_chart(combined_df, len(full_forecast_df), selected_op,
+                                          get_session_artifacts('forecast_intervals'), INTERVAL_LEVEL)
         
-        if selected_op in combined_df.columns:
-            # Получаем данные для выбранной операции
-            months_order = ["May", "June", "July", "August", "September", "October", "November", "December"]
-            operation_values = pd.to_numeric(combined_df[selected_op], errors='coerce')
-            
-            # Разделяем на исторические и прогнозные
-            hist_len = len(combined_df) - len(full_forecast_df)
-            historical_months = months_order[:hist_len]
-            forecast_months = months_order[hist_len:]
-            historical_values = operation_values[:hist_len]
-            forecast_values = operation_values[hist_len:]
-            
-            # График: Тренд выбранной операции по месяцам
-            fig_trend = go.Figure()
-            
-            # Исторические данные
-            fig_trend.add_trace(go.Scatter(
-                x=historical_months,
-                y=historical_values,
-                mode='lines+markers',
-                name=f'{selected_op} (Historical)',
-                line=dict(color='blue', width=3),
-                marker=dict(size=10)
-            ))
-            
-            # Прогнозные данные
-            if len(forecast_values) > 0:
-                # Соединительная линия
-                bridge_x = [historical_months[-1], forecast_months[0]]
-                bridge_y = [historical_values.iloc[-1], forecast_values.iloc[0]]
-                
-                fig_trend.add_trace(go.Scatter(
-                    x=bridge_x,
-                    y=bridge_y,
-                    mode='lines',
-                    line=dict(color='blue', width=2, dash='dot'),
-                    showlegend=False
-                ))
+        with telemetry.span('render.operation_trend_chart'):
+            st.plotly_chart(fig_trend, use_container_width=True)
+    
+    show_executive_dashboard(combined_df, selected_op)
+    st.divider()
+
+@st.fragment
+def show_executive_dashboard(combined_df, selected_op):
+    """
+    Директорская аналитика по выбранному месяцу
+    """
+    st.divider()
+    st.header("Executive Dashboard")
+    selected_month = st.selectbox(
+        "Select month for executive dashboard:",
+        ["May", "June", "July", "August", "September", "October", "November", "December"],
+        key="selected_month_analysis"
+    )
+    st.subheader(f"Monthly Analysis: {selected_month} 2025")
+    
+    create_executive_dashboard(df, combined_df, selected_op, selected_month)
+
+if st.session_state.get('show_forecast'):
+    show_operation_analysis()
+
+# Дополнительная аналитика: результаты кэшируются по ключам данных (хешам содержимого) и месяцу прогноза
+@st.cache_data
+def compute_comparison_analysis(data_key, forecast_month, _original_df, _optimized_df, _forecast_df):
+    return create_comparison_analysis(_original_df, _optimized_df, _forecast_df, forecast_month)
+
+@st.cache_data
+def compute_performance_metrics(data_key, _original_df, _optimized_df):
+    return create_performance_metrics(_original_df, _optimized_df, None)
+
+@st.cache_data
+def compute_comprehensive_charts(data_key, site, _df):
+    return create_comprehensive_charts(_df, site=site)
+
+@st.cache_data
+def compute_dependency_charts(data_key, _df):
+    return create_dependency_charts(_df)
+
+# Вкладки дополнительной аналитики: считается только выбранная вкладка и только при раскрытом разделе
+with st.expander("📊 Additional analytics", key="analytics_expander", on_change="rerun") as analytics_expander:
+    if analytics_expander.open:
+        comparison_tab, metrics_tab, overview_tab, dependency_tab = st.tabs(
+            ["Comparison", "Performance metrics", "Operations overview", "Staff dependencies"],
+            key="analytics_tab",
+            on_change="rerun"
+        )
+        optimized_key = get_optimized_key() if st.session_state.get('optimization_data') else None
+        analytics_forecast = get_session_artifacts('forecast_data')
+        
+        with comparison_tab:
+            if not comparison_tab.open:
+                pass
+            elif optimized_key is None:
+                st.info("Please perform employee optimization first")
+            else:
+                forecast_key, forecast_month, forecast_df = '', 'n/a', None
+                if analytics_forecast is not None:
+                    full_forecast_df = analytics_forecast[0]
+                    month_column = full_forecast_df.columns[0]
+                    forecast_month = st.selectbox("Forecast month:", full_forecast_df[month_column].tolist(), key="comparison_month")
+                    forecast_df = full_forecast_df[full_forecast_df[month_column] == forecast_month]
+                    forecast_key = st.session_state.forecast_data[0]
+                else:
+                    st.caption("Create a forecast to include forecasted headcount in the comparison.")
                 
-                fig_trend.add_trace(go.Scatter(
-                    x=forecast_months,
-                    y=forecast_values,
-                    mode='lines+markers',
-                    name=f'{selected_op} (Forecast)',
-                    line=dict(color='orange', width=3, dash='dot'),
-                    marker=dict(size=10, symbol='diamond')
-                ))
-            
-            fig_trend.update_layout(
-                title=f'{selected_op} Trend (May-December 2025)',
-                xaxis_title='Month',
-                yaxis_title='Number of Operations',
-                hovermode='x unified',
-                height=500
+                comparison_df, fig_comparison = compute_comparison_analysis(
+                    f"{df_key}:{optimized_key}:{forecast_key}", forecast_month,
+                    df, shared_store.get(optimized_key), forecast_df
+                )
+                if comparison_df is not None:
+                    st.dataframe(comparison_df, use_container_width=True, hide_index=True)
+                    st.plotly_chart(fig_comparison, use_container_width=True)
+        
+        with metrics_tab:
+            if not metrics_tab.open:
+                pass
+            elif optimized_key is None:
+                st.info("Please perform employee optimization first")
+            else:
+                metrics = compute_performance_metrics(f"{df_key}:{optimized_key}", df, shared_store.get(optimized_key))
+                for group, values in (metrics or {}).items():
+                    st.markdown(f"**{group}**")
+                    for metric_column, (name, value) in zip(st.columns(len(values)), values.items()):
+                        metric_column.metric(name, value)
+        
+        with overview_tab:
+            if overview_tab.open:
+                for fig in compute_comprehensive_charts(df_key, selected_site, df):
+                    if fig is not None:
+                        st.plotly_chart(fig, use_container_width=True)
+        
+        with dependency_tab:
+            if dependency_tab.open:
+                col1, col2 = st.columns(2)
+                for chart_column, fig in zip((col1, col2), compute_dependency_charts(df_key, df)):
+                    if fig is not None:
+                        chart_column.plotly_chart(fig, use_container_width=True)
+
+# Иерархический прогноз сети площадок: базовый прогноз на каждом уровне и согласование одним батчем
+@st.cache_data(max_entries=16)
+@telemetry.timed('forecast.hierarchical')
+def compute_network_forecast(method, model, override_key, _site_override):
+    """
+    Согласованный прогноз операций площадок, регионов и компании на FORECAST_MONTHS.
+    Базовый прогноз каждого узла строится моделью прогноза (при 'auto' - лучшей по бэктесту узла);
+    прогноз текущей площадки (если построен) заменяет ее базовый прогноз.
+    Возвращает (согласованный, базовый прогноз, расхождение базового, расхождение согласованного)
+    """
+    store = get_history_store()
+    hierarchy = Hierarchy(store.sites, store.regions)
+    columns = [col for col in OPERATION_COLUMNS if col in store.columns]
+    overrides = {}
+    if _site_override is not None:
+        site, site_forecast_df = _site_override
+        overrides[hierarchy.node_index('Site', site)] = (
+            site_forecast_df[columns].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float)
+        )
+    # Из хранилища отображаются только колонки операций
+    reconciled, base = hierarchical_forecast(store.site_cube(columns), hierarchy, len(FORECAST_MONTHS), method, overrides,
+                                             models=model)
+    return (forecast_frame(reconciled, hierarchy, FORECAST_MONTHS, columns),
+            forecast_frame(base, hierarchy, FORECAST_MONTHS, columns),
+            hierarchy.coherence_gap(base), hierarchy.coherence_gap(reconciled))
+
+if len(history_store.sites) > 1:
+    with st.expander("🏢 Network forecast (sites, regions, company)", key="network_expander", on_change="rerun") as network_expander:
+        if network_expander.open:
+            reconciliation_method = st.selectbox(
+                "Reconciliation method:",
+                RECONCILIATION_METHODS,
+                key="reconciliation_method",
+                help="mint_shrink - minimum trace with shrunk residual covariance; wls/ols - weighted/ordinary least squares"
             )
+            site_forecast = get_session_artifacts('forecast_data')
+            if site_forecast is not None:
+                override_key, site_override = f"{selected_site}:{st.session_state.forecast_data[0]}", (selected_site, site_forecast[0])
+            else:
+                override_key, site_override = '', None
+                st.caption("Create a forecast to use the selected site's model forecast as its base forecast.")
             
-            st.plotly_chart(fig_trend, use_container_width=True)
-        
-        # Директорская аналитика по выбранному месяцу
-        if 'selected_month_analysis' in st.session_state:
-            selected_month = st.session_state.get('selected_month_analysis', 'May')
+            try:
+                reconciled_df, base_df, base_gap, reconciled_gap = compute_network_forecast(reconciliation_method, forecast_model, override_key, site_override)
+                st.caption(f"Largest aggregate mismatch: {base_gap:,.1f} before reconciliation, {reconciled_gap:,.1f} after")
+                
+                levels = ["Total"] + (["Region"] if history_store.regions else []) + ["Site"]
+                level = st.radio("Level:", levels, horizontal=True, key="network_level")
+                level_df = reconciled_df[reconciled_df['Level'] == level]
+                if level == "Site":
+                    level_df = level_df[level_df['Node'] == selected_site]
+                st.dataframe(level_df.drop(columns='Level').round(1), use_container_width=True, hide_index=True)
+                
+                if st.checkbox("Show base forecasts before reconciliation", key="network_show_base"):
+                    st.dataframe(base_df[base_df['Level'] != 'Site'].round(1), use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error(f"Error in network forecast: {str(e)}")
+
+# Функция загрузки сохраненного запуска в текущую сессию
+def load_history_run(run_id):
+    """
+    Восстанавливает результат оптимизации или прогноза из истории без повторного расчета.
+    Запуск другой площадки не загружается. Возвращает True, если запуск загружен
+    """
+    run = run_history.load_run(run_id)
+    if run['site'] != selected_site:
+        st.error(f"Run #{run_id} was made for site {run['site']} - switch to that site to load it.")
+        return False
+    if run['kind'] == 'optimization':
+        replace_optimization_result(run['output_text'], run['source'], run_id)
+        st.session_state.show_optimization = True
+        st.session_state.show_forecast = False
+        st.session_state.forecast_data = None
+    else:
+        st.session_state.forecast_cache_key = None
+        set_session_artifacts('forecast_data', (run['tables']['forecast'], run['tables']['combined']), ('forecast', 'combined'))
+        set_session_artifacts('forecast_backtest', None, ('backtest',))
+        set_session_artifacts('forecast_intervals', None, ('interval_lower', 'interval_upper'))
+        st.session_state.show_forecast = True
+    st.session_state.forecast_job = None
+    return True
+
+# История запусков: повторная загрузка и сравнение запусков
+with st.expander("🗂️ Run history"):
+    try:
+        history_kind = st.radio("Runs:", ["optimization", "forecast"], horizontal=True, key="history_kind")
+        # Только запуски выбранной площадки - их можно загрузить в текущую сессию
+        runs = run_history.list_runs(kind=history_kind, site=selected_site)
+        if runs.empty:
+            st.info(f"No saved runs for site {selected_site} yet")
+        else:
+            st.dataframe(runs, use_container_width=True, hide_index=True)
+            run_labels = {row.run_id: f"#{row.run_id} · {row.created_at} · {row.model} · input {row.input_hash[:8]}"
+                          for row in runs.itertuples()}
             
-            st.divider()
-            st.header("Executive Dashboard")
-            st.subheader(f"Monthly Analysis: {selected_month} 2025")
+            col1, col2 = st.columns(2)
+            with col1:
+                run_a = st.selectbox("Run:", list(run_labels), format_func=run_labels.get, key="history_run_a")
+                if st.button("Load run", key="history_load") and load_history_run(run_a):
+                    rerun()
+            with col2:
+                run_b = st.selectbox("Compare with:", list(run_labels), index=min(1, len(run_labels) - 1),
+                                     format_func=run_labels.get, key="history_run_b")
             
-            create_executive_dashboard(df, combined_df, selected_op, selected_month)
-        
-        st.divider()
+            if run_a != run_b:
+                table_name = 'optimized' if history_kind == 'optimization' else 'forecast'
+                comparison = run_history.compare_runs(run_a, run_b, table_name)
+                changed = comparison[comparison['Change'].fillna(0) != 0]
+                st.markdown(f"**Changes in the {table_name} table (run B - run A): {len(changed)} of {len(comparison)} cells**")
+                st.dataframe(changed, use_container_width=True, hide_index=True)
+    except Exception as e:
+        st.error(f"Error reading run history: {str(e)}")
+
+# Функция выгрузки таблиц результатов (вызывается при скачивании)
+@telemetry.timed('export')
+def export_results(table_keys, fmt, export_session_id):
+    """
+    Возвращает байты выгрузки; результат хранится в общем хранилище по ключам таблиц,
+    поэтому повторное скачивание тех же данных не пересчитывается
+    """
+    export_key = shared_store.derive(
+        f'export_{fmt}',
+        tuple(f'{name}:{key}' for name, key in table_keys.items()),
+        lambda: export_tables({name: shared_store.get(key) for name, key in table_keys.items()}, fmt)
+    )
+    shared_store.attach(export_session_id, f'export_{fmt}', export_key)
+    return shared_store.get(export_key)
+
+# Выгрузка исходной, оптимизированной и прогнозных таблиц
+with st.expander("📥 Export results"):
+    table_keys = {'Original': df_key}
+    if st.session_state.get('optimization_data'):
+        table_keys['Optimized'] = get_optimized_key()
+    if get_session_artifacts('forecast_data') is not None:
+        table_keys['Forecast'], table_keys['Combined'] = st.session_state.forecast_data
+    st.caption(f"Tables: {', '.join(table_keys)}. Files are generated on download and reused for identical data.")
+    
+    export_columns = st.columns(len(EXPORT_FORMATS))
+    for export_column, (fmt, (extension, mime)) in zip(export_columns, EXPORT_FORMATS.items()):
+        with export_column:
+            st.download_button(
+                f"Download {fmt.upper()}",
+                data=lambda fmt=fmt: export_results(table_keys, fmt, session_id),
+                file_name=f"warehouse_results.{extension}",
+                mime=mime,
+                key=f"export_{fmt}"
+            )
+
+# Статические отчеты: директорская аналитика и графики прогноза для просмотра без нагрузки на интерактивный сервер
+REPORTS_PATH = "reports"
+
+def collect_report_sites():
+    """
+    Входы отчетов по площадкам: история каждой площадки из хранилища,
+    для текущей площадки с построенным прогнозом - объединенная таблица и интервалы прогноза
+    """
+    sites = {}
+    for site in history_store.sites:
+        site_df = history_store.frame(site)
+        sites[site] = (site_df, site_df, 0, None)
+    forecast = get_session_artifacts('forecast_data')
+    if forecast is not None:
+        full_forecast_df, combined_df = forecast
+        sites[selected_site] = (df, combined_df, len(full_forecast_df), get_session_artifacts('forecast_intervals'))
+    return sites
+
+def run_report_job(report, sites, formats):
+    """
+    Строит отчеты в фоне (в потоке задачи, без пула процессов)
+    """
+    report(0.1, "Rendering reports...")
+    return generate_reports(REPORTS_PATH, sites, formats=formats)
+
+with st.expander("📄 Static reports"):
+    st.caption("Pre-renders the executive dashboard for every site, operation and month and the forecast charts "
+               "to static HTML. Pages whose inputs are unchanged are skipped.")
+    report_formats = REPORT_FORMATS if st.checkbox("Also write PDF (requires kaleido)", key="report_pdf") else ['html']
+    if st.button("Generate reports", key="generate_reports"):
+        report_sites = collect_report_sites()
+        st.session_state.report_job = job_runner.submit(
+            ('reports', content_hash(report_sites), tuple(report_formats)), 'reports',
+            run_report_job, report_sites, report_formats
+        )
+    
+    # Забираем результат фоновой генерации отчетов
+    report_job = job_runner.get(st.session_state.get('report_job'))
+    if report_job is not None and report_job.done:
+        st.session_state.report_job = None
+        if report_job.error is not None:
+            st.error(f"Report generation failed: {report_job.error}")
+        else:
+            st.session_state.report_summary = report_job.result
+    elif report_job is not None:
+        st.info("Rendering reports in the background...")
+    
+    report_summary = st.session_state.get('report_summary')
+    if report_summary:
+        st.success(f"{report_summary['pages']} pages in '{REPORTS_PATH}/': {report_summary['rendered']} rendered, "
+                   f"{report_summary['skipped']} unchanged and skipped. Open '{REPORTS_PATH}/index.html' to browse.")
+        st.download_button(
+            "Download reports (zip)",
+            data=lambda: archive_reports(REPORTS_PATH),
+            file_name="reports.zip",
+            mime="application/zip",
+            key="download_reports"
+        )
+
+# Статус фоновых задач: опрос раз в секунду, по завершении задачи - полный перезапуск для показа результата
+@st.fragment(run_every=1.0)
+def show_background_jobs():
+    jobs = [job_runner.get(st.session_state.get(name)) for name in ('optimization_job', 'forecast_job', 'report_job')]
+    jobs = [job for job in jobs if job is not None]
+    if any(job.done for job in jobs):
+        st.rerun()
+    for job in jobs:
+        st.progress(job.progress, text=f"{job.kind.capitalize()}: {job.message or job.status}")
+
+if st.session_state.get('optimization_job') or st.session_state.get('forecast_job') or st.session_state.get('report_job'):
+    with st.sidebar:
+        st.subheader("Background jobs")
+        show_background_jobs()
+
+# Отладочная информация о памяти: общие артефакты, сессии и содержимое текущей сессии
+if st.sidebar.checkbox("Show memory usage (debug)", key="show_memory_debug"):
+    with st.expander("🧠 Memory usage", expanded=True):
+        st.markdown("**Shared artifacts (one copy per process):**")
+        st.dataframe(shared_store.artifact_table(), use_container_width=True, hide_index=True)
+        st.markdown("**Sessions:**")
+        st.dataframe(shared_store.session_table(), use_container_width=True, hide_index=True)
+        st.caption(f"Background jobs: {job_runner.stats['executed']} executed, "
+                   f"{job_runner.stats['coalesced']} coalesced with an identical running job")
+        cache_summary = forecast_cache.summary()
+        st.caption(f"Forecast cache: {cache_summary['entries']} entries ({cache_summary['bytes'] / 1024:.0f} KB), "
+                   f"{cache_summary['hits']} hits, {cache_summary['misses']} misses, {cache_summary['evicted']} evicted")
+        st.markdown("**Current session state:**")
+        session_sizes = pd.DataFrame(
+            [{'Key': key, 'Size (KB)': round(object_size(value) / 1024, 1)} for key, value in st.session_state.items()],
+            columns=['Key', 'Size (KB)']
+        )
+        st.dataframe(session_sizes.sort_values('Size (KB)', ascending=False), use_container_width=True, hide_index=True)
+
+# Телеметрия: перцентили времени по этапам и выгрузка спанов/метрик
+if st.sidebar.checkbox("Show performance telemetry", key="show_telemetry"):
+    with st.expander("⏱️ Performance telemetry", expanded=True):
+        st.caption("Stage timings across all sessions of this process (ms). Allocation tracking is "
+                   f"{'on' if TRACK_ALLOCATIONS else 'off (set TRACK_ALLOCATIONS=1 to enable)'}.")
+        st.dataframe(telemetry.summary(), use_container_width=True, hide_index=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download spans (JSONL)", telemetry.to_jsonl(), file_name="spans.jsonl", mime="application/jsonl")
+        with col2:
+            st.download_button("Download metrics (Prometheus)", telemetry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
 
+telemetry.record('rerun.total', time.perf_counter() - rerun_started)
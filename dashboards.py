@@ -0,0 +1,369 @@
+"""
+Построение директорской аналитики и графиков тренда без Streamlit - для приложения и статических отчетов
+"""
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def add_interval_band(fig, months, lower, upper, color, name):
+    """
+    Добавляет на график полупрозрачную полосу интервала прогноза
+    """
+    fig.add_trace(go.Scatter(
+        x=list(months) + list(months)[::-1],
+        y=list(upper) + list(lower)[::-1],
+        fill='toself',
+        fillcolor=color,
+        opacity=0.2,
+        line=dict(width=0),
+        hoverinfo='skip',
+        name=name
+    ))
+
+
+def executive_dashboard(original_df, combined_df, selected_operation, selected_month):
+    """
+    Метрики и графики директорской аналитики за месяц.
+    Использует original_df для данных персонала (реальные показатели) и combined_df для операций.
+    Возвращает {'metrics': [параметры карточек], 'figures': [графики]} или None, если данных за месяц нет
+    """
+    months_order = ["May", "June", "July", "August", "September", "October", "November", "December"]
+    month_idx = months_order.index(selected_month)
+    
+    # Для исторических месяцев (May-September) берем данные из первой таблицы
+    if month_idx < len(original_df):
+        # Данные операций из combined_df (могут включать прогнозы)
+        month_operations_data = combined_df.iloc[month_idx] if month_idx < len(combined_df) else combined_df.iloc[-1]
+        # Данные персонала из original_df (реальные показатели)
+        month_staff_data = original_df.iloc[month_idx] if month_idx < len(original_df) else original_df.iloc[-1]
+    elif month_idx < len(combined_df):
+        # Для прогнозных месяцев используем combined_df, но предупреждаем о прогнозных данных персонала
+        month_operations_data = combined_df.iloc[month_idx]
+        month_staff_data = combined_df.iloc[month_idx]
+    else:
+        return None
+    
+    # Получаем данные за месяц - операции из combined_df, персонал из original_df
+    operation_value = pd.to_numeric(month_operations_data[selected_operation], errors='coerce') or 0
+    
+    # Ключевые метрики
+    operation_columns = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40', 
+                       'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service', 
+                       'Goods_Storage', 'Additional_Service']
+    employee_columns = ['Director', 'Sales', 'Operation_manager', 'Loader', 'Forklift_Operator']
+    
+    # Операции берем из combined_df (могут включать прогнозы)
+    total_operations = sum([pd.to_numeric(month_operations_data[col], errors='coerce') or 0 for col in operation_columns])
+    # Персонал берем из original_df (реальные показатели)
+    total_employees = sum([pd.to_numeric(month_staff_data[col], errors='coerce') or 0 for col in employee_columns])
+        
+    # Метрики в карточках
+    metrics = []
+    figures = []
+        
+    # Рассчитываем изменения по сравнению с предыдущим месяцем для всех метрик
+    delta_operation = None
+    delta_total_ops = None
+    delta_staff = None 
+    delta_productivity = None
+    
+    if month_idx > 0:
+        # Получаем данные предыдущего месяца
+        if month_idx - 1 < len(original_df):  
+            prev_month_operations_data = original_df.iloc[month_idx - 1] if month_idx - 1 < len(original_df) else combined_df.iloc[month_idx - 1]
+            prev_month_staff_data = original_df.iloc[month_idx - 1] if month_idx - 1 < len(original_df) else original_df.iloc[-1]
+        else:  
+            prev_month_operations_data = combined_df.iloc[month_idx - 1]
+            prev_month_staff_data = combined_df.iloc[month_idx - 1]
+        
+        # Расчеты для выбранной операции
+        prev_operation_value = pd.to_numeric(prev_month_operations_data[selected_operation], errors='coerce') or 0
+        if prev_operation_value > 0:
+            change_operation = ((operation_value - prev_operation_value) / prev_operation_value * 100)
+            delta_operation = f"{change_operation:+.1f}%"
+        
+        # Расчеты для Total Operations
+        prev_total_operations = sum([pd.to_numeric(prev_month_operations_data[col], errors='coerce') or 0 for col in operation_columns])
+        if prev_total_operations > 0:
+            change_total_ops = ((total_operations - prev_total_operations) / prev_total_operations * 100)
+            delta_total_ops = f"{change_total_ops:+.1f}%"
+        
+        # Расчеты для Total Staff
+        prev_total_employees = sum([pd.to_numeric(prev_month_staff_data[col], errors='coerce') or 0 for col in employee_columns])
+        if prev_total_employees > 0:
+            change_staff = ((total_employees - prev_total_employees) / prev_total_employees * 100)
+            delta_staff = f"{change_staff:+.1f}%"
+        
+        # Расчеты для Productivity
+        prev_productivity = prev_total_operations / prev_total_employees if prev_total_employees > 0 else 0
+        productivity = total_operations / total_employees if total_employees > 0 else 0
+        if prev_productivity > 0:
+            change_productivity = ((productivity - prev_productivity) / prev_productivity * 100)
+            delta_productivity = f"{change_productivity:+.1f}%"
+    
+    metrics.append(dict(
+        label=f"{selected_operation}",
+        value=f"{int(operation_value)}",
+        delta=delta_operation
+    ))
+    
+    metrics.append(dict(
+        label="Total Operations",
+        value=f"{int(total_operations)}",
+        delta=delta_total_ops
+    ))
+    
+    metrics.append(dict(
+        label="Total Staff",
+        value=f"{int(total_employees)}",
+        delta=delta_staff
+    ))
+    
+    productivity = total_operations / total_employees if total_employees > 0 else 0
+    metrics.append(dict(
+        label="Productivity",
+        value=f"{productivity:.1f}",
+        delta=delta_productivity,
+        help="Operations per employee - shows how many warehouse operations each employee handles on average per month. Higher values indicate better efficiency."
+    ))
+        
+    # График 1: Обзор всех операций за месяц
+    operation_values = [pd.to_numeric(month_operations_data[col], errors='coerce') or 0 for col in operation_columns]
+    operation_labels = [
+        'Direct 20ft', 'Cross 20ft', 'Direct 40ft', 'Cross 40ft',
+        'Pallet Direct', 'Pallet Cross', 'Revenue Ops', 'Reload Service', 
+        'Storage', 'Additional'
+    ]
+        
+    # Фильтруем операции с нулевыми значениями
+    filtered_values = []
+    filtered_labels = []
+    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', '#54A0FF', '#5F27CD', '#00D2D3', '#FF9F43']
+    filtered_colors = []
+    
+    for i, (value, label) in enumerate(zip(operation_values, operation_labels)):
+        if value > 0:
+            filtered_values.append(value)
+            filtered_labels.append(f"{label}: {int(value)}")
+            filtered_colors.append(colors[i % len(colors)])
+    
+    if filtered_values:
+        fig_all_ops = go.Figure(data=[
+            go.Pie(
+                labels=filtered_labels,
+                values=filtered_values,
+                hole=0.3,
+                marker=dict(
+                    colors=filtered_colors,
+                    line=dict(color='#FFFFFF', width=2)
+                ),
+                textinfo='label+percent',
+                textposition='auto',
+                hovertemplate='%{label}<br>%{value} operations<br>%{percent}<extra></extra>'
+            )
+        ])
+        
+        fig_all_ops.update_layout(
+            title={
+                'text': f"All Operations Overview - {selected_month} 2025",
+                'x': 0.5,
+                'font': {'size': 20, 'color': '#2E86C1'}
+            },
+            font=dict(size=12),
+            height=500,
+            showlegend=True,
+            legend=dict(
+                orientation="v",
+                yanchor="middle",
+                y=0.5,
+                xanchor="left",
+                x=1.05
+            )
+        )
+        
+        figures.append(fig_all_ops)
+    
+    # График 2: Соотношение выбранной операции к общему объему
+    if operation_value > 0 and total_operations > operation_value:
+        fig_pie = go.Figure(data=[
+            go.Pie(
+                labels=[selected_operation, "Other Operations"],
+                values=[operation_value, total_operations - operation_value],
+                hole=0.4,
+                marker=dict(
+                    colors=['#FF6B6B', '#4ECDC4'],
+                    line=dict(color='#FFFFFF', width=3)
+                )
+            )
+        ])
+        
+        fig_pie.update_layout(
+            title={
+                'text': f"{selected_operation} Share in Total Operations",
+                'x': 0.5,
+                'font': {'size': 20, 'color': '#2E86C1'}
+            },
+            font=dict(size=14),
+            height=400,
+            showlegend=True
+        )
+        
+        figures.append(fig_pie)
+    
+    # График 3: Распределение сотрудников (реальные данные)
+    employee_values = [pd.to_numeric(month_staff_data[col], errors='coerce') or 0 for col in employee_columns]
+    
+    fig_bar = go.Figure(data=[
+        go.Bar(
+            x=employee_columns,
+            y=employee_values,
+            marker=dict(
+                color=['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57'],
+                line=dict(color='#FFFFFF', width=2)
+            ),
+            text=employee_values,
+            textposition='auto'
+        )
+    ])
+    
+    fig_bar.update_layout(
+        title={
+            'text': f"Staff Distribution in {selected_month}",
+            'x': 0.5,
+            'font': {'size': 20, 'color': '#2E86C1'}
+        },
+        xaxis_title="Employee Type",
+        yaxis_title="Number of Employees",
+        font=dict(size=14),
+        height=400,
+        showlegend=False
+    )
+    
+    figures.append(fig_bar)
+    
+    # График 4: Сравнение с предыдущим месяцем
+    if month_idx > 0:
+        prev_month_name = months_order[month_idx - 1]
+        
+        # Правильно определяем источник данных для предыдущего месяца
+        if month_idx - 1 < len(original_df):  # Предыдущий месяц - исторические данные
+            prev_month_operations_data = original_df.iloc[month_idx - 1] if month_idx - 1 < len(original_df) else combined_df.iloc[month_idx - 1]
+        else:  # Предыдущий месяц - прогнозные данные
+            prev_month_operations_data = combined_df.iloc[month_idx - 1]
+        
+        prev_operation_value = pd.to_numeric(prev_month_operations_data[selected_operation], errors='coerce') or 0
+        
+        change = ((operation_value - prev_operation_value) / prev_operation_value * 100) if prev_operation_value > 0 else 0
+        
+        fig_comparison = go.Figure(data=[
+            go.Bar(
+                x=[prev_month_name, selected_month],
+                y=[prev_operation_value, operation_value],
+                marker=dict(
+                    color=[
+                        '#95A5A6',  # Серый для предыдущего месяца
+                        '#E74C3C' if change < 0 else '#27AE60'  # Красный при снижении, зеленый при росте
+                    ],
+                    line=dict(color='#FFFFFF', width=2)
+                ),
+                text=[int(prev_operation_value), int(operation_value)],
+                textposition='auto'
+            )
+        ])
+        
+        fig_comparison.update_layout(
+            title={
+                'text': f"{selected_operation}: Month-to-Month Comparison",
+                'x': 0.5,
+                'font': {'size': 20, 'color': '#2E86C1'}
+            },
+            xaxis_title="Month",
+            yaxis_title="Operations",
+            font=dict(size=14),
+            height=400,
+            showlegend=False,
+            annotations=[
+                dict(
+                    x=1,
+                    y=max(prev_operation_value, operation_value) * 1.1,
+                    text=f"Change: {change:+.1f}%",
+                    showarrow=True,
+                    arrowhead=2,
+                    arrowcolor='#E74C3C' if change < 0 else '#27AE60',
+                    font=dict(size=16, color='#E74C3C' if change < 0 else '#27AE60')
+                )
+            ]
+        )
+        
+        figures.append(fig_comparison)
+    
+    return {'metrics': metrics, 'figures': figures}
+
+
+def operation_trend_chart(combined_df, forecast_rows, selected_op, intervals=None, interval_level=0.9):
+    """
+    График тренда операции: история и прогноз (последние forecast_rows строк) с интервалом прогноза.
+    intervals - (нижняя, верхняя) таблицы интервалов или None
+    """
+    # Получаем данные для выбранной операции
+    months_order = ["May", "June", "July", "August", "September", "October", "November", "December"]
+    operation_values = pd.to_numeric(combined_df[selected_op], errors='coerce')
+    
+    # Разделяем на исторические и прогнозные
+    hist_len = len(combined_df) - forecast_rows
+    historical_months = months_order[:hist_len]
+    forecast_months = months_order[hist_len:]
+    historical_values = operation_values[:hist_len]
+    forecast_values = operation_values[hist_len:]
+    
+    # График: Тренд выбранной операции по месяцам
+    fig_trend = go.Figure()
+    
+    # Исторические данные
+    fig_trend.add_trace(go.Scatter(
+        x=historical_months,
+        y=historical_values,
+        mode='lines+markers',
+        name=f'{selected_op} (Historical)',
+        line=dict(color='blue', width=3),
+        marker=dict(size=10)
+    ))
+    
+    # Прогнозные данные
+    if len(forecast_values) > 0:
+        # Соединительная линия
+        bridge_x = [historical_months[-1], forecast_months[0]]
+        bridge_y = [historical_values.iloc[-1], forecast_values.iloc[0]]
+        
+        fig_trend.add_trace(go.Scatter(
+            x=bridge_x,
+            y=bridge_y,
+            mode='lines',
+            line=dict(color='blue', width=2, dash='dot'),
+            showlegend=False
+        ))
+        
+        fig_trend.add_trace(go.Scatter(
+            x=forecast_months,
+            y=forecast_values,
+            mode='lines+markers',
+            name=f'{selected_op} (Forecast)',
+            line=dict(color='orange', width=3, dash='dot'),
+            marker=dict(size=10, symbol='diamond')
+        ))
+        
+        # Интервал прогноза
+        if intervals is not None:
+            lower, upper = intervals
+            add_interval_band(fig_trend, forecast_months, lower[selected_op], upper[selected_op], 'orange',
+                              f'{selected_op} ({interval_level:.0%} interval)')
+    
+    fig_trend.update_layout(
+        title=f'{selected_op} Trend (May-December 2025)',
+        xaxis_title='Month',
+        yaxis_title='Number of Operations',
+        hovermode='x unified',
+        height=500
+    )
+    
+    return fig_trend
@@ -0,0 +1,223 @@
+"""
+Общее для всех сессий неизменяемое хранилище данных с адресацией по хешу содержимого
+"""
+import hashlib
+import pickle
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _update_hash(hasher, obj):
+    if isinstance(obj, pd.DataFrame):
+        hasher.update(b'DataFrame')
+        hasher.update(repr(list(obj.columns)).encode())
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        hasher.update(b'Series')
+        hasher.update(repr(obj.name).encode())
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        hasher.update(f'ndarray{obj.dtype}{obj.shape}'.encode())
+        hasher.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (tuple, list)):
+        hasher.update(f'{type(obj).__name__}{len(obj)}'.encode())
+        for item in obj:
+            _update_hash(hasher, item)
+    elif isinstance(obj, dict):
+        hasher.update(f'dict{len(obj)}'.encode())
+        for key in sorted(obj, key=repr):
+            _update_hash(hasher, key)
+            _update_hash(hasher, obj[key])
+    elif isinstance(obj, str):
+        hasher.update(b'str')
+        hasher.update(obj.encode())
+    else:
+        hasher.update(pickle.dumps(obj))
+
+
+def content_hash(obj):
+    """
+    Хеш содержимого таблиц, массивов, строк и их комбинаций
+    """
+    hasher = hashlib.sha256()
+    _update_hash(hasher, obj)
+    return hasher.hexdigest()[:16]
+
+
+def object_size(obj):
+    """
+    Оценка занимаемой памяти в байтах
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(object_size(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(object_size(k) + object_size(v) for k, v in obj.items())
+    return sys.getsizeof(obj)
+
+
+def _read_only_view(obj):
+    # Таблицы выдаются поверхностными копиями (без копирования данных), массивы - без права записи
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy(deep=False)
+    if isinstance(obj, np.ndarray):
+        view = obj.view()
+        view.flags.writeable = False
+        return view
+    return obj
+
+
+class SharedStore:
+    """
+    Процессное хранилище артефактов (датасеты и производные результаты) с адресацией по содержимому.
+    Сессии хранят только ключи; одинаковые данные разных сессий занимают память один раз.
+    Объект, переданный в put, принадлежит хранилищу и не должен изменяться
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._artifacts = {}  # ключ -> {'value', 'kind', 'bytes', 'pinned', 'created', 'last_access'}
+        self._identity = {}  # id(объекта) -> ключ, чтобы повторный put того же объекта не хешировал данные
+        self._derived = {}  # (вид, ключи входов) -> ключ результата
+        self._sessions = {}  # сессия -> {имя: ключ или кортеж ключей}
+        self._last_seen = {}  # сессия -> время последнего обращения
+
+    def put(self, value, kind, pinned=False):
+        """
+        Сохраняет объект и возвращает его ключ (хеш содержимого)
+        """
+        with self._lock:
+            key = self._identity.get(id(value))
+            if key is not None and self._artifacts[key]['value'] is value:
+                return key
+
+        key = content_hash(value)
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            now = time.time()
+            if artifact is None:
+                self._artifacts[key] = {
+                    'value': value,
+                    'kind': kind,
+                    'bytes': object_size(value),
+                    'pinned': pinned,
+                    'created': now,
+                    'last_access': now,
+                }
+                self._identity[id(value)] = key
+            else:
+                artifact['last_access'] = now
+                artifact['pinned'] = artifact['pinned'] or pinned
+        return key
+
+    def get(self, key):
+        with self._lock:
+            artifact = self._artifacts[key]
+            artifact['last_access'] = time.time()
+            return _read_only_view(artifact['value'])
+
+    def get_many(self, keys):
+        return tuple(self.get(key) for key in keys)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._artifacts
+
+    def derive(self, kind, input_keys, compute):
+        """
+        Возвращает ключ производного результата от входов input_keys; вычисляет compute() один раз на процесс
+        """
+        derived_id = (kind, tuple(input_keys))
+        with self._lock:
+            key = self._derived.get(derived_id)
+            if key is not None and key in self._artifacts:
+                return key
+        key = self.put(compute(), kind)
+        with self._lock:
+            self._derived[derived_id] = key
+        return key
+
+    def attach(self, session_id, name, keys):
+        """
+        Запоминает, что сессия ссылается на артефакт(ы) под именем name (None - убрать ссылку)
+        и продлевает жизнь этих артефактов
+        """
+        now = time.time()
+        with self._lock:
+            refs = self._sessions.setdefault(session_id, {})
+            if keys is None:
+                refs.pop(name, None)
+            else:
+                refs[name] = keys
+                for key in self._session_keys({name: keys}):
+                    if key in self._artifacts:
+                        self._artifacts[key]['last_access'] = now
+            self._last_seen[session_id] = now
+
+    def touch(self, session_id):
+        with self._lock:
+            self._sessions.setdefault(session_id, {})
+            self._last_seen[session_id] = time.time()
+
+    def _session_keys(self, refs):
+        for keys in refs.values():
+            yield from (keys if isinstance(keys, tuple) else (keys,))
+
+    def collect(self, idle_seconds=3600, grace_seconds=300):
+        """
+        Забывает неактивные сессии и удаляет артефакты, на которые никто не ссылается
+        и к которым не обращались последние grace_seconds
+        """
+        now = time.time()
+        with self._lock:
+            for session_id in [s for s, seen in self._last_seen.items() if now - seen > idle_seconds]:
+                self._sessions.pop(session_id, None)
+                self._last_seen.pop(session_id, None)
+
+            referenced = {key for refs in self._sessions.values() for key in self._session_keys(refs)}
+            for key in [k for k, a in self._artifacts.items()
+                        if not a['pinned'] and k not in referenced and now - a['last_access'] > grace_seconds]:
+                del self._artifacts[key]
+            self._identity = {i: k for i, k in self._identity.items() if k in self._artifacts}
+            self._derived = {d: k for d, k in self._derived.items() if k in self._artifacts}
+
+    def artifact_table(self):
+        """
+        Память по артефактам: размер, вид и число ссылающихся сессий
+        """
+        with self._lock:
+            rows = []
+            for key, artifact in self._artifacts.items():
+                sessions = sum(key in set(self._session_keys(refs)) for refs in self._sessions.values())
+                rows.append({
+                    'Key': key,
+                    'Kind': artifact['kind'],
+                    'Size (KB)': round(artifact['bytes'] / 1024, 1),
+                    'Sessions': sessions,
+                    'Pinned': artifact['pinned'],
+                })
+        return pd.DataFrame(rows, columns=['Key', 'Kind', 'Size (KB)', 'Sessions', 'Pinned'])
+
+    def session_table(self):
+        """
+        Память по сессиям: объем артефактов, на которые ссылается каждая сессия
+        """
+        now = time.time()
+        with self._lock:
+            rows = []
+            for session_id, refs in self._sessions.items():
+                keys = set(self._session_keys(refs)) & set(self._artifacts)
+                rows.append({
+                    'Session': session_id[:8],
+                    'Artifacts': ', '.join(sorted(refs)),
+                    'Referenced (KB)': round(sum(self._artifacts[k]['bytes'] for k in keys) / 1024, 1),
+                    'Idle (s)': int(now - self._last_seen.get(session_id, now)),
+                })
+        return pd.DataFrame(rows, columns=['Session', 'Artifacts', 'Referenced (KB)', 'Idle (s)'])
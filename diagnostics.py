@@ -0,0 +1,62 @@
+"""
+Регрессионная диагностика: зависимость численности ролей от объема операций
+"""
+import numpy as np
+import pandas as pd
+
+from staffing import EMPLOYEE_COLUMNS, OPERATION_COLUMNS
+
+TOTAL_OPERATIONS = 'Total_operations'
+
+
+def fit_pairwise_regressions(df, roles=None, operations=None):
+    """
+    Парные регрессии роль = a + b * операция для всех пар роль x операция одним батчем.
+    Возвращает длинную таблицу: наклон, свободный член, R², эластичность в средних точках и число точек
+    """
+    roles = roles or EMPLOYEE_COLUMNS
+    operations = operations or OPERATION_COLUMNS + [TOTAL_OPERATIONS]
+
+    numeric = df.reindex(columns=OPERATION_COLUMNS + roles).apply(pd.to_numeric, errors='coerce').fillna(0)
+    numeric[TOTAL_OPERATIONS] = numeric[OPERATION_COLUMNS].sum(axis=1)
+    x = numeric.reindex(columns=operations, fill_value=0).to_numpy(dtype=float)  # (n, операции)
+    y = numeric.reindex(columns=roles, fill_value=0).to_numpy(dtype=float)  # (n, роли)
+
+    x_mean, y_mean = x.mean(axis=0), y.mean(axis=0)
+    xc, yc = x - x_mean, y - y_mean
+    sxx = (xc ** 2).sum(axis=0)  # (операции,)
+    syy = (yc ** 2).sum(axis=0)  # (роли,)
+    sxy = yc.T @ xc  # (роли, операции)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        intercept = y_mean[:, None] - slope * x_mean
+        r2 = np.where((sxx > 0) & (syy[:, None] > 0), sxy ** 2 / (sxx * syy[:, None]), 0.0)
+        elasticity = np.where(y_mean[:, None] != 0, slope * x_mean / y_mean[:, None], np.nan)
+
+    grid = pd.MultiIndex.from_product([roles, operations], names=['Role', 'Operation'])
+    return pd.DataFrame({
+        'Slope': slope.ravel(),
+        'Intercept': intercept.ravel(),
+        'R2': r2.ravel(),
+        'Elasticity': elasticity.ravel(),
+        'Points': len(x),
+    }, index=grid).reset_index()
+
+
+def regression_matrix(fits, metric='Elasticity'):
+    """
+    Матрица роль x операция по выбранной метрике (порядок строк и колонок - как в fits)
+    """
+    matrix = fits.pivot(index='Role', columns='Operation', values=metric)
+    return matrix.loc[fits['Role'].unique(), fits['Operation'].unique()]
+
+
+def pair_values(df, role, operation):
+    """
+    Точки (операция, роль) для детального графика пары
+    """
+    columns = OPERATION_COLUMNS if operation == TOTAL_OPERATIONS else [operation]
+    x = df.reindex(columns=columns).apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+    y = pd.to_numeric(df[role], errors='coerce').fillna(0)
+    return x.to_numpy(dtype=float), y.to_numpy(dtype=float)
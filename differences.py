@@ -0,0 +1,105 @@
+"""
+Векторное сравнение исходной и оптимизированной численности по площадкам, месяцам и ролям
+"""
+import numpy as np
+import pandas as pd
+
+from forecasting import DEFAULT_SITE, SITE_COLUMN
+from staffing import EMPLOYEE_COLUMNS
+
+NO_CHANGE_THRESHOLD = 0.1  # Изменение среднего меньше этого значения считается несущественным
+DIFF_COLUMNS = ['Site', 'Month', 'Role', 'Before', 'After', 'Change', 'Change (%)']
+
+
+def _indexed(df, roles):
+    # Таблица ролей с индексом (площадка, месяц, номер повтора месяца на площадке)
+    month = df[df.columns[0]].astype(str).str.strip()
+    site = df[SITE_COLUMN].astype(str) if SITE_COLUMN in df.columns else pd.Series(DEFAULT_SITE, index=df.index)
+    occurrence = month.groupby([site, month]).cumcount()
+    values = df.reindex(columns=roles).apply(pd.to_numeric, errors='coerce')
+    values.index = pd.MultiIndex.from_arrays([site, month, occurrence], names=['Site', 'Month', 'occurrence'])
+    return values
+
+
+def diff_frame(original_df, optimized_df, roles=None):
+    """
+    Изменения по каждой площадке x месяцу x роли одним проходом:
+    было, стало, абсолютное и процентное изменение (длинная таблица, порядок строк исходной таблицы,
+    затем строки, которых нет в исходной). Строка, отсутствующая в одной из таблиц, дает NaN на этой стороне
+    """
+    roles = [role for role in roles or EMPLOYEE_COLUMNS if role in original_df.columns and role in optimized_df.columns]
+    before = _indexed(original_df, roles)
+    after = _indexed(optimized_df, roles)
+    keys = before.index.append(after.index[~after.index.isin(before.index)])
+    before_values = before.reindex(keys).to_numpy(dtype=float)
+    after_values = after.reindex(keys).to_numpy(dtype=float)
+
+    change = after_values - before_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = np.where(before_values > 0, change / before_values * 100, np.nan)
+
+    n_rows, n_roles = before_values.shape
+    return pd.DataFrame({
+        'Site': np.repeat(keys.get_level_values('Site'), n_roles),
+        'Month': np.repeat(keys.get_level_values('Month'), n_roles),
+        'Role': np.tile(roles, n_rows),
+        'Before': before_values.ravel(),
+        'After': after_values.ravel(),
+        'Change': change.ravel(),
+        'Change (%)': percent.ravel(),
+    }, columns=DIFF_COLUMNS)
+
+
+def changed_cells(diff):
+    """
+    Маска ячеек, которые различаются: ненулевое изменение или значение есть только с одной стороны
+    """
+    return (diff['Change'].notna() & (diff['Change'] != 0)) | (diff['Before'].isna() != diff['After'].isna())
+
+
+def missing_rows(diff, side='After'):
+    """
+    Пары (площадка, месяц), у которых на стороне side нет ни одного значения
+    """
+    empty = diff[side].isna().groupby([diff['Site'], diff['Month']], sort=False).all()
+    return empty[empty].index.tolist()
+
+
+def role_summary(diff):
+    """
+    Средние значения до/после по площадке и роли за весь период и направление изменения
+    """
+    summary = diff.groupby(['Site', 'Role'], sort=False)[['Before', 'After']].mean()
+    summary['Change'] = summary['After'] - summary['Before']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary['Change (%)'] = np.where(summary['Before'] > 0, summary['Change'] / summary['Before'] * 100, np.nan)
+    summary['Direction'] = np.select(
+        [summary['Change'] > NO_CHANGE_THRESHOLD, summary['Change'] < -NO_CHANGE_THRESHOLD],
+        ['⬆️ Increase', '⬇️ Decrease'],
+        default='➡️ No significant change'
+    )
+    return summary.dropna(subset=['Before', 'After']).reset_index()
+
+
+def differences_markdown(diff):
+    """
+    Текстовый отчет по средним значениям ролей (по площадкам, если их несколько)
+    """
+    summary = role_summary(diff)
+    months = diff['Month'].unique()
+    period = f"{months[0]}–{months[-1]}" if len(months) else ""
+    lines = [f"Analysis of average values for each job position ({period}):", ""]
+    multi_site = summary['Site'].nunique() > 1
+    for site, site_summary in summary.groupby('Site', sort=False):
+        if multi_site:
+            lines += [f"#### {site}", ""]
+        for row in site_summary.itertuples(index=False):
+            percent = f" ({row[5]:+.1f}%)" if pd.notna(row[5]) else ""
+            lines += [
+                f"**{row.Role}**: {row.Direction}",
+                f"   - Average before: {row.Before:.1f} чел.",
+                f"   - Average after: {row.After:.1f} чел.",
+                f"   - Average difference: {row.Change:+.1f} чел.{percent}",
+                "",
+            ]
+    return "\n".join(lines)
@@ -0,0 +1,105 @@
+"""
+Выгрузка таблиц результатов в CSV, Parquet и многолистовой Excel с постоянным расходом памяти
+"""
+import io
+import tempfile
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+BATCH_ROWS = 50000
+
+# Формат -> (расширение файла выгрузки, MIME-тип)
+EXPORT_FORMATS = {
+    'csv': ('csv.zip', 'application/zip'),
+    'parquet': ('parquet.zip', 'application/zip'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def iter_batches(table, batch_rows=BATCH_ROWS):
+    """
+    Батчи не более batch_rows строк из таблицы или итератора таблиц (например, по площадкам)
+    """
+    frames = [table] if isinstance(table, pd.DataFrame) else table
+    for frame in frames:
+        for start in range(0, len(frame), batch_rows):
+            yield frame.iloc[start:start + batch_rows]
+
+
+def write_csv(table, sink, batch_rows=BATCH_ROWS):
+    """
+    Пишет таблицу в текстовый поток по батчам; заголовок - только в первом батче
+    """
+    header = True
+    for batch in iter_batches(table, batch_rows):
+        batch.to_csv(sink, header=header, index=False)
+        header = False
+
+
+def write_parquet(table, sink, batch_rows=BATCH_ROWS):
+    """
+    Пишет таблицу в Parquet: каждый батч - отдельная группа строк, схема - по первому батчу
+    """
+    writer = None
+    try:
+        for batch in iter_batches(table, batch_rows):
+            if writer is None:
+                schema = pa.Schema.from_pandas(batch, preserve_index=False)
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_excel(tables, sink, batch_rows=BATCH_ROWS):
+    """
+    Пишет {имя листа: таблица} в одну книгу Excel в потоковом (write-only) режиме openpyxl
+    """
+    workbook = Workbook(write_only=True)
+    for name, table in tables.items():
+        sheet = workbook.create_sheet(title=str(name)[:31])  # Ограничение Excel на длину имени листа
+        header_written = False
+        for batch in iter_batches(table, batch_rows):
+            if not header_written:
+                sheet.append([str(col) for col in batch.columns])
+                header_written = True
+            values = batch.astype(object).where(batch.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                sheet.append(list(row))
+    workbook.save(sink)
+
+
+def write_export(tables, fmt, sink, batch_rows=BATCH_ROWS):
+    """
+    Пишет {имя: таблица} в выбранный формат в файл или поток sink (с поддержкой seek).
+    CSV и Parquet упаковываются в zip-архив (файл на таблицу), Excel - лист на таблицу
+    """
+    if fmt == 'xlsx':
+        write_excel(tables, sink, batch_rows)
+    elif fmt in ('csv', 'parquet'):
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, table in tables.items():
+                with archive.open(f'{name}.{fmt}', 'w') as entry:
+                    if fmt == 'csv':
+                        with io.TextIOWrapper(entry, encoding='utf-8', newline='') as text:
+                            write_csv(table, text, batch_rows)
+                    else:
+                        write_parquet(table, entry, batch_rows)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_tables(tables, fmt, batch_rows=BATCH_ROWS):
+    """
+    Выгружает {имя: таблица} и возвращает байты файла. Архив собирается во временном файле на диске,
+    в памяти - только батч и готовый результат (без второй копии в растущем буфере)
+    """
+    with tempfile.TemporaryFile() as sink:
+        write_export(tables, fmt, sink, batch_rows)
+        sink.seek(0)
+        return sink.read()
@@ -0,0 +1,91 @@
+"""
+Постоянный кэш результатов прогноза (SQLite), общий для всех сессий, с вытеснением давно не использованных записей
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    cache_key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    bytes INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS forecasts_last_access ON forecasts (last_access);
+"""
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ForecastCache:
+    """
+    Результаты прогноза по ключу (хеш входной таблицы, хеш оптимизации, модель, горизонт).
+    При превышении лимитов по числу записей или объему удаляются записи с самым старым обращением
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connection(self):
+        # Отдельное соединение на операцию - безопасно для фоновых потоков
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            with connection:
+                yield connection
+
+    def get(self, cache_key):
+        """
+        Сохраненный результат или None; обращение продлевает жизнь записи
+        """
+        with self._connection() as connection:
+            row = connection.execute('SELECT payload FROM forecasts WHERE cache_key = ?', (cache_key,)).fetchone()
+            if row is not None:
+                connection.execute('UPDATE forecasts SET last_access = ? WHERE cache_key = ?', (time.time(), cache_key))
+        with self._lock:
+            self.stats['hits' if row is not None else 'misses'] += 1
+        return pickle.loads(row[0]) if row is not None else None
+
+    def put(self, cache_key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?)',
+                               (cache_key, now, now, len(payload), payload))
+            evicted = self._evict(connection)
+        with self._lock:
+            self.stats['evicted'] += evicted
+
+    def _evict(self, connection):
+        # Удаляем самые давние по обращению записи, пока не уложимся в лимиты
+        rows = connection.execute('SELECT cache_key, bytes FROM forecasts ORDER BY last_access DESC').fetchall()
+        total_bytes, stale = 0, []
+        for position, (cache_key, size) in enumerate(rows):
+            total_bytes += size
+            if position >= self.max_entries or (position > 0 and total_bytes > self.max_bytes):
+                stale.append((cache_key,))
+        connection.executemany('DELETE FROM forecasts WHERE cache_key = ?', stale)
+        return len(stale)
+
+    def summary(self):
+        """
+        Число записей, их общий объем и счетчики попаданий, промахов и вытеснений
+        """
+        with self._connection() as connection:
+            entries, total_bytes = connection.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM forecasts').fetchone()
+        with self._lock:
+            return {'entries': entries, 'bytes': total_bytes, **self.stats}
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM forecasts')
@@ -0,0 +1,329 @@
+"""
+Набор моделей прогнозирования операций и rolling-origin бэктестинг
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+from shared_arrays import map_rows
+from staffing import EMPLOYEE_COLUMNS, OPERATION_COLUMNS, derive_forecast_staff
+
+SEASON_LENGTH = 12  # Месячные данные - годовая сезонность
+SITE_COLUMN = 'Site'
+REGION_COLUMN = 'Region'
+DEFAULT_SITE = 'All'
+MIN_BOOTSTRAP_RESIDUALS = 3  # Меньше ошибок на шаг вперед - бутстреп берет остатки линейного тренда
+MONTH_NUMBERS = {
+    'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6,
+    'July': 7, 'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12
+}
+
+
+def forecast_linear(y, horizon):
+    """
+    Линейный тренд по номеру периода (аналог LinearRegression по номеру месяца)
+    """
+    t = np.arange(len(y))
+    slope, intercept = np.polyfit(t, y, 1)
+    return intercept + slope * np.arange(len(y), len(y) + horizon)
+
+
+def forecast_seasonal_naive(y, horizon):
+    """
+    Сезонный наивный прогноз: значение того же месяца прошлого года
+    """
+    idx = len(y) - SEASON_LENGTH + np.arange(horizon) % SEASON_LENGTH
+    return np.asarray(y, dtype=float)[idx]
+
+
+def _exponential_smoothing(y, horizon, damped):
+    # Сезонная компонента только при наличии двух полных сезонов
+    seasonal = 'add' if len(y) >= 2 * SEASON_LENGTH else None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = ExponentialSmoothing(
+            np.asarray(y, dtype=float),
+            trend='add',
+            damped_trend=damped,
+            seasonal=seasonal,
+            seasonal_periods=SEASON_LENGTH if seasonal else None,
+            initialization_method='estimated',
+        ).fit()
+    return model.forecast(horizon)
+
+
+def forecast_holt_winters(y, horizon):
+    """
+    Holt-Winters / ETS с аддитивным трендом (и сезонностью при достаточной истории)
+    """
+    return _exponential_smoothing(y, horizon, damped=False)
+
+
+def forecast_damped_trend(y, horizon):
+    """
+    ETS с затухающим трендом
+    """
+    return _exponential_smoothing(y, horizon, damped=True)
+
+
+# Реестр моделей: имя -> (функция f(y, horizon), минимальная длина истории)
+FORECASTERS = {
+    'linear': (forecast_linear, 2),
+    'seasonal_naive': (forecast_seasonal_naive, SEASON_LENGTH),
+    'holt_winters': (forecast_holt_winters, 4),
+    'damped_trend': (forecast_damped_trend, 4),
+}
+
+
+def register_forecaster(name, func, min_history):
+    """
+    Добавляет модель в реестр. Функция должна быть импортируемой (для process pool)
+    """
+    FORECASTERS[name] = (func, min_history)
+
+
+def forecast_series(y, model, horizon):
+    """
+    Прогноз ряда выбранной моделью; при недостаточной истории используется линейная модель
+    """
+    y = np.asarray(y, dtype=float)
+    func, min_history = FORECASTERS[model]
+    if len(y) < min_history:
+        func = forecast_linear
+    return np.maximum(0, np.asarray(func(y, horizon), dtype=float))
+
+
+def backtest_series(y, horizon=3, models=None, min_train=3):
+    """
+    Rolling-origin кросс-валидация: для каждой точки отсечения обучаемся на истории до нее
+    и прогнозируем следующие horizon периодов. Возвращает MAE по каждой модели
+    """
+    y = np.asarray(y, dtype=float)
+    errors = {}
+    for name in models or list(FORECASTERS):
+        func, min_history = FORECASTERS[name]
+        abs_errors = []
+        for origin in range(max(min_train, min_history), len(y)):
+            h = min(horizon, len(y) - origin)
+            prediction = np.asarray(func(y[:origin], h), dtype=float)
+            abs_errors.extend(np.abs(prediction - y[origin:origin + h]))
+        errors[name] = float(np.mean(abs_errors)) if abs_errors else np.nan
+    return errors
+
+
+def _backtest_rows(inputs, output, rows, horizon, models):
+    # Бэктест рядов rows из общей матрицы значений; ошибки пишутся в общий выход (ряды x модели)
+    values, lengths = inputs['values'], inputs['lengths']
+    for row in rows:
+        errors = backtest_series(values[row, :lengths[row]], horizon, models)
+        output[row] = [errors[name] for name in models]
+
+
+def series_from_frame(df, columns):
+    """
+    Разбивает таблицу на ряды {(площадка, колонка): значения}; без колонки Site - одна площадка
+    """
+    if SITE_COLUMN in df.columns:
+        groups = df.groupby(SITE_COLUMN, sort=False)
+    else:
+        groups = [(DEFAULT_SITE, df)]
+
+    series = {}
+    for site, site_df in groups:
+        for col in columns:
+            if col in site_df.columns:
+                series[(site, col)] = pd.to_numeric(site_df[col], errors='coerce').fillna(0).to_numpy(dtype=float)
+    return series
+
+
+def backtest_matrix(series, horizon=3, models=None, max_workers=None):
+    """
+    Матрица ошибок бэктеста (площадка, колонка) x модель.
+    Ряды собираются в одну матрицу (короткие дополняются NaN) и обрабатываются в пуле процессов
+    через общую память; max_workers=1 или вызов из фонового потока - последовательно
+    """
+    models = models or list(FORECASTERS)
+    keys = list(series)
+    lengths = np.array([len(series[key]) for key in keys], dtype=np.int64)
+    values = np.full((len(keys), lengths.max(initial=0)), np.nan)
+    for i, key in enumerate(keys):
+        values[i, :lengths[i]] = series[key]
+
+    errors = map_rows(_backtest_rows, {'values': values, 'lengths': lengths}, (len(keys), len(models)),
+                      max_workers=max_workers, horizon=horizon, models=models)
+    index = pd.MultiIndex.from_tuples(keys, names=['site', 'column'])
+    return pd.DataFrame(errors, index=index, columns=models)
+
+
+def select_best_models(matrix):
+    """
+    Лучшая модель для каждого ряда по минимальной ошибке бэктеста (linear, если ошибок нет)
+    """
+    return matrix.apply(lambda row: row.idxmin() if row.notna().any() else 'linear', axis=1)
+
+
+class RunningLinearTrend:
+    """
+    Онлайн-линейная регрессия y = a + b*x по накопленным суммам (n, Σx, Σx², Σy, Σxy)
+    для каждой площадки и колонки. Добавление месяца или площадки - O(колонок)
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._stats = {}  # площадка -> массив (5, колонки)
+
+    @classmethod
+    def from_frame(cls, df, columns, x=None):
+        """
+        Строит статистики по таблице; x - номера периодов (по умолчанию из колонки месяцев)
+        """
+        trend = cls(columns)
+        if x is None:
+            x = [MONTH_NUMBERS[str(month).strip()] for month in df[df.columns[0]]]
+        values = df.reindex(columns=trend.columns).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        sites = df[SITE_COLUMN].tolist() if SITE_COLUMN in df.columns else [DEFAULT_SITE] * len(df)
+        for site, x_value, row in zip(sites, x, values):
+            trend.update(x_value, row, site)
+        return trend
+
+    def add_site(self, site):
+        if site not in self._stats:
+            self._stats[site] = np.zeros((5, len(self.columns)))
+        return self._stats[site]
+
+    def update(self, x, values, site=DEFAULT_SITE):
+        """
+        Добавляет одно наблюдение (значения по всем колонкам); NaN пропускаются
+        """
+        stats = self.add_site(site)
+        values = np.asarray(values, dtype=float)
+        observed = ~np.isnan(values)
+        y = np.where(observed, values, 0.0)
+        stats += np.array([observed, observed * x, observed * x * x, y, y * x])
+
+    def coefficients(self, site=DEFAULT_SITE):
+        """
+        Возвращает (intercept, slope) по всем колонкам
+        """
+        n, sx, sxx, sy, sxy = self._stats[site]
+        denominator = n * sxx - sx * sx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(denominator != 0, (n * sxy - sx * sy) / denominator, 0.0)
+            intercept = np.where(n > 0, (sy - slope * sx) / n, 0.0)
+        return intercept, slope
+
+    def predict(self, x, site=DEFAULT_SITE):
+        """
+        Прогноз по всем колонкам за O(колонок), независимо от длины истории
+        """
+        intercept, slope = self.coefficients(site)
+        return intercept + slope * x
+
+
+def bootstrap_linear_paths(values, x, x_future, n_resamples=2000, seed=None):
+    """
+    Residual bootstrap линейного тренда одним батчем по всем колонкам и горизонтам.
+    values (n, колонки), x (n,), x_future (горизонты,) -> пути (n_resamples, горизонты, колонки)
+    """
+    rng = np.random.default_rng(seed)  # seed может быть и готовым генератором
+    values = np.asarray(values, dtype=float)
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+
+    design = np.column_stack([np.ones(n), x])
+    projection = np.linalg.pinv(design)  # (2, n)
+    fitted = design @ (projection @ values)
+    # Остатки с поправкой на число степеней свободы
+    residuals = (values - fitted) * np.sqrt(n / max(n - 2, 1))
+
+    # Перевыборка строк целиком сохраняет корреляцию между колонками
+    fit_idx = rng.integers(0, n, size=(n_resamples, n))
+    future_idx = rng.integers(0, n, size=(n_resamples, len(x_future)))
+    resampled = fitted[None] + residuals[fit_idx]
+    coefficients = np.einsum('kn,bnc->bkc', projection, resampled)
+    future_design = np.column_stack([np.ones(len(x_future)), np.asarray(x_future, dtype=float)])
+    return np.einsum('hk,bkc->bhc', future_design, coefficients) + residuals[future_idx]
+
+
+def effective_model(y, model):
+    """
+    Модель, которой фактически строится прогноз ряда: при недостаточной истории - линейная (как в forecast_series)
+    """
+    return model if len(y) >= FORECASTERS[model][1] else 'linear'
+
+
+def one_step_errors(y, model, min_train=3):
+    """
+    Ошибки прогноза на шаг вперед (rolling origin) - остатки модели для бутстрепа
+    """
+    y = np.asarray(y, dtype=float)
+    start = max(min_train, FORECASTERS[model][1])
+    return np.array([y[origin] - forecast_series(y[:origin], model, 1)[0] for origin in range(start, len(y))])
+
+
+def bootstrap_model_paths(y, model, steps, fallback_residuals, n_resamples, rng):
+    """
+    Residual bootstrap вокруг точечного прогноза модели: центрированные ошибки на шаг вперед,
+    масштабированные на sqrt(шага). При коротком ряду (меньше MIN_BOOTSTRAP_RESIDUALS ошибок) берутся
+    остатки линейного тренда. steps - номера шагов прогноза (с 1) -> пути (n_resamples, len(steps))
+    """
+    steps = np.asarray(steps)
+    point = forecast_series(y, model, int(steps.max()))[steps - 1]
+    residuals = one_step_errors(y, model)
+    if len(residuals) < MIN_BOOTSTRAP_RESIDUALS:
+        residuals = fallback_residuals
+    residuals = residuals - residuals.mean()
+    noise = residuals[rng.integers(0, len(residuals), size=(n_resamples, len(steps)))]
+    return point[None] + noise * np.sqrt(steps)[None]
+
+
+def bootstrap_forecast_paths(df, target_months, n_resamples=2000, seed=None, models=None):
+    """
+    Бутстреп-пути операций и персонала для прогнозных месяцев.
+    models - {(площадка, колонка операции): модель}, как у точечного прогноза (по умолчанию линейная):
+    линейные ряды - бутстреп тренда одним батчем, остальные - бутстреп остатков своей модели.
+    Персонал пересчитывается по правилам прогноза месяц за месяцем для каждого пути.
+    Возвращает {колонка: массив (n_resamples, месяцы)}
+    """
+    x = [MONTH_NUMBERS[str(month).strip()] for month in df[df.columns[0]]]
+    x_future = [MONTH_NUMBERS[month] for month in target_months]
+    values = df[OPERATION_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float)
+    rng = np.random.default_rng(seed)
+    operations = bootstrap_linear_paths(values, x, x_future, n_resamples, rng)
+
+    site = df[SITE_COLUMN].iloc[-1] if SITE_COLUMN in df.columns else DEFAULT_SITE
+    steps = np.array(x_future) - x[-1]
+    design = np.column_stack([np.ones(len(x)), x])
+    linear_residuals = values - design @ (np.linalg.pinv(design) @ values)
+    for i, col in enumerate(OPERATION_COLUMNS):
+        model = effective_model(values[:, i], (models or {}).get((site, col), 'linear'))
+        if model != 'linear':
+            operations[:, :, i] = bootstrap_model_paths(values[:, i], model, steps, linear_residuals[:, i],
+                                                        n_resamples, rng)
+    operations = np.maximum(0, np.round(operations))
+
+    paths = {col: operations[:, :, i] for i, col in enumerate(OPERATION_COLUMNS)}
+    baseline = {col: pd.to_numeric(df[col].iloc[-1], errors='coerce') or 0 for col in OPERATION_COLUMNS + EMPLOYEE_COLUMNS}
+    staff_paths = {col: [] for col in EMPLOYEE_COLUMNS}
+    for h in range(len(target_months)):
+        predicted = {col: paths[col][:, h] for col in OPERATION_COLUMNS}
+        staff = derive_forecast_staff(baseline, predicted)
+        for col in EMPLOYEE_COLUMNS:
+            staff_paths[col].append(np.broadcast_to(staff[col], (n_resamples,)))
+        # Следующий месяц считается от прогнозного (как в основном цикле прогноза)
+        baseline = {**predicted, **staff}
+
+    paths.update({col: np.column_stack(staff_paths[col]) for col in EMPLOYEE_COLUMNS})
+    return paths
+
+
+def prediction_intervals(paths, target_months, level=0.9):
+    """
+    Границы интервала прогноза по путям бутстрепа: (нижняя, верхняя) таблицы месяцы x колонки
+    """
+    alpha = (1 - level) / 2
+    lower = pd.DataFrame({col: np.quantile(p, alpha, axis=0) for col, p in paths.items()}, index=target_months)
+    upper = pd.DataFrame({col: np.quantile(p, 1 - alpha, axis=0) for col, p in paths.items()}, index=target_months)
+    return lower, upper
@@ -0,0 +1,195 @@
+"""
+Иерархический прогноз площадка -> регион -> компания и согласование через суммирующую матрицу
+(bottom-up, top-down, OLS, WLS, MinT) одним батчем по всем колонкам
+"""
+import numpy as np
+import pandas as pd
+
+from forecasting import backtest_matrix, effective_model, forecast_series, one_step_errors, select_best_models
+
+TOTAL_NODE = 'Total'
+RECONCILIATION_METHODS = ['mint_shrink', 'wls', 'ols', 'bottom_up', 'top_down']
+
+
+class Hierarchy:
+    """
+    Узлы иерархии (итог, регионы, площадки) и матрицы: суммирующая S = [C; I]
+    и ограничений U' = [I, -C], где C агрегирует площадки в итог и регионы
+    """
+
+    def __init__(self, sites, regions=None):
+        regions = regions or {}
+        self.sites = list(sites)
+        # Уровень регионов - только если регионы заданы
+        site_regions = [regions.get(site) for site in self.sites]
+        self.regions = list(dict.fromkeys(region for region in site_regions if region is not None))
+        self.nodes = ([('Total', TOTAL_NODE)] + [('Region', region) for region in self.regions]
+                      + [('Site', site) for site in self.sites])
+        self._node_index = {node: i for i, node in enumerate(self.nodes)}
+
+        region_index = {region: i for i, region in enumerate(self.regions)}
+        aggregation = np.zeros((1 + len(self.regions), len(self.sites)))
+        aggregation[0] = 1
+        for j, region in enumerate(site_regions):
+            if region is not None:
+                aggregation[1 + region_index[region], j] = 1
+        self.aggregation = aggregation
+        self.summing = np.vstack([aggregation, np.eye(len(self.sites))])
+        self.constraints = np.hstack([np.eye(len(aggregation)), -aggregation])
+
+    @property
+    def n_aggregates(self):
+        return len(self.aggregation)
+
+    def node_index(self, level, name):
+        return self._node_index[(level, name)]
+
+    def aggregate(self, bottom):
+        """
+        Значения всех узлов по значениям площадок: (площадки, ...) -> (узлы, ...)
+        """
+        return np.tensordot(self.summing, bottom, axes=1)
+
+    def coherence_gap(self, values):
+        """
+        Максимальное расхождение агрегатов с суммой площадок
+        """
+        return float(np.abs(np.tensordot(self.constraints, values, axes=1)).max(initial=0))
+
+
+def linear_trend_forecasts(history, horizon):
+    """
+    Линейный тренд по номеру периода для всех узлов и колонок одним батчем (как линейная модель прогноза).
+    history (узлы, периоды, колонки) -> (прогнозы (узлы, горизонт, колонки), остатки (узлы, периоды, колонки))
+    """
+    n_periods = history.shape[1]
+    design = np.column_stack([np.ones(n_periods), np.arange(n_periods)])
+    projection = np.linalg.pinv(design)
+    coefficients = np.einsum('kt,ntc->nkc', projection, history)
+    fitted = np.einsum('tk,nkc->ntc', design, coefficients)
+    future_design = np.column_stack([np.ones(horizon), np.arange(n_periods, n_periods + horizon)])
+    return np.einsum('hk,nkc->nhc', future_design, coefficients), history - fitted
+
+
+def select_node_models(history, horizon, models=None):
+    """
+    Лучшая по бэктесту модель для каждого узла и колонки: {(узел, колонка): модель}
+    """
+    series = {(node, column): history[node, :, column]
+              for node in range(history.shape[0]) for column in range(history.shape[2])}
+    return select_best_models(backtest_matrix(series, horizon, models)).to_dict()
+
+
+def model_forecasts(history, horizon, models):
+    """
+    Базовые прогнозы узлов выбранными моделями; models - {(узел, колонка): модель}, остальные ряды - линейный тренд.
+    Остатки нелинейной модели - ее ошибки на шаг вперед на последних периодах, раньше - остатки линейного тренда
+    """
+    base, residuals = linear_trend_forecasts(history, horizon)
+    for (node, column), model in models.items():
+        series = history[node, :, column]
+        if effective_model(series, model) == 'linear':
+            continue
+        base[node, :, column] = forecast_series(series, model, horizon)
+        errors = one_step_errors(series, model)
+        if len(errors):
+            residuals[node, -len(errors):, column] = errors
+    return base, residuals
+
+
+def shrunk_covariance(residuals):
+    """
+    Ковариация остатков со сжатием к диагонали (Schäfer-Strimmer) для каждой колонки.
+    residuals (узлы, периоды, колонки) -> (колонки, узлы, узлы)
+    """
+    errors = np.moveaxis(residuals, 2, 0)  # (колонки, узлы, периоды)
+    n_periods = errors.shape[2]
+    covariance = np.einsum('cnt,cmt->cnm', errors, errors) / n_periods
+    variance = np.einsum('cnn->cn', covariance)
+    scale = np.sqrt(np.where(variance > 0, variance, 1.0))
+    standardized = errors / scale[:, :, None]
+    correlation = covariance / (scale[:, :, None] * scale[:, None, :])
+
+    # Дисперсия выборочных корреляций и интенсивность сжатия для каждой колонки
+    squares = np.einsum('cnt,cmt->cnm', standardized ** 2, standardized ** 2)
+    products = np.einsum('cnt,cmt->cnm', standardized, standardized)
+    correlation_variance = (squares - products ** 2 / n_periods) / (n_periods * max(n_periods - 1, 1))
+    off_diagonal = ~np.eye(errors.shape[1], dtype=bool)
+    numerator = (correlation_variance * off_diagonal).sum(axis=(1, 2))
+    denominator = (correlation ** 2 * off_diagonal).sum(axis=(1, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shrinkage = np.clip(np.where(denominator > 0, numerator / denominator, 1.0), 0, 1)
+
+    target = variance[:, :, None] * np.eye(errors.shape[1])
+    return shrinkage[:, None, None] * target + (1 - shrinkage[:, None, None]) * covariance
+
+
+def _reconcile_constrained(base, hierarchy, weights):
+    # Обобщенные наименьшие квадраты в форме ограничений: y~ = y^ - W U (U' W U)^-1 U' y^.
+    # Решается система размера (агрегаты x агрегаты) сразу для всех колонок
+    forecasts = np.moveaxis(base, 2, 0)  # (колонки, узлы, горизонт)
+    constraints = hierarchy.constraints
+    if weights.ndim == 2:
+        weighted = weights[:, :, None] * constraints.T[None]  # диагональная W
+    else:
+        weighted = weights @ constraints.T[None]
+    # Псевдообратная - на случай нулевой дисперсии у всех площадок агрегата
+    system = constraints[None] @ weighted
+    correction = weighted @ (np.linalg.pinv(system) @ (constraints[None] @ forecasts))
+    return np.moveaxis(forecasts - correction, 0, 2)
+
+
+def reconcile(base, hierarchy, method='mint_shrink', residuals=None, history=None):
+    """
+    Согласует прогнозы всех узлов base (узлы, горизонт, колонки).
+    residuals - остатки моделей по узлам (для wls и mint_shrink), history - история узлов (для top_down)
+    """
+    if method == 'bottom_up':
+        return hierarchy.aggregate(base[hierarchy.n_aggregates:])
+    if method == 'top_down':
+        # Средние исторические доли площадок в итоге (по каждой колонке)
+        bottom_history = history[hierarchy.n_aggregates:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = np.nan_to_num(bottom_history / history[0][None]).mean(axis=1)
+        return hierarchy.aggregate(shares[:, None, :] * base[0][None])
+    if method == 'ols':
+        weights = np.ones((base.shape[2], base.shape[0]))
+    elif method == 'wls':
+        variance = (residuals ** 2).mean(axis=1).T  # (колонки, узлы)
+        weights = np.where(variance > 0, variance, variance.max(initial=0) or 1.0)
+    elif method == 'mint_shrink':
+        weights = shrunk_covariance(residuals)
+    else:
+        raise ValueError(f"Unknown reconciliation method: {method}")
+    return _reconcile_constrained(base, hierarchy, weights)
+
+
+def hierarchical_forecast(bottom_history, hierarchy, horizon, method='mint_shrink', base_overrides=None, models=None):
+    """
+    Прогноз на каждом уровне и согласование. bottom_history (площадки, периоды, колонки).
+    models - модель всех узлов, 'auto' (лучшая по бэктесту для каждого узла и колонки)
+    или {(узел, колонка): модель}; None - линейный тренд (его прогнозы уже согласованы).
+    base_overrides - {индекс узла: массив (горизонт, колонки)} готовых прогнозов вместо прогноза модели.
+    Возвращает (согласованные, базовые) массивы (узлы, горизонт, колонки)
+    """
+    history = hierarchy.aggregate(np.nan_to_num(np.asarray(bottom_history, dtype=float)))
+    if models == 'auto':
+        models = select_node_models(history, horizon)
+    elif isinstance(models, str):
+        models = {(node, column): models for node in range(history.shape[0]) for column in range(history.shape[2])}
+    base, residuals = model_forecasts(history, horizon, models or {})
+    for node, values in (base_overrides or {}).items():
+        base[node] = values
+    return reconcile(base, hierarchy, method, residuals=residuals, history=history), base
+
+
+def forecast_frame(values, hierarchy, periods, columns):
+    """
+    Длинная таблица прогноза: уровень, узел, период и значения колонок
+    """
+    n_nodes, horizon, _ = values.shape
+    frame = pd.DataFrame(values.reshape(n_nodes * horizon, -1), columns=columns)
+    frame.insert(0, 'Level', np.repeat([level for level, _ in hierarchy.nodes], horizon))
+    frame.insert(1, 'Node', np.repeat([name for _, name in hierarchy.nodes], horizon))
+    frame.insert(2, 'Month', np.tile(periods, n_nodes))
+    return frame
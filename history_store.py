@@ -0,0 +1,117 @@
+"""
+История операций и персонала на диске (NumPy memmap) в раскладке площадка x период x колонка
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from forecasting import DEFAULT_SITE, REGION_COLUMN, SITE_COLUMN
+
+META_FILE = 'meta.json'
+VALUES_FILE = 'values.npy'
+
+
+class HistoryStore:
+    """
+    Хранилище истории: метаданные (площадки, периоды, колонки) в JSON и значения в .npy,
+    открытом через memmap. Чтение среза затрагивает только нужные страницы файла
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.period_column = meta['period_column']
+        self.sites = meta['sites']
+        self.periods = meta['periods']
+        self.columns = meta['columns']
+        self.regions = meta.get('regions', {})  # площадка -> регион
+        self._site_index = {site: i for i, site in enumerate(self.sites)}
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+        self.values = np.load(os.path.join(path, VALUES_FILE), mmap_mode='r')
+
+    @classmethod
+    def create(cls, path, sites, periods, columns, period_column='Month', dtype=np.float64, regions=None):
+        """
+        Создает пустое хранилище заданной формы (значения - NaN или 0 для целых) и возвращает его для записи
+        """
+        os.makedirs(path, exist_ok=True)
+        values = np.lib.format.open_memmap(
+            os.path.join(path, VALUES_FILE), mode='w+', dtype=dtype, shape=(len(sites), len(periods), len(columns))
+        )
+        values[...] = np.nan if np.issubdtype(values.dtype, np.floating) else 0
+        values.flush()
+        del values
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'period_column': period_column, 'sites': list(sites), 'periods': list(periods),
+                       'columns': list(columns), 'regions': dict(regions or {})}, f, ensure_ascii=False)
+        store = cls(path)
+        store.values = np.load(os.path.join(path, VALUES_FILE), mmap_mode='r+')
+        return store
+
+    @classmethod
+    def from_frame(cls, path, df):
+        """
+        Строит хранилище из таблицы (первая колонка - период, колонки Site и Region - площадка и регион, если есть).
+        Площадки записываются по очереди, поэтому в памяти одновременно только одна площадка
+        """
+        period_column = df.columns[0]
+        sites = df[SITE_COLUMN].astype(str) if SITE_COLUMN in df.columns else pd.Series(DEFAULT_SITE, index=df.index)
+        columns = [col for col in df.columns if col not in (period_column, SITE_COLUMN, REGION_COLUMN)]
+        regions = dict(zip(sites, df[REGION_COLUMN].astype(str))) if REGION_COLUMN in df.columns else None
+        numeric = df[columns].apply(pd.to_numeric, errors='coerce')
+        # Целочисленное хранение, если все значения целые и без пропусков
+        integral = numeric.notna().all().all() and (numeric % 1 == 0).all().all()
+        periods = list(dict.fromkeys(df[period_column].astype(str)))
+
+        store = cls.create(path, list(dict.fromkeys(sites)), periods, [str(col) for col in columns],
+                           period_column=str(period_column), dtype=np.int64 if integral else np.float64,
+                           regions=regions)
+        period_index = {period: i for i, period in enumerate(periods)}
+        for site, rows in numeric.groupby(sites.to_numpy(), sort=False):
+            positions = [period_index[period] for period in df.loc[rows.index, period_column].astype(str)]
+            store.values[store._site_index[site], positions] = rows.to_numpy()
+        store.values.flush()
+        return cls(path)
+
+    @staticmethod
+    def is_stale(path, source_path):
+        """
+        True, если хранилища нет или исходный файл изменен после его построения
+        """
+        values_path = os.path.join(path, VALUES_FILE)
+        if not os.path.exists(values_path) or not os.path.exists(os.path.join(path, META_FILE)):
+            return True
+        return os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(values_path)
+
+    def slice(self, site=DEFAULT_SITE, periods=None, columns=None):
+        """
+        Срез площадки (периоды x колонки) без чтения остальных данных; periods - slice или список меток
+        """
+        site_values = self.values[self._site_index[site]]
+        if periods is not None and not isinstance(periods, slice):
+            periods = [self.periods.index(period) for period in periods]
+        site_values = site_values[periods if periods is not None else slice(None)]
+        if columns is not None:
+            site_values = site_values[:, [self._column_index[col] for col in columns]]
+        return site_values
+
+    def site_cube(self, columns=None):
+        """
+        Колонки columns всех площадок (площадки x периоды x колонки) - для расчетов по сети площадок
+        """
+        if columns is None:
+            return self.values
+        return self.values[:, :, [self._column_index[col] for col in columns]]
+
+    def frame(self, site=DEFAULT_SITE, periods=None, columns=None):
+        """
+        Таблица площадки в формате исходного файла: колонка периода и значения
+        """
+        labels = self.periods[periods] if isinstance(periods, slice) else periods or self.periods
+        columns = columns or self.columns
+        frame = pd.DataFrame(np.array(self.slice(site, periods, columns)), columns=columns)
+        frame.insert(0, self.period_column, labels)
+        return frame
@@ -0,0 +1,154 @@
+"""
+Координация вычислений между сессиями: объединение одинаковых одновременных запросов
+и фоновое выполнение долгих задач вне потока скрипта Streamlit
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Job:
+    """
+    Состояние фоновой задачи
+    """
+    job_id: str
+    kind: str
+    key: tuple
+    status: str = 'queued'  # queued, running, done, failed
+    progress: float = 0.0
+    message: str = ''
+    result: object = None
+    error: str = None
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    stages: list = field(default_factory=list)  # (этап, время начала) по сообщениям report
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def report(self, progress, message=''):
+        self.progress = min(max(progress, 0.0), 1.0)
+        if message and message != self.message:
+            self.stages.append((message, time.time()))
+        self.message = message
+
+    # Задача передается функции как report: report(progress, message), report.stage_timings()
+    __call__ = report
+
+    def stage_timings(self):
+        """
+        Длительность этапов задачи в секундах: {этап: секунды} (до следующего этапа или завершения)
+        """
+        ends = [started for _, started in self.stages[1:]] + [self.finished or time.time()]
+        return {stage: end - started for (stage, started), end in zip(self.stages, ends)}
+
+
+class JobRunner:
+    """
+    Пул потоков для долгих задач (оптимизация, прогноз), переживающих перезапуски скрипта.
+    Сессии хранят только идентификаторы задач и опрашивают их статус.
+    Пока задача с тем же ключом выполняется, повторная отправка возвращает ее идентификатор
+    (одинаковые одновременные запросы разных сессий выполняются один раз)
+    """
+
+    def __init__(self, max_workers=4, retention_seconds=3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = {}  # идентификатор -> Job
+        self._active = {}  # ключ -> идентификатор выполняющейся задачи
+        self.retention_seconds = retention_seconds
+        self.stats = {'executed': 0, 'coalesced': 0}
+
+    def submit(self, key, kind, func, *args, **kwargs):
+        """
+        Запускает func(report, *args, **kwargs) в фоне; report(progress, message) - обновление прогресса,
+        report - сама задача (Job), поэтому функции доступны и длительности ее этапов
+        """
+        with self._lock:
+            self._prune()
+            job_id = self._active.get(key)
+            if job_id is not None:
+                self.stats['coalesced'] += 1
+                return job_id
+            self.stats['executed'] += 1
+            job = Job(uuid.uuid4().hex, kind, key)
+            self._jobs[job.job_id] = job
+            self._active[key] = job.job_id
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.job_id
+
+    def _run(self, job, func, args, kwargs):
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            job.progress = 1.0
+            with self._lock:
+                if self._active.get(job.key) == job.job_id:
+                    del self._active[job.key]
+
+    def _prune(self):
+        # Удаляем давно завершенные задачи
+        now = time.time()
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and now - j.finished > self.retention_seconds]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+
+# Потоки для параллельных (хеджированных) запросов к внешним API
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hedge')
+
+
+def hedged_call(func, budget, hedge_after, fallback):
+    """
+    Вызов с бюджетом задержки: если func не ответила за hedge_after секунд (или упала),
+    отправляется второй (хеджированный) запрос; если ни один не успел за budget секунд,
+    результат берется из fallback(). func(timeout) получает остаток бюджета на момент отправки,
+    чтобы опоздавшие запросы не занимали потоки после возврата fallback.
+    Возвращает (результат, источник: primary/hedge/fallback)
+    """
+    start = time.monotonic()
+    deadline = start + budget
+    sources = {_hedge_executor.submit(func, budget): 'primary'}
+    pending = set(sources)
+    hedged = False
+
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        wait_until = deadline if hedged else min(start + hedge_after, deadline)
+        done, pending = wait(pending, timeout=max(0.0, wait_until - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), sources[future]
+
+        # Хеджирование: основной запрос опаздывает или завершился ошибкой
+        if not hedged and (time.monotonic() >= start + hedge_after or not pending):
+            hedge = _hedge_executor.submit(func, max(0.0, deadline - time.monotonic()))
+            sources[hedge] = 'hedge'
+            pending.add(hedge)
+            hedged = True
+        elif hedged and not pending:
+            break
+
+    # Опоздавшие запросы продолжают выполняться в фоне, их результат игнорируется
+    return fallback(), 'fallback'
@@ -0,0 +1,264 @@
+"""
+Пакетная генерация статических отчетов: директорская аналитика по площадкам, операциям и месяцам
+и графики прогноза в HTML (и PDF) в пуле процессов с пропуском неизмененных страниц
+"""
+import contextlib
+import html
+import importlib.util
+import io
+import json
+import os
+import re
+import threading
+import zipfile
+
+from plotly.offline import get_plotlyjs
+
+from dashboards import executive_dashboard, operation_trend_chart
+from data_store import content_hash
+from shared_arrays import process_pool, use_process_pool
+from staffing import OPERATION_COLUMNS
+
+try:
+    import fcntl
+except ImportError:  # Windows - блокировка только между потоками процесса
+    fcntl = None
+
+REPORT_VERSION = 1  # Увеличивается при изменении вида отчетов - все страницы перестраиваются
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'manifest.lock'
+PLOTLY_JS_FILE = 'plotly.min.js'
+INDEX_FILE = 'index.html'
+REPORT_FORMATS = ['html', 'pdf']
+
+PAGE_STYLE = """
+body { font-family: sans-serif; margin: 24px; color: #2C3E50; }
+h1 { color: #2E86C1; }
+.metrics { display: flex; gap: 16px; margin-bottom: 16px; }
+.metric { flex: 1; border: 1px solid #D5D8DC; border-radius: 8px; padding: 12px; }
+.metric .label { font-size: 14px; color: #566573; }
+.metric .value { font-size: 28px; font-weight: bold; }
+.metric .delta { font-size: 14px; }
+.up { color: #27AE60; } .down { color: #E74C3C; }
+"""
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(value).strip()) or '_'
+
+
+def page_path(site, operation, month=None):
+    """
+    Относительный путь страницы: площадка/операция/месяц.html или площадка/операция/forecast.html
+    """
+    return f"{_slug(site)}/{_slug(operation)}/{_slug(month) if month else 'forecast'}"
+
+
+def _metric_html(metric):
+    delta = metric.get('delta')
+    delta_html = ''
+    if delta:
+        delta_html = f"<div class='delta {'down' if delta.startswith('-') else 'up'}'>{html.escape(delta)}</div>"
+    return (f"<div class='metric' title='{html.escape(metric.get('help') or '')}'>"
+            f"<div class='label'>{html.escape(metric['label'])}</div>"
+            f"<div class='value'>{html.escape(metric['value'])}</div>{delta_html}</div>")
+
+
+def render_page(title, figures, metrics=(), depth=2):
+    """
+    HTML-страница с карточками метрик и графиками; plotly.js подключается одним общим файлом в корне отчета
+    """
+    charts = ''.join(fig.to_html(full_html=False, include_plotlyjs=False) for fig in figures)
+    metrics_html = f"<div class='metrics'>{''.join(_metric_html(metric) for metric in metrics)}</div>" if metrics else ''
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+            f"<style>{PAGE_STYLE}</style><script src='{'../' * depth}{PLOTLY_JS_FILE}'></script></head>"
+            f"<body><h1>{html.escape(title)}</h1>{metrics_html}{charts}</body></html>")
+
+
+def render_pdf(title, figures, metrics=()):
+    """
+    PDF-версия страницы: метрики на первой странице, графики - по одному на страницу.
+    Графики растеризуются через kaleido
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.image as mpimg
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        page = plt.figure(figsize=(11.7, 8.3))
+        lines = [title, ''] + [f"{m['label']}: {m['value']}" + (f" ({m['delta']})" if m.get('delta') else '') for m in metrics]
+        page.text(0.05, 0.95, '\n'.join(lines), va='top', fontsize=14)
+        pdf.savefig(page)
+        plt.close(page)
+        for fig in figures:
+            image = mpimg.imread(io.BytesIO(fig.to_image(format='png', width=1100, height=650)), format='png')
+            page = plt.figure(figsize=(11.7, 8.3))
+            axes = page.add_axes([0, 0, 1, 1])
+            axes.imshow(image)
+            axes.axis('off')
+            pdf.savefig(page)
+            plt.close(page)
+    return buffer.getvalue()
+
+
+_directory_lock = threading.Lock()
+
+
+def _write(path, data):
+    # Запись во временный файл и замена: читатель (архив, браузер) не видит недописанный файл
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".tmp-{os.getpid()}-{threading.get_ident()}-{os.path.basename(path)}")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextlib.contextmanager
+def _locked(output_dir):
+    """
+    Монопольный доступ к каталогу отчетов: задачи разных сессий и процессов генерируют отчеты по очереди,
+    и ни одна не перезаписывает манифест, прочитанный до изменений другой
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with _directory_lock, open(os.path.join(output_dir, LOCK_FILE), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # снимается при закрытии файла
+        yield
+
+
+def _render_task(task):
+    # Страницы одной площадки и операции: все месяцы директорской аналитики и график прогноза
+    output_dir, site, operation, original_df, combined_df, forecast_rows, intervals, months, formats = task
+    written = []
+    for month in months:
+        if month is None:
+            title = f"{site} - {operation} trend and forecast"
+            figures, metrics = [operation_trend_chart(combined_df, forecast_rows, operation, intervals)], []
+        else:
+            dashboard = executive_dashboard(original_df, combined_df, operation, month.strip())
+            if dashboard is None:
+                continue
+            title = f"{site} - {operation} - {month.strip()}"
+            figures, metrics = dashboard['figures'], dashboard['metrics']
+
+        path = page_path(site, operation, month)
+        if 'html' in formats:
+            _write(os.path.join(output_dir, f"{path}.html"), render_page(title, figures, metrics).encode('utf-8'))
+        if 'pdf' in formats:
+            _write(os.path.join(output_dir, f"{path}.pdf"), render_pdf(title, figures, metrics))
+        written.append((site, operation, month, path))
+    return written
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _render_index(output_dir, pages):
+    # Оглавление: площадка -> операция -> ссылки на месяцы и прогноз
+    sections = []
+    for site in dict.fromkeys(page['site'] for page in pages):
+        rows = []
+        site_pages = [page for page in pages if page['site'] == site]
+        for operation in dict.fromkeys(page['operation'] for page in site_pages):
+            links = ' | '.join(
+                f"<a href='{page['path']}.{page['format']}'>{html.escape(page['month'] or 'Forecast')}</a>"
+                for page in site_pages if page['operation'] == operation
+            )
+            rows.append(f"<li><b>{html.escape(operation)}</b>: {links}</li>")
+        sections.append(f"<h2>{html.escape(site)}</h2><ul>{''.join(rows)}</ul>")
+    body = ''.join(sections)
+    _write(os.path.join(output_dir, INDEX_FILE),
+           f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Executive reports</title>"
+           f"<style>{PAGE_STYLE}</style></head><body><h1>Executive reports</h1>{body}</body></html>".encode('utf-8'))
+
+
+def _update_reports(output_dir, sites, operations, months, formats, max_workers):
+    # Перестраивает страницы с измененными входами, затем манифест и оглавление (под блокировкой каталога)
+    plotly_js = os.path.join(output_dir, PLOTLY_JS_FILE)
+    if not os.path.exists(plotly_js):
+        _write(plotly_js, get_plotlyjs().encode('utf-8'))
+
+    manifest = _load_manifest(output_dir)
+    new_manifest, tasks, skipped = {}, [], 0
+    for site, (original_df, combined_df, forecast_rows, intervals) in sites.items():
+        site_months = months or combined_df[combined_df.columns[0]].astype(str).tolist()
+        site_hash = content_hash((original_df, combined_df, intervals))
+        for operation in operations:
+            pending = []
+            # None - страница графика прогноза операции
+            for month in list(site_months) + ([None] if forecast_rows else []):
+                path = page_path(site, operation, month)
+                key = content_hash((REPORT_VERSION, site_hash, forecast_rows, operation, month, formats))
+                new_manifest[path] = {'key': key, 'site': site, 'operation': operation,
+                                      'month': month.strip() if month else None}
+                outputs_exist = all(os.path.exists(os.path.join(output_dir, f"{path}.{fmt}")) for fmt in formats)
+                if manifest.get(path, {}).get('key') == key and outputs_exist:
+                    skipped += 1
+                else:
+                    pending.append(month)
+            if pending:
+                tasks.append((output_dir, site, operation, original_df, combined_df, forecast_rows, intervals,
+                              pending, formats))
+
+    if not use_process_pool(max_workers, len(tasks)):
+        written = [page for task in tasks for page in _render_task(task)]
+    else:
+        with process_pool(max_workers) as executor:
+            written = [page for pages in executor.map(_render_task, tasks) for page in pages]
+
+    # Страницы без данных (например, месяц без строки) не попадают в манифест
+    rendered_paths = {path for _, _, _, path in written}
+    pending_paths = {page_path(task[1], task[2], month) for task in tasks for month in task[7]}
+    new_manifest = {path: entry for path, entry in new_manifest.items()
+                    if path not in pending_paths or path in rendered_paths}
+    _write(os.path.join(output_dir, MANIFEST_FILE),
+           json.dumps(new_manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+
+    pages = [{'path': path, 'format': formats[0], **entry} for path, entry in new_manifest.items()]
+    _render_index(output_dir, pages)
+    return {'rendered': len(written), 'skipped': skipped, 'pages': len(pages)}
+
+
+def generate_reports(output_dir, sites, operations=None, months=None, formats=('html',), max_workers=None):
+    """
+    Строит страницы отчетов для всех площадок, операций и месяцев.
+    sites - {площадка: (исходная таблица, объединенная таблица, число прогнозных строк, интервалы или None)};
+    страница перестраивается, только если изменились ее входы (хеш в манифесте).
+    Одновременные вызовы для одного каталога выполняются по очереди.
+    max_workers=1 или вызов не из главного потока - последовательно в текущем процессе.
+    Возвращает {'rendered', 'skipped', 'pages'}
+    """
+    formats = [fmt for fmt in REPORT_FORMATS if fmt in formats]
+    if 'pdf' in formats and importlib.util.find_spec('kaleido') is None:
+        raise RuntimeError("PDF reports require the 'kaleido' package")
+    with _locked(output_dir):
+        return _update_reports(output_dir, sites, operations or OPERATION_COLUMNS, months, formats, max_workers)
+
+
+def archive_reports(output_dir):
+    """
+    Zip-архив каталога отчетов (для выгрузки); генерация отчетов в это время ждет
+    """
+    buffer = io.BytesIO()
+    with _locked(output_dir), zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for root, _, files in os.walk(output_dir):
+            for name in files:
+                if name == LOCK_FILE or name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                archive.write(path, os.path.relpath(path, output_dir))
+    return buffer.getvalue()
@@ -0,0 +1,204 @@
+"""
+Локальная история запусков оптимизации и прогноза (SQLite), индексированная по площадке, дате и хешу входа
+"""
+import datetime
+import json
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+import pandas as pd
+
+from forecasting import DEFAULT_SITE, SITE_COLUMN
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    run_date TEXT NOT NULL,
+    site TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    model TEXT,
+    source TEXT,
+    parameters TEXT,
+    output_text TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_site_date ON runs (site, run_date);
+CREATE INDEX IF NOT EXISTS runs_input_hash ON runs (input_hash, kind);
+
+CREATE TABLE IF NOT EXISTS run_tables (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    PRIMARY KEY (run_id, table_name)
+);
+
+CREATE TABLE IF NOT EXISTS run_values (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    row_position INTEGER NOT NULL,
+    row_label TEXT NOT NULL,
+    site TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS run_values_lookup ON run_values (run_id, table_name, site, row_label, column_name);
+
+CREATE TABLE IF NOT EXISTS run_timings (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_timings_run ON run_timings (run_id);
+"""
+
+RUN_COLUMNS = ['run_id', 'kind', 'created_at', 'run_date', 'site', 'input_hash', 'model', 'source', 'parameters']
+
+
+def _label_columns(table):
+    return [table.columns[0]] + ([SITE_COLUMN] if SITE_COLUMN in table.columns else [])
+
+
+def _table_rows(run_id, name, table):
+    # Таблица в длинном формате: (строка, месяц, площадка, колонка, значение) для числовых колонок
+    labels = _label_columns(table)
+    values = table.drop(columns=labels).apply(pd.to_numeric, errors='coerce')
+    row_labels = table[table.columns[0]].astype(str).str.strip().tolist()
+    sites = table[SITE_COLUMN].astype(str).tolist() if SITE_COLUMN in table.columns else [DEFAULT_SITE] * len(table)
+    for position, (row_label, site, row) in enumerate(zip(row_labels, sites, values.itertuples(index=False, name=None))):
+        for column, value in zip(values.columns, row):
+            yield run_id, name, position, row_label, site, str(column), None if pd.isna(value) else float(value)
+
+
+class RunHistory:
+    """
+    Хранилище запусков: параметры, исходный ответ, таблицы результатов и длительность этапов.
+    Сравнение запусков выполняется SQL-запросом внутри базы
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connection(self):
+        # Отдельное соединение на операцию - безопасно для фоновых потоков
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            connection.execute('PRAGMA foreign_keys = ON')
+            with connection:
+                yield connection
+
+    def record_run(self, kind, input_hash, tables, model=None, source=None, parameters=None,
+                   output_text=None, timings=None, site=DEFAULT_SITE):
+        """
+        Сохраняет запуск и возвращает его идентификатор. tables - {имя: таблица}, timings - {этап: секунды}
+        """
+        now = time.time()
+        with self._connection() as connection:
+            cursor = connection.execute(
+                'INSERT INTO runs (kind, created_at, run_date, site, input_hash, model, source, parameters, output_text) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (kind, now, datetime.date.fromtimestamp(now).isoformat(), site, input_hash, model, source,
+                 json.dumps(parameters or {}, default=str), output_text)
+            )
+            run_id = cursor.lastrowid
+            for name, table in tables.items():
+                connection.execute('INSERT INTO run_tables VALUES (?, ?, ?)',
+                                   (run_id, name, json.dumps([str(col) for col in table.columns])))
+                connection.executemany('INSERT INTO run_values VALUES (?, ?, ?, ?, ?, ?, ?)', _table_rows(run_id, name, table))
+            connection.executemany('INSERT INTO run_timings VALUES (?, ?, ?)',
+                                   [(run_id, stage, seconds) for stage, seconds in (timings or {}).items()])
+        return run_id
+
+    def list_runs(self, kind=None, site=None, since=None, limit=100):
+        """
+        Последние запуски (новые сверху) с фильтром по виду, площадке и дате (ISO, включительно)
+        """
+        conditions, args = [], []
+        for column, value in (('kind', kind), ('site', site)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                args.append(value)
+        if since is not None:
+            conditions.append('run_date >= ?')
+            args.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._connection() as connection:
+            runs = pd.read_sql_query(
+                f"SELECT {', '.join(RUN_COLUMNS)}, "
+                f"(SELECT SUM(seconds) FROM run_timings t WHERE t.run_id = runs.run_id) AS duration_s "
+                f"FROM runs {where} ORDER BY created_at DESC LIMIT ?",
+                connection, params=args + [limit]
+            )
+        runs['created_at'] = pd.to_datetime(runs['created_at'], unit='s').dt.strftime('%Y-%m-%d %H:%M')
+        return runs
+
+    def find_runs(self, kind, input_hash):
+        """
+        Идентификаторы запусков того же вида по тому же входу (новые сверху)
+        """
+        with self._connection() as connection:
+            rows = connection.execute(
+                'SELECT run_id FROM runs WHERE input_hash = ? AND kind = ? ORDER BY created_at DESC', (input_hash, kind)
+            ).fetchall()
+        return [run_id for run_id, in rows]
+
+    def load_run(self, run_id):
+        """
+        Метаданные запуска, исходный ответ, таблицы {имя: таблица} и длительности этапов
+        """
+        with self._connection() as connection:
+            run = connection.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)}, output_text FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if run is None:
+                raise KeyError(f"Run {run_id} not found")
+            table_columns = connection.execute(
+                'SELECT table_name, columns FROM run_tables WHERE run_id = ?', (run_id,)
+            ).fetchall()
+            values = pd.read_sql_query(
+                'SELECT table_name, row_position, row_label, site, column_name, value FROM run_values WHERE run_id = ?',
+                connection, params=(run_id,)
+            )
+            timings = dict(connection.execute('SELECT stage, seconds FROM run_timings WHERE run_id = ?', (run_id,)).fetchall())
+
+        run = dict(zip(RUN_COLUMNS + ['output_text'], run))
+        run['parameters'] = json.loads(run['parameters'] or '{}')
+        tables = {}
+        for name, columns in table_columns:
+            columns = json.loads(columns)
+            table_values = values[values['table_name'] == name]
+            table = table_values.pivot(index='row_position', columns='column_name', values='value')
+            rows = table_values.drop_duplicates('row_position').set_index('row_position').loc[table.index]
+            table[columns[0]] = rows['row_label']
+            if SITE_COLUMN in columns:
+                table[SITE_COLUMN] = rows['site']
+            table = table.reindex(columns=columns).reset_index(drop=True)
+            table.columns.name = None
+            tables[name] = table
+        return {**run, 'tables': tables, 'timings': timings}
+
+    def compare_runs(self, run_a, run_b, table_name):
+        """
+        Поячеечное сравнение таблицы двух запусков (по площадке, строке и колонке) внутри базы
+        """
+        with self._connection() as connection:
+            return pd.read_sql_query(
+                """
+                SELECT a.site AS Site, a.row_label AS Row, a.column_name AS "Column",
+                       a.value AS "Run A", b.value AS "Run B", b.value - a.value AS Change
+                FROM run_values a
+                JOIN run_values b
+                  ON b.run_id = ? AND b.table_name = a.table_name AND b.site = a.site
+                 AND b.row_label = a.row_label AND b.column_name = a.column_name
+                WHERE a.run_id = ? AND a.table_name = ?
+                ORDER BY a.site, a.row_position, a.rowid
+                """,
+                connection, params=(run_b, run_a, table_name)
+            )
+
+    def delete_run(self, run_id):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
@@ -0,0 +1,81 @@
+"""
+What-if анализ чувствительности численности персонала к параметрам расчета
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from staffing import EMPLOYEE_COLUMNS, SWEEP_PARAMETERS, StaffingParameters, compute_rule_based_staff, operations_matrix
+
+# Множители базовых значений параметров для сетки сценариев по умолчанию (3^7 = 2187 сценариев)
+DEFAULT_MULTIPLIERS = (0.75, 1.0, 1.25)
+
+
+def build_parameter_grid(base_params=None, multipliers=DEFAULT_MULTIPLIERS, parameters=None):
+    """
+    Строит декартову сетку сценариев: каждый параметр умножается на каждый из multipliers
+    """
+    base_params = base_params or StaffingParameters()
+    parameters = parameters or SWEEP_PARAMETERS
+    levels = [[getattr(base_params, name) * m for m in multipliers] for name in parameters]
+    return pd.DataFrame(list(itertools.product(*levels)), columns=parameters)
+
+
+def evaluate_scenarios(df, grid, base_params=None):
+    """
+    Оценивает все сценарии сетки по всем месяцам за один векторный проход.
+    Возвращает массив (сценарии, месяцы, EMPLOYEE_COLUMNS)
+    """
+    overrides = {name: grid[name].to_numpy(dtype=float) for name in grid.columns}
+    return compute_rule_based_staff(operations_matrix(df), base_params, **overrides)
+
+
+def sweep_staffing(df, base_params=None, multipliers=DEFAULT_MULTIPLIERS):
+    """
+    Выполняет полный перебор сценариев и возвращает сетку с суммарной численностью по ролям за период
+    """
+    grid = build_parameter_grid(base_params, multipliers)
+    staff = evaluate_scenarios(df, grid, base_params)
+    totals = pd.DataFrame(staff.sum(axis=1), columns=EMPLOYEE_COLUMNS)
+    result = pd.concat([grid, totals], axis=1)
+    result['Total_staff'] = totals.sum(axis=1)
+    return result
+
+
+def sensitivity_heatmap(sweep, x_param, y_param, role='Total_staff'):
+    """
+    Средняя численность роли по паре параметров (усреднение по остальным параметрам сетки)
+    """
+    return sweep.pivot_table(index=y_param, columns=x_param, values=role, aggfunc='mean')
+
+
+def tornado_table(sweep, base_params=None, role='Total_staff'):
+    """
+    Изменение численности роли при минимальном/максимальном значении каждого параметра,
+    остальные параметры зафиксированы на базовом уровне
+    """
+    base_params = base_params or StaffingParameters()
+    parameters = [name for name in SWEEP_PARAMETERS if name in sweep.columns]
+    base_mask = np.logical_and.reduce([np.isclose(sweep[name], getattr(base_params, name)) for name in parameters])
+    base_value = sweep.loc[base_mask, role].iloc[0]
+
+    rows = []
+    for name in parameters:
+        # Сценарии, где меняется только один параметр
+        others = [other for other in parameters if other != name]
+        mask = np.logical_and.reduce([np.isclose(sweep[other], getattr(base_params, other)) for other in others])
+        one_at_a_time = sweep.loc[mask]
+        low = one_at_a_time.loc[one_at_a_time[name].idxmin()]
+        high = one_at_a_time.loc[one_at_a_time[name].idxmax()]
+        rows.append({
+            'Parameter': name,
+            'Low value': low[name],
+            'High value': high[name],
+            'Low change': low[role] - base_value,
+            'High change': high[role] - base_value,
+        })
+
+    tornado = pd.DataFrame(rows)
+    tornado['Range'] = (tornado['High change'] - tornado['Low change']).abs()
+    return tornado.sort_values('Range').reset_index(drop=True)
@@ -0,0 +1,120 @@
+"""
+Массивы NumPy в общей памяти для пула процессов: воркеры читают входы и пишут результат без сериализации
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# fork многопоточного процесса копирует блокировки, захваченные другими потоками, и воркер может зависнуть
+POOL_CONTEXT = multiprocessing.get_context('spawn')
+
+
+class SharedArray:
+    """
+    Массив в multiprocessing.shared_memory. Между процессами передается только spec (имя блока, форма, тип)
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self._shm = shm
+        self._owner = owner
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype=float, fill=None):
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        shared = cls(shared_memory.SharedMemory(create=True, size=size), shape, dtype, owner=True)
+        if fill is not None:
+            shared.array.fill(fill)
+        return shared
+
+    @classmethod
+    def from_array(cls, array):
+        array = np.ascontiguousarray(array)
+        shared = cls.create(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        # Воркеры пула используют resource tracker родителя, поэтому подключение не создает
+        # отдельной регистрации блока; удаляет блок только создавший его процесс (owner)
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    @property
+    def spec(self):
+        return self._shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        self.array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def use_process_pool(max_workers, n_tasks):
+    """
+    Нужен ли пул процессов. Из фоновых потоков (задачи приложения) расчет идет в текущем процессе:
+    Streamlit устанавливает скрипт приложения как __main__, и spawn выполнил бы его заново в каждом воркере
+    """
+    return max_workers != 1 and n_tasks > 1 and threading.current_thread() is threading.main_thread()
+
+
+def process_pool(max_workers=None):
+    """
+    Пул процессов, создаваемых через spawn
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=POOL_CONTEXT)
+
+
+def _run_rows(task):
+    func, input_specs, output_spec, rows, kwargs = task
+    inputs = {name: SharedArray.attach(spec) for name, spec in input_specs.items()}
+    output = SharedArray.attach(output_spec)
+    try:
+        func({name: shared.array for name, shared in inputs.items()}, output.array, rows, **kwargs)
+    finally:
+        for shared in [*inputs.values(), output]:
+            shared.close()
+
+
+def map_rows(func, inputs, output_shape, output_dtype=float, fill=np.nan, max_workers=None, chunk_size=None, **kwargs):
+    """
+    Вызывает func(входы {имя: массив}, выход, строки, **kwargs) по блокам строк первой оси в пуле процессов.
+    Входы копируются в общую память один раз, воркеры пишут в заранее выделенный общий выход.
+    func должна быть импортируемой функцией модуля. max_workers=1 или вызов не из главного потока -
+    последовательно в текущем процессе
+    """
+    n_rows = output_shape[0]
+    if not use_process_pool(max_workers, n_rows):
+        output = np.full(output_shape, fill, dtype=output_dtype)
+        func(inputs, output, np.arange(n_rows), **kwargs)
+        return output
+
+    shared_inputs = {}
+    output = SharedArray.create(output_shape, output_dtype, fill=fill)
+    try:
+        for name, array in inputs.items():
+            shared_inputs[name] = SharedArray.from_array(array)
+        # Несколько блоков на воркер - для выравнивания нагрузки
+        chunk_size = chunk_size or max(1, -(-n_rows // ((max_workers or os.cpu_count() or 1) * 4)))
+        with process_pool(max_workers) as executor:
+            input_specs = {name: shared.spec for name, shared in shared_inputs.items()}
+            tasks = [(func, input_specs, output.spec, np.arange(start, min(start + chunk_size, n_rows)), kwargs)
+                     for start in range(0, n_rows, chunk_size)]
+            list(executor.map(_run_rows, tasks))
+        return output.array.copy()
+    finally:
+        for shared in [*shared_inputs.values(), output]:
+            shared.close()
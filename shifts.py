@@ -0,0 +1,185 @@
+"""
+Почасовое планирование смен по моделям очередей M/M/c (Erlang C): бригады грузчиков и операторы погрузчиков
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from staffing import (EMPLOYEE_COLUMNS, MANUAL_OPERATIONS, OPERATION_COLUMNS, PALLET_OPERATIONS, StaffingParameters,
+                      compute_rule_based_staff, operations_matrix)
+
+HOURS = np.arange(24)
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
+# Доля дневных прибытий по часам: утренний и послеобеденный пики внутри 8-часового дня
+DEFAULT_HOURLY_PROFILE = (0, 0, 0, 0, 0, 0, 0, 0, 0.9, 1.4, 1.5, 1.2, 0.7, 1.1, 1.2, 0.8,
+                          0, 0, 0, 0, 0, 0, 0, 0)
+
+
+@dataclass
+class ShiftParameters:
+    """
+    Параметры почасового расчета: профили прибытий, смены и целевое время ожидания в очереди
+    """
+    target_wait_hours: float = 1.0  # Среднее ожидание машины в очереди, часы
+    working_days_per_month: float = 20.0  # 5-дневная неделя
+    weekday_profile: tuple = (1.15, 1.05, 1.0, 0.95, 0.85)  # Относительная загрузка дней недели
+    hourly_profile: tuple = DEFAULT_HOURLY_PROFILE
+    # Профили прибытий отдельных операций {операция: 24 веса} вместо общего профиля
+    operation_profiles: dict = field(default_factory=dict)
+    # Смены: название -> (час начала, час окончания)
+    shifts: dict = field(default_factory=lambda: {'Day': (8, 16)})
+    max_parallel_operations: int = 3  # Одновременно не более 3 ручных операций (бригад)
+    max_forklift_operators: int = 30
+
+
+def hourly_arrival_rates(operations, params=None):
+    """
+    Интенсивность прибытий (операций в час) по строкам, дням недели, часам и операциям:
+    месячные объемы (строки x OPERATION_COLUMNS) -> массив (строки, дни, 24, операции)
+    """
+    params = params or ShiftParameters()
+    profiles = np.array([params.operation_profiles.get(col, params.hourly_profile) for col in OPERATION_COLUMNS],
+                        dtype=float).T  # (24, операции)
+    totals = profiles.sum(axis=0)
+    hourly_share = np.divide(profiles, totals, out=np.zeros_like(profiles), where=totals > 0)
+    weekday = np.asarray(params.weekday_profile, dtype=float)
+    weekday = weekday / weekday.mean()
+
+    daily = np.asarray(operations, dtype=float) / params.working_days_per_month
+    return daily[:, None, None, :] * weekday[None, :, None, None] * hourly_share[None, None, :, :]
+
+
+def erlang_c_waits(arrival_rate, service_hours, max_servers):
+    """
+    Среднее ожидание в очереди M/M/c (часы) для c = 1..max_servers одним проходом по всем ячейкам:
+    массив (max_servers, *форма arrival_rate); inf, если нагрузка не меньше числа серверов
+    """
+    load = np.asarray(arrival_rate, dtype=float) * service_hours
+    blocking = np.ones_like(load)
+    waits = np.empty((max_servers,) + load.shape)
+    for servers in range(1, max_servers + 1):
+        # Рекурсия Erlang B, затем переход к Erlang C (вероятность ожидания)
+        blocking = load * blocking / (servers + load * blocking)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wait_probability = servers * blocking / (servers - load * (1 - blocking))
+            waits[servers - 1] = np.where(load < servers, wait_probability * service_hours / (servers - load), np.inf)
+    return waits
+
+
+def required_servers(arrival_rate, service_hours, target_wait_hours, max_servers):
+    """
+    Минимальное число параллельных серверов, при котором среднее ожидание не превышает цели.
+    Возвращает (серверы, признак перегрузки: цель недостижима даже при max_servers)
+    """
+    meets = erlang_c_waits(arrival_rate, service_hours, max_servers) <= target_wait_hours
+    feasible = meets.any(axis=0)
+    servers = np.where(feasible, meets.argmax(axis=0) + 1, max_servers)
+    active = np.asarray(arrival_rate) > 0
+    return np.where(active, servers, 0), active & ~feasible
+
+
+def _queue(rates, service_hours, operations):
+    # Общая очередь нескольких операций: суммарная интенсивность и средневзвешенное время обслуживания
+    idx = [OPERATION_COLUMNS.index(col) for col in operations]
+    rate = rates[..., idx].sum(axis=-1)
+    work = (rates[..., idx] * np.array([service_hours[col] for col in operations])).sum(axis=-1)
+    return rate, np.divide(work, rate, out=np.zeros_like(work), where=rate > 0)
+
+
+def compute_shift_plan(operations, params=None, staffing_params=None):
+    """
+    Почасовая потребность и требования по сменам для всех строк (месяцы, площадки), дней и часов сразу.
+    Возвращает словарь массивов: hourly_brigades/hourly_forklifts/hourly_loaders/overloaded (строки, дни, 24)
+    и shift_loaders/shift_forklifts/shift_brigades (строки, дни, смены)
+    """
+    params = params or ShiftParameters()
+    staffing_params = staffing_params or StaffingParameters()
+    rates = hourly_arrival_rates(operations, params)
+    service_hours = {
+        'Direct_Overloading_20': staffing_params.direct_hours, 'Direct_Overloading_40': staffing_params.direct_hours,
+        'Cross_Docking_20': staffing_params.cross_hours, 'Cross_Docking_40': staffing_params.cross_hours,
+        'Pallet_Direct_Overloading': staffing_params.pallet_direct_hours,
+        'Pallet_Cross_Docking': staffing_params.pallet_cross_hours,
+    }
+
+    # Ручные операции: сервер - бригада, не более max_parallel_operations одновременно
+    manual_rate, manual_service = _queue(rates, service_hours, MANUAL_OPERATIONS)
+    brigades, manual_overloaded = required_servers(manual_rate, manual_service, params.target_wait_hours,
+                                                   params.max_parallel_operations)
+    # Паллетные операции: сервер - оператор погрузчика с помощником-грузчиком
+    pallet_rate, pallet_service = _queue(rates, service_hours, PALLET_OPERATIONS)
+    forklifts, pallet_overloaded = required_servers(pallet_rate, pallet_service, params.target_wait_hours,
+                                                    params.max_forklift_operators)
+    loaders = brigades * staffing_params.loaders_per_brigade + forklifts * staffing_params.pallet_loaders_per_operation
+
+    # Смена укомплектовывается по самому загруженному часу
+    shift_mask = np.array([(HOURS >= start) & (HOURS < end) for start, end in params.shifts.values()])  # (смены, 24)
+
+    def per_shift(hourly):
+        return np.where(shift_mask, hourly[..., None, :], 0).max(axis=-1)
+
+    return {
+        'hourly_brigades': brigades,
+        'hourly_forklifts': forklifts,
+        'hourly_loaders': loaders,
+        'overloaded': manual_overloaded | pallet_overloaded,
+        'shift_brigades': per_shift(brigades),
+        'shift_loaders': per_shift(loaders),
+        'shift_forklifts': per_shift(forklifts),
+    }
+
+
+def monthly_headcount(plan, staffing_params=None):
+    """
+    Месячная численность по плану смен: самый загруженный день недели, сумма по сменам, с минимумами ролей.
+    Возвращает (Loader, Forklift_Operator) по строкам
+    """
+    staffing_params = staffing_params or StaffingParameters()
+    loaders = np.maximum(staffing_params.min_loader, plan['shift_loaders'].sum(axis=-1).max(axis=-1))
+    forklifts = np.maximum(staffing_params.min_forklift, plan['shift_forklifts'].sum(axis=-1).max(axis=-1))
+    return np.ceil(loaders).astype(int), np.ceil(forklifts).astype(int)
+
+
+def shift_plan_frame(plan, labels, params=None):
+    """
+    Длинная таблица требований по сменам: строка (месяц/площадка), день, смена и численность
+    """
+    params = params or ShiftParameters()
+    n_rows, n_days, n_shifts = plan['shift_loaders'].shape
+    overloaded_hours = np.where(
+        np.array([(HOURS >= start) & (HOURS < end) for start, end in params.shifts.values()]),
+        plan['overloaded'][..., None, :], False
+    ).sum(axis=-1)
+    return pd.DataFrame({
+        'Row': np.repeat(labels, n_days * n_shifts),
+        'Day': np.tile(np.repeat(WEEKDAYS[:n_days], n_shifts), n_rows),
+        'Shift': np.tile(list(params.shifts), n_rows * n_days),
+        'Brigades': plan['shift_brigades'].ravel(),
+        'Loader': np.ceil(plan['shift_loaders'].ravel()).astype(int),
+        'Forklift_Operator': plan['shift_forklifts'].ravel(),
+        'Overloaded hours': overloaded_hours.ravel(),
+    })
+
+
+def optimize_employees_queueing(df, params=None, staffing_params=None):
+    """
+    Численность по почасовой модели очередей: Loader и Forklift_Operator - по пиковым сменам,
+    остальные роли - по формулам промпта. Возвращает таблицу той же формы, что и исходная
+    """
+    params = params or ShiftParameters()
+    staffing_params = staffing_params or StaffingParameters()
+    operations = operations_matrix(df)
+    plan = compute_shift_plan(operations, params, staffing_params)
+
+    staff = compute_rule_based_staff(operations, staffing_params)
+    loaders, forklifts = monthly_headcount(plan, staffing_params)
+    staff[:, EMPLOYEE_COLUMNS.index('Loader')] = loaders
+    staff[:, EMPLOYEE_COLUMNS.index('Forklift_Operator')] = forklifts
+
+    optimized_df = df.copy()
+    for i, col in enumerate(EMPLOYEE_COLUMNS):
+        if col in optimized_df.columns:
+            optimized_df[col] = staff[:, i]
+    optimized_df.attrs['shift_plan'] = shift_plan_frame(plan, df[df.columns[0]].astype(str).str.strip().tolist(), params)
+    return optimized_df
@@ -0,0 +1,277 @@
+"""
+Точная оптимизация численности персонала склада (целочисленное программирование)
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+OPERATION_COLUMNS = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40',
+                     'Pallet_Direct_Overloading', 'Pallet_Cross_Docking', 'Other_revenue', 'Reloading_Service',
+                     'Goods_Storage', 'Additional_Service']
+EMPLOYEE_COLUMNS = ['Director', 'Sales', 'Operation_manager', 'Loader', 'Forklift_Operator']
+OFFICE_OPERATIONS = ['Other_revenue', 'Reloading_Service', 'Goods_Storage', 'Additional_Service']
+MANUAL_OPERATIONS = ['Direct_Overloading_20', 'Cross_Docking_20', 'Direct_Overloading_40', 'Cross_Docking_40']
+PALLET_OPERATIONS = ['Pallet_Direct_Overloading', 'Pallet_Cross_Docking']
+
+# Правила пересчета персонала прогнозного месяца от базового (предыдущего) месяца:
+# роль -> (операции, порог роста, порог падения, доля роста, доля падения, минимум)
+FORECAST_STAFF_RULES = {
+    'Operation_manager': (OFFICE_OPERATIONS, 1.2, 0.8, 0.4, 0.3, 2),
+    'Loader': (MANUAL_OPERATIONS, 1.15, 0.85, 0.6, 0.4, 2),
+    'Forklift_Operator': (PALLET_OPERATIONS, 1.2, 0.8, 0.7, 0.5, 1),
+}
+
+# Обязанности (duties) и роли, которые могут их выполнять.
+# Ручную перегрузку и помощь на паллетных операциях закрывают грузчики, а в свободные часы - и операторы
+# погрузчиков; Operation_manager при малых объемах закрывает функции Warehouse Logistics Specialist,
+# Warehouse Shift Coordinator и Warehouse Logistics Assistant (coordination), часть которых берет на себя Director.
+DUTIES = ['manual_handling', 'pallet_driving', 'pallet_assist', 'office', 'coordination']
+DUTY_COVERAGE = {
+    'manual_handling': ['Loader', 'Forklift_Operator'],
+    'pallet_driving': ['Forklift_Operator'],
+    'pallet_assist': ['Loader', 'Forklift_Operator'],
+    'office': ['Operation_manager'],
+    'coordination': ['Operation_manager', 'Director'],
+}
+
+
+@dataclass
+class StaffingParameters:
+    """
+    Константы расчета персонала из промпта оптимизации
+    """
+    hours_per_month: float = 160.0
+    direct_hours: float = 3.0  # Direct_Overloading_20/40, часов на операцию
+    cross_hours: float = 5.0  # Cross_Docking_20/40, часов на операцию
+    pallet_direct_hours: float = 1.0
+    pallet_cross_hours: float = 2.0
+    office_ops_per_manager: float = 150.0
+    loaders_per_brigade: float = 4.0
+    pallet_loaders_per_operation: float = 1.0  # Один Loader вместе с Forklift_Operator
+    coordination_hours: float = 40.0  # Часы функций координатора/ассистента в месяц
+    max_parallel_operations: int = 3  # Одновременно не более 3 ручных операций (бригад)
+    # Часы в месяц, которые роль может отдать обязанностям (по умолчанию - hours_per_month)
+    role_hours: dict = field(default_factory=lambda: {'Director': 20.0})
+    min_loader: int = 2
+    min_forklift: int = 1
+    min_manager: int = 2
+    max_manager: int = 5
+    # Условная месячная стоимость одного сотрудника по ролям
+    role_costs: dict = field(default_factory=lambda: {
+        'Director': 3.0, 'Sales': 1.5, 'Operation_manager': 1.5, 'Loader': 1.0, 'Forklift_Operator': 1.2,
+    })
+    # Штраф за час невыполненной работы (должен быть дороже найма)
+    unmet_hour_penalty: float = 100.0
+
+
+# Параметры, которые можно варьировать в сценариях what-if
+SWEEP_PARAMETERS = ['hours_per_month', 'direct_hours', 'cross_hours', 'pallet_direct_hours',
+                    'pallet_cross_hours', 'office_ops_per_manager', 'loaders_per_brigade']
+
+
+def operations_matrix(df):
+    """
+    Возвращает числовую матрицу операций (строки x OPERATION_COLUMNS)
+    """
+    return df[OPERATION_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+
+def compute_duty_hours(operations, params):
+    """
+    Рассчитывает часы по каждой обязанности для матрицы операций (строки x OPERATION_COLUMNS)
+    """
+    ops = np.asarray(operations, dtype=float)
+    col = {name: i for i, name in enumerate(OPERATION_COLUMNS)}
+    manual_hours = (params.direct_hours * (ops[:, col['Direct_Overloading_20']] + ops[:, col['Direct_Overloading_40']])
+                    + params.cross_hours * (ops[:, col['Cross_Docking_20']] + ops[:, col['Cross_Docking_40']]))
+    pallet_hours = (params.pallet_direct_hours * ops[:, col['Pallet_Direct_Overloading']]
+                    + params.pallet_cross_hours * ops[:, col['Pallet_Cross_Docking']])
+    office_ops = ops[:, [col[c] for c in OFFICE_OPERATIONS]].sum(axis=1)
+
+    return np.column_stack([
+        manual_hours * params.loaders_per_brigade,
+        pallet_hours,
+        pallet_hours * params.pallet_loaders_per_operation,
+        office_ops * params.hours_per_month / params.office_ops_per_manager,
+        np.full(len(ops), params.coordination_hours),
+    ])
+
+
+def solve_staffing_milp(duty_hours, params=None):
+    """
+    Решает одну пакетную MILP-модель для всех строк (месяцев или площадок) сразу.
+    Возвращает (численность строки x EMPLOYEE_COLUMNS, невыполненные часы строки x DUTIES)
+    """
+    params = params or StaffingParameters()
+    duty_hours = np.atleast_2d(np.asarray(duty_hours, dtype=float))
+    n_blocks = len(duty_hours)
+
+    # Переменные одного блока: численность ролей, часы роль->обязанность, дефицит часов по обязанностям
+    pairs = [(role, duty) for duty in DUTIES for role in DUTY_COVERAGE[duty]]
+    n_roles, n_pairs, n_duties = len(EMPLOYEE_COLUMNS), len(pairs), len(DUTIES)
+    n_vars = n_roles + n_pairs + n_duties
+
+    # Ограничения мощности: сумма часов роли <= часы роли в месяц * численность
+    capacity_roles = sorted({role for role, _ in pairs}, key=EMPLOYEE_COLUMNS.index)
+    capacity_block = np.zeros((len(capacity_roles), n_vars))
+    for i, role in enumerate(capacity_roles):
+        capacity_block[i, EMPLOYEE_COLUMNS.index(role)] = -params.role_hours.get(role, params.hours_per_month)
+        for j, (pair_role, _) in enumerate(pairs):
+            if pair_role == role:
+                capacity_block[i, n_roles + j] = 1.0
+    
+    # Параллельность: ручную перегрузку одновременно ведут не более max_parallel_operations бригад
+    parallel_block = np.zeros((1, n_vars))
+    for j, (_, pair_duty) in enumerate(pairs):
+        if pair_duty == 'manual_handling':
+            parallel_block[0, n_roles + j] = 1.0
+    parallel_hours = params.max_parallel_operations * params.loaders_per_brigade * params.hours_per_month
+
+    # Ограничения покрытия: сумма часов по обязанности + дефицит >= потребность
+    demand_block = np.zeros((n_duties, n_vars))
+    for i, duty in enumerate(DUTIES):
+        for j, (_, pair_duty) in enumerate(pairs):
+            if pair_duty == duty:
+                demand_block[i, n_roles + j] = 1.0
+        demand_block[i, n_roles + n_pairs + i] = 1.0
+
+    # Блочно-диагональная модель для всех строк сразу
+    identity = sparse.identity(n_blocks, format='csr')
+    constraints = [
+        LinearConstraint(sparse.kron(identity, sparse.csr_matrix(capacity_block), format='csr'),
+                         -np.inf, np.zeros(n_blocks * len(capacity_roles))),
+        LinearConstraint(sparse.kron(identity, sparse.csr_matrix(demand_block), format='csr'),
+                         duty_hours.ravel(), np.inf),
+        LinearConstraint(sparse.kron(identity, sparse.csr_matrix(parallel_block), format='csr'),
+                         -np.inf, np.full(n_blocks, parallel_hours)),
+    ]
+
+    role_bounds = {
+        'Director': (1, 1),
+        'Sales': (1, 1),
+        'Operation_manager': (params.min_manager, params.max_manager),
+        'Loader': (params.min_loader, np.inf),
+        'Forklift_Operator': (params.min_forklift, np.inf),
+    }
+    lower = np.concatenate([[role_bounds[r][0] for r in EMPLOYEE_COLUMNS], np.zeros(n_pairs + n_duties)])
+    upper = np.concatenate([[role_bounds[r][1] for r in EMPLOYEE_COLUMNS], np.full(n_pairs + n_duties, np.inf)])
+    cost = np.concatenate([
+        [params.role_costs.get(r, 1.0) for r in EMPLOYEE_COLUMNS],
+        np.zeros(n_pairs),
+        np.full(n_duties, params.unmet_hour_penalty / params.hours_per_month),
+    ])
+    integrality = np.concatenate([np.ones(n_roles), np.zeros(n_pairs + n_duties)])
+
+    result = milp(
+        c=np.tile(cost, n_blocks),
+        constraints=constraints,
+        integrality=np.tile(integrality, n_blocks),
+        bounds=Bounds(np.tile(lower, n_blocks), np.tile(upper, n_blocks)),
+    )
+    if result.x is None:
+        raise ValueError(f"Staffing MILP failed: {result.message}")
+
+    solution = result.x.reshape(n_blocks, n_vars)
+    staff = np.rint(solution[:, :n_roles]).astype(int)
+    unmet_hours = solution[:, n_roles + n_pairs:]
+    return staff, unmet_hours
+
+
+def optimize_employees_milp(df, params=None):
+    """
+    Оптимизирует численность сотрудников точным MILP-решателем.
+    Возвращает таблицу той же формы, что и исходная, с оптимизированными колонками персонала
+    """
+    params = params or StaffingParameters()
+    duty_hours = compute_duty_hours(operations_matrix(df), params)
+    staff, unmet_hours = solve_staffing_milp(duty_hours, params)
+
+    optimized_df = df.copy()
+    for i, col in enumerate(EMPLOYEE_COLUMNS):
+        if col in optimized_df.columns:
+            optimized_df[col] = staff[:, i]
+    optimized_df.attrs['unmet_hours'] = pd.DataFrame(unmet_hours, columns=DUTIES, index=df.index)
+    return optimized_df
+
+
+def unmet_hours_frame(df, params=None, tolerance=0.5):
+    """
+    Часы обязанностей, которые MILP не может покрыть в пределах ограничений ролей
+    (лимит Operation_manager, параллельность ручных операций): строки с дефицитом и колонка Total
+    """
+    unmet = optimize_employees_milp(df, params).attrs['unmet_hours'].copy()
+    unmet['Total'] = unmet[DUTIES].sum(axis=1)
+    unmet.insert(0, df.columns[0], df[df.columns[0]].astype(str).str.strip())
+    return unmet[unmet['Total'] > tolerance].reset_index(drop=True)
+
+
+def compute_rule_based_staff(operations, params=None, **overrides):
+    """
+    Считает численность по формулам промпта (векторно, с округлением до ближайшего целого).
+    Параметры из overrides могут быть массивами формы (сценарии,) - результат (сценарии, строки, EMPLOYEE_COLUMNS)
+    """
+    params = params or StaffingParameters()
+    ops = np.asarray(operations, dtype=float)
+    col = {name: i for i, name in enumerate(OPERATION_COLUMNS)}
+
+    def value(name):
+        # Массив сценариев получает ось строк для трансляции
+        v = np.asarray(overrides.get(name, getattr(params, name)), dtype=float)
+        return v[..., None] if v.ndim else v
+
+    manual_time = (value('direct_hours') * (ops[:, col['Direct_Overloading_20']] + ops[:, col['Direct_Overloading_40']])
+                   + value('cross_hours') * (ops[:, col['Cross_Docking_20']] + ops[:, col['Cross_Docking_40']]))
+    pallet_time = (value('pallet_direct_hours') * ops[:, col['Pallet_Direct_Overloading']]
+                   + value('pallet_cross_hours') * ops[:, col['Pallet_Cross_Docking']])
+    office_ops = ops[:, [col[c] for c in OFFICE_OPERATIONS]].sum(axis=1)
+    hours = value('hours_per_month')
+
+    loader = np.maximum(params.min_loader, np.floor(manual_time / hours * value('loaders_per_brigade') + 0.5))
+    forklift = np.maximum(params.min_forklift, np.floor(pallet_time / hours + 0.5))
+    manager = np.clip(np.floor(office_ops / value('office_ops_per_manager') + 0.5), params.min_manager, params.max_manager)
+    loader, forklift, manager = np.broadcast_arrays(loader, forklift, manager)
+
+    fixed = np.ones_like(loader)
+    return np.stack([fixed, fixed, manager, loader, forklift], axis=-1).astype(int)
+
+
+def derive_forecast_staff(baseline, predicted):
+    """
+    Пересчитывает численность прогнозного месяца от базового месяца по FORECAST_STAFF_RULES.
+    baseline - {колонка: значение} базового месяца, predicted - {операция: прогноз};
+    значения могут быть массивами (например, бутстреп-пути) - расчет векторный
+    """
+    staff = {'Director': np.asarray(1), 'Sales': np.asarray(1)}
+    for role, (ops_cols, grow_at, shrink_at, grow_share, shrink_share, minimum) in FORECAST_STAFF_RULES.items():
+        baseline_ops = sum(np.asarray(baseline.get(c, 0), dtype=float) for c in ops_cols)
+        predicted_ops = sum(np.asarray(predicted.get(c, 0), dtype=float) for c in ops_cols)
+        baseline_staff = np.asarray(baseline.get(role, 0), dtype=float)
+        baseline_ops, predicted_ops, baseline_staff = np.broadcast_arrays(baseline_ops, predicted_ops, baseline_staff)
+
+        # Коэффициент изменения операций (1.0 при нулевой базе)
+        ratio = np.divide(predicted_ops, baseline_ops, out=np.ones_like(predicted_ops), where=baseline_ops > 0)
+        staff_change = np.where(ratio >= grow_at, 1 + (ratio - 1) * grow_share,
+                                np.where(ratio <= shrink_at, 1 + (ratio - 1) * shrink_share, 1.0))
+        # Верхнее ограничение - уровень базового месяца
+        value = np.maximum(minimum, np.minimum(baseline_staff, np.round(baseline_staff * staff_change)))
+        if role == 'Forklift_Operator':
+            # Если нет паллетных операций, то минимум операторов
+            value = np.where(predicted_ops == 0, 1, value)
+        staff[role] = value.astype(int)
+    return staff
+
+
+def optimize_employees_rule_based(df, params=None):
+    """
+    Детерминированный расчет численности по формулам промпта (без обращения к AI).
+    Возвращает таблицу той же формы, что и исходная
+    """
+    staff = compute_rule_based_staff(operations_matrix(df), params)
+    optimized_df = df.copy()
+    for i, col in enumerate(EMPLOYEE_COLUMNS):
+        if col in optimized_df.columns:
+            optimized_df[col] = staff[:, i]
+    return optimized_df
@@ -0,0 +1,133 @@
+"""
+Потоковые (Welford / Chan) ковариации и корреляции без повторного прохода по истории
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from forecasting import DEFAULT_SITE, SITE_COLUMN
+
+
+class StreamingCovariance:
+    """
+    Накопитель попарных статистик (число наблюдений, средние, суммы квадратов отклонений и
+    со-моменты) для всех пар колонок. Пропуски обрабатываются попарно, как в DataFrame.corr.
+    Накопители разных площадок/партиций объединяются через merge
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        p = len(self.columns)
+        # Элемент [i, j] относится к строкам, где наблюдаются обе колонки i и j
+        self.count = np.zeros((p, p))
+        self.mean = np.zeros((p, p))  # среднее колонки i
+        self.m2 = np.zeros((p, p))  # сумма квадратов отклонений колонки i
+        self.comoment = np.zeros((p, p))  # сумма произведений отклонений колонок i и j
+
+    @classmethod
+    def from_frame(cls, df, columns):
+        accumulator = cls(columns)
+        accumulator.update(df.reindex(columns=accumulator.columns).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float))
+        return accumulator
+
+    @classmethod
+    def by_site(cls, df, columns):
+        """
+        Отдельный накопитель на каждую площадку (без колонки Site - один накопитель)
+        """
+        if SITE_COLUMN not in df.columns:
+            return {DEFAULT_SITE: cls.from_frame(df, columns)}
+        return {site: cls.from_frame(site_df, columns) for site, site_df in df.groupby(SITE_COLUMN, sort=False)}
+
+    def update(self, rows):
+        """
+        Добавляет строку (колонки,) или батч строк (строки, колонки); NaN - пропуск
+        """
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        observed = ~np.isnan(rows)
+        if not observed.any():
+            return self
+        # Сдвиг на среднее батча для численной устойчивости сумм внутри батча
+        observed_rows = observed.sum(axis=0)
+        shift = np.where(observed, rows, 0.0).sum(axis=0) / np.maximum(observed_rows, 1)
+        z = np.where(observed, rows - shift, 0.0)
+        mask = observed.astype(float)
+
+        count = mask.T @ mask
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_z = np.where(count > 0, (z.T @ mask) / count, 0.0)
+        batch = StreamingCovariance(self.columns)
+        batch.count = count
+        batch.mean = np.where(count > 0, mean_z + shift[:, None], 0.0)
+        batch.m2 = np.maximum((z * z).T @ mask - count * mean_z ** 2, 0.0)
+        batch.comoment = z.T @ z - count * mean_z * mean_z.T
+        return self.merge(batch)
+
+    def merge(self, other):
+        """
+        Объединяет статистики другого накопителя с теми же колонками (формулы Чана)
+        """
+        if other.columns != self.columns:
+            raise ValueError("Accumulators have different columns")
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(count > 0, other.count / count, 0.0)
+            scale = np.where(count > 0, self.count * other.count / count, 0.0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + other.m2 + delta ** 2 * scale
+        self.comoment = self.comoment + other.comoment + delta * delta.T * scale
+        self.count = count
+        return self
+
+    def covariance(self, ddof=1):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = np.where(self.count > ddof, self.comoment / (self.count - ddof), np.nan)
+        return pd.DataFrame(covariance, index=self.columns, columns=self.columns)
+
+    def correlation(self, min_periods=1):
+        """
+        Матрица корреляций Пирсона за O(колонок²), без прохода по данным
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        correlation = np.where(self.count >= max(min_periods, 2), np.clip(correlation, -1, 1), np.nan)
+        return pd.DataFrame(correlation, index=self.columns, columns=self.columns)
+
+
+class AppendOnlyCovariance:
+    """
+    Накопитель для таблицы, которая растет добавлением строк (история площадки): sync передает
+    в накопитель только строки, добавленные после прошлого вызова. Если учтенные строки изменились
+    (таблица короче или другая последняя учтенная строка), накопитель строится заново
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.accumulator = StreamingCovariance(self.columns)
+        self.rows = 0
+        self._last_row = None
+
+    def sync(self, df):
+        """
+        Учитывает новые строки df и возвращает накопитель
+        """
+        with self._lock:
+            if self.rows:
+                if len(df) < self.rows or not np.array_equal(self._values(df.iloc[[self.rows - 1]])[0], self._last_row,
+                                                              equal_nan=True):
+                    self._reset()
+            if len(df) > self.rows:
+                new_rows = self._values(df.iloc[self.rows:])
+                self.accumulator.update(new_rows)
+                self.rows = len(df)
+                self._last_row = new_rows[-1]
+            return self.accumulator
+
+    def _values(self, rows):
+        return rows.reindex(columns=self.columns).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
@@ -0,0 +1,84 @@
+"""
+Постраничная выдача таблиц на сервере: индекс для фильтров и сортировки строится один раз
+"""
+import numpy as np
+import pandas as pd
+
+from forecasting import SITE_COLUMN
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def label_columns(df):
+    """
+    Колонки-метки таблицы: месяц (первая колонка) и площадка, если есть
+    """
+    return [df.columns[0]] + ([SITE_COLUMN] if SITE_COLUMN in df.columns and SITE_COLUMN != df.columns[0] else [])
+
+
+def with_numeric_values(df):
+    """
+    Копия таблицы с числовыми колонками значений (например, после разбора текстового ответа);
+    колонки-метки остаются как есть
+    """
+    numeric_df = df.copy()
+    value_columns = [col for col in df.columns if col not in label_columns(df)]
+    numeric_df[value_columns] = numeric_df[value_columns].apply(pd.to_numeric, errors='coerce')
+    return numeric_df
+
+
+class TableIndex:
+    """
+    Индекс таблицы для постраничного показа: числовые колонки приводятся один раз,
+    для колонок-меток (месяц, площадка) хранятся позиции строк по значению,
+    перестановки для сортировки строятся по требованию и запоминаются
+    """
+
+    def __init__(self, df):
+        labels = label_columns(df)
+        self.columns = list(df.columns)
+        self.label_columns = [col for col in self.columns if col in labels]
+        self.value_columns = [col for col in self.columns if col not in labels]
+
+        frame = df.reset_index(drop=True)
+        values = frame[self.value_columns].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+        self.frame = pd.concat([frame[self.label_columns], values], axis=1)[self.columns]
+        self.positions = {col: self.frame.groupby(col, sort=False).indices for col in self.label_columns}
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def filter_values(self, column):
+        return list(self.positions[column])
+
+    def order(self, column):
+        """
+        Стабильная перестановка строк по возрастанию колонки
+        """
+        if column not in self._orders:
+            self._orders[column] = np.argsort(self.frame[column].to_numpy(), kind='stable')
+        return self._orders[column]
+
+    def query(self, filters=None, sort_by=None, ascending=True):
+        """
+        Позиции строк, прошедших фильтры {колонка: значения}, в порядке сортировки
+        """
+        selected = np.ones(len(self.frame), dtype=bool)
+        for column, values in (filters or {}).items():
+            if values:
+                mask = np.zeros(len(self.frame), dtype=bool)
+                mask[np.concatenate([self.positions[column][value] for value in values])] = True
+                selected &= mask
+        if sort_by is None:
+            return np.flatnonzero(selected)
+        order = self.order(sort_by) if ascending else self.order(sort_by)[::-1]
+        return order[selected[order]]
+
+    def page(self, positions, page=1, page_size=DEFAULT_PAGE_SIZE, columns=None):
+        """
+        Строки страницы page (с 1) и выбранные колонки; колонки-метки показываются всегда
+        """
+        rows = positions[(page - 1) * page_size:page * page_size]
+        shown = [col for col in self.columns if col in self.label_columns or not columns or col in columns]
+        return self.frame.iloc[rows][shown]
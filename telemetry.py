@@ -0,0 +1,109 @@
+"""
+Легковесные замеры времени и памяти по этапам перезапуска приложения
+"""
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Telemetry:
+    """
+    Процессный сборщик спанов (этап, длительность, прирост памяти) в кольцевом буфере.
+    Прирост памяти измеряется только при включенном tracemalloc
+    """
+
+    def __init__(self, max_spans=10000):
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=max_spans)
+
+    def record(self, stage, seconds, alloc_bytes=0, **labels):
+        span = {
+            'ts': time.time(),
+            'stage': stage,
+            'duration_ms': seconds * 1000,
+            'alloc_kb': alloc_bytes / 1024,
+            **labels,
+        }
+        with self._lock:
+            self._spans.append(span)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        tracing = tracemalloc.is_tracing()
+        memory_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            alloc_bytes = tracemalloc.get_traced_memory()[0] - memory_before if tracing else 0
+            self.record(stage, time.perf_counter() - started, alloc_bytes, **labels)
+
+    def timed(self, stage):
+        """
+        Декоратор: каждый вызов функции записывается как спан stage
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def set_allocation_tracking(enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def summary(self):
+        """
+        Перцентили длительности и средний прирост памяти по этапам
+        """
+        spans = pd.DataFrame(self.spans(), columns=['ts', 'stage', 'duration_ms', 'alloc_kb'])
+        if spans.empty:
+            return pd.DataFrame(columns=['stage', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'total_ms', 'mean_alloc_kb'])
+        grouped = spans.groupby('stage')
+        summary = pd.DataFrame({
+            'count': grouped['duration_ms'].count(),
+            **{f'p{int(q * 100)}_ms': grouped['duration_ms'].quantile(q) for q in QUANTILES},
+            'total_ms': grouped['duration_ms'].sum(),
+            'mean_alloc_kb': grouped['alloc_kb'].mean(),
+        })
+        return summary.round(2).sort_values('total_ms', ascending=False).reset_index()
+
+    def to_jsonl(self):
+        return '\n'.join(json.dumps(span, default=str) for span in self.spans()) + '\n'
+
+    def to_prometheus(self, metric='warehouse_app_stage_duration_seconds'):
+        """
+        Текстовый формат Prometheus (summary): квантили, сумма и количество по этапам
+        """
+        lines = [
+            f'# HELP {metric} Duration of application stages.',
+            f'# TYPE {metric} summary',
+        ]
+        durations = {}
+        for span in self.spans():
+            durations.setdefault(span['stage'], []).append(span['duration_ms'] / 1000)
+        for stage, values in sorted(durations.items()):
+            values = np.asarray(values)
+            for q in QUANTILES:
+                lines.append(f'{metric}{{stage="{stage}",quantile="{q}"}} {np.quantile(values, q):.6f}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {values.sum():.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {len(values)}')
+        return '\n'.join(lines) + '\n'
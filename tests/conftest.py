@@ -0,0 +1,14 @@
+import os
+
+import pandas as pd
+import pytest
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'df.xlsx')
+
+
+@pytest.fixture(scope='session')
+def warehouse_df():
+    # Исходная таблица приложения: первая строка Excel - заголовки колонок
+    df = pd.read_excel(DATA_PATH)
+    df.columns = df.iloc[0]
+    return df.drop(df.index[0]).reset_index(drop=True)
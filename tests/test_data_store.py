@@ -0,0 +1,83 @@
+"""
+Общее хранилище артефактов: адресация по содержимому, ссылки сессий и сборка неиспользуемых артефактов
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_store
+from data_store import SharedStore, content_hash
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(data_store.time, 'time', lambda: now[0])
+    return now
+
+
+def test_content_hash_follows_content():
+    a = pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']})
+    assert content_hash(a) == content_hash(a.copy())
+    assert content_hash(a) != content_hash(a.assign(x=[1, 3]))
+    assert content_hash(a) != content_hash(a.rename(columns={'x': 'z'}))
+    assert content_hash(('k', np.arange(3))) != content_hash(('k', np.arange(3.0)))
+
+
+def test_identical_content_is_stored_once():
+    store = SharedStore()
+    key = store.put(pd.DataFrame({'x': [1, 2]}), 'dataset')
+    assert store.put(pd.DataFrame({'x': [1, 2]}), 'dataset') == key
+    assert len(store.artifact_table()) == 1
+    array = store.get(store.put(np.arange(3), 'array'))
+    with pytest.raises(ValueError):
+        array[0] = 5
+
+
+def test_derive_computes_once():
+    store = SharedStore()
+    calls = []
+    compute = lambda: calls.append(1) or pd.DataFrame({'x': [len(calls)]})
+    first = store.derive('optimized_df', ('input',), compute)
+    assert store.derive('optimized_df', ('input',), compute) == first
+    assert len(calls) == 1
+
+
+def test_collect_keeps_referenced_and_recent_artifacts(clock):
+    store = SharedStore()
+    kept = store.put(pd.DataFrame({'x': [1]}), 'forecast')
+    replaced = store.put(pd.DataFrame({'x': [2]}), 'forecast')
+    store.attach('s1', 'forecast_data', (kept,))
+
+    store.collect(idle_seconds=3600, grace_seconds=300)
+    assert replaced in store  # без ссылок, но к нему обращались недавно
+
+    clock[0] += 301
+    store.touch('s1')
+    store.collect(idle_seconds=3600, grace_seconds=300)
+    assert kept in store and replaced not in store
+
+
+def test_idle_session_artifacts_are_collected_and_attach_refreshes(clock):
+    store = SharedStore()
+    key = store.put(pd.DataFrame({'x': [1]}), 'forecast')
+    store.attach('idle', 'forecast_data', (key,))
+    clock[0] += 3000
+    # Другая сессия ссылается на тот же артефакт - обращение продлевает его жизнь
+    store.attach('active', 'forecast_data', (key,))
+    clock[0] += 700
+    store.collect(idle_seconds=3600, grace_seconds=300)
+    assert key in store
+    assert list(store.session_table()['Session']) == ['active']
+
+    clock[0] += 3601
+    store.collect(idle_seconds=3600, grace_seconds=300)
+    assert key not in store
+
+
+def test_pinned_artifacts_survive_collection(clock):
+    store = SharedStore()
+    key = store.put(pd.DataFrame({'x': [1]}), 'dataset', pinned=True)
+    clock[0] += 10 ** 6
+    store.collect()
+    assert key in store
@@ -0,0 +1,29 @@
+"""
+Пакетные парные регрессии роль x операция против LinearRegression
+"""
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from diagnostics import TOTAL_OPERATIONS, fit_pairwise_regressions, pair_values, regression_matrix
+
+
+def test_batch_fits_match_sklearn(warehouse_df):
+    fits = fit_pairwise_regressions(warehouse_df).set_index(['Role', 'Operation'])
+    for role, operation in [('Loader', TOTAL_OPERATIONS), ('Operation_manager', 'Additional_Service'),
+                            ('Forklift_Operator', 'Pallet_Cross_Docking')]:
+        x, y = pair_values(warehouse_df, role, operation)
+        model = LinearRegression().fit(x[:, None], y)
+        fit = fits.loc[(role, operation)]
+        assert fit['Slope'] == pytest.approx(model.coef_[0])
+        assert fit['Intercept'] == pytest.approx(model.intercept_)
+        assert fit['R2'] == pytest.approx(model.score(x[:, None], y))
+        assert fit['Elasticity'] == pytest.approx(model.coef_[0] * x.mean() / y.mean())
+
+
+def test_matrix_keeps_role_and_operation_order(warehouse_df):
+    fits = fit_pairwise_regressions(warehouse_df)
+    matrix = regression_matrix(fits, 'R2')
+    assert list(matrix.index) == list(fits['Role'].unique())
+    assert list(matrix.columns)[-1] == TOTAL_OPERATIONS
+    # Director всегда 1 - нулевая дисперсия, R² = 0
+    assert (matrix.loc['Director'] == 0).all()
@@ -0,0 +1,57 @@
+"""
+Сравнение таблиц численности: поячеечные изменения, строки только с одной стороны и сводка по ролям
+"""
+import numpy as np
+import pandas as pd
+
+from differences import changed_cells, diff_frame, missing_rows, role_summary
+from forecasting import SITE_COLUMN
+
+
+def make_table(months, loader, manager, site=None):
+    table = pd.DataFrame({'Month': months, 'Loader': loader, 'Operation_manager': manager})
+    if site is not None:
+        table.insert(1, SITE_COLUMN, site)
+    return table
+
+
+def test_diff_frame_matches_cell_by_cell_difference():
+    before = make_table(['May', 'June'], [6, 8], [1, 1])
+    after = make_table(['May', 'June'], [7, 8], [1, 2])
+    diff = diff_frame(before, after, roles=['Loader', 'Operation_manager'])
+
+    assert diff['Role'].tolist() == ['Loader', 'Operation_manager'] * 2
+    assert diff['Change'].tolist() == [1, 0, 0, 1]
+    np.testing.assert_allclose(diff['Change (%)'], [100 / 6, 0, 0, 100])
+    assert changed_cells(diff).sum() == 2
+
+
+def test_rows_missing_on_either_side_are_differences():
+    before = make_table(['May', 'June', 'July'], [6, 8, 9], [1, 1, 1])
+    after = make_table(['May', 'August'], [6, 5], [1, 1])
+    diff = diff_frame(before, after)
+
+    assert diff['Month'].unique().tolist() == ['May', 'June', 'July', 'August']
+    assert changed_cells(diff).sum() == 6
+    assert diff.loc[diff['Month'] == 'June', 'After'].isna().all()
+    assert [month for _, month in missing_rows(diff, 'After')] == ['June', 'July']
+    assert [month for _, month in missing_rows(diff, 'Before')] == ['August']
+
+
+def test_repeated_months_are_matched_per_site():
+    before = make_table(['May', 'May', 'May'], [6, 7, 3], [1, 1, 1], site=['North', 'North', 'South'])
+    after = make_table(['May', 'May', 'May'], [3, 6, 9], [1, 1, 1], site=['South', 'North', 'North'])
+    diff = diff_frame(before, after, roles=['Loader'])
+
+    assert diff['Site'].tolist() == ['North', 'North', 'South']
+    assert diff['Change'].tolist() == [0, 2, 0]
+
+
+def test_role_summary_direction():
+    before = make_table(['May', 'June'], [6, 8], [2, 2])
+    after = make_table(['May', 'June'], [8, 10], [2, 2])
+    summary = role_summary(diff_frame(before, after)).set_index('Role')
+
+    assert summary.loc['Loader', 'Change'] == 2
+    assert summary.loc['Loader', 'Direction'] == '⬆️ Increase'
+    assert summary.loc['Operation_manager', 'Direction'] == '➡️ No significant change'
@@ -0,0 +1,59 @@
+"""
+Выгрузка таблиц: обратное чтение CSV, Parquet и Excel и таблицы, разобранные из текста
+"""
+import io
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from openpyxl import load_workbook
+
+from exports import export_tables, write_parquet
+from tables import with_numeric_values
+
+
+@pytest.fixture
+def combined():
+    # Оптимизированная таблица разбирается из текста (все значения - строки), прогноз - числа
+    optimized = pd.DataFrame([['May', '6', '2'], ['June', '7', '3'], ['July', '8', '3']], columns=['Month', 'Loader', 'Sales'])
+    forecast = pd.DataFrame([['October', 9, 4], ['November', 10, 4]], columns=['Month', 'Loader', 'Sales'])
+    return optimized, forecast
+
+
+def test_text_values_break_parquet_until_converted(combined):
+    optimized, forecast = combined
+    mixed = pd.concat([optimized, forecast], ignore_index=True)
+    with pytest.raises((pa.ArrowTypeError, pa.ArrowInvalid)):
+        write_parquet(mixed, io.BytesIO())
+
+    numeric = pd.concat([with_numeric_values(optimized), forecast], ignore_index=True)
+    assert numeric['Loader'].dtype.kind == 'i'
+    assert numeric['Month'].tolist() == ['May', 'June', 'July', 'October', 'November']
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_zip_exports_round_trip(combined, fmt):
+    optimized, forecast = combined
+    tables = {'Optimized': with_numeric_values(optimized),
+              'Combined': pd.concat([with_numeric_values(optimized), forecast], ignore_index=True)}
+    with zipfile.ZipFile(io.BytesIO(export_tables(tables, fmt, batch_rows=2))) as archive:
+        assert sorted(archive.namelist()) == [f'Combined.{fmt}', f'Optimized.{fmt}']
+        for name, table in tables.items():
+            with archive.open(f'{name}.{fmt}') as entry:
+                data = pd.read_csv(entry) if fmt == 'csv' else pd.read_parquet(io.BytesIO(entry.read()))
+            pd.testing.assert_frame_equal(data, table, check_dtype=False)
+
+
+def test_excel_cells_are_numbers(combined):
+    optimized, forecast = combined
+    combined_df = pd.concat([with_numeric_values(optimized), forecast], ignore_index=True)
+    workbook = load_workbook(io.BytesIO(export_tables({'Combined': combined_df}, 'xlsx', batch_rows=2)))
+    rows = list(workbook['Combined'].iter_rows(values_only=True))
+    assert rows[0] == ('Month', 'Loader', 'Sales')
+    assert rows[1:] == [('May', 6, 2), ('June', 7, 3), ('July', 8, 3), ('October', 9, 4), ('November', 10, 4)]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        export_tables({'x': pd.DataFrame({'a': [1]})}, 'json')
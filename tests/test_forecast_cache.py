@@ -0,0 +1,58 @@
+"""
+Постоянный кэш прогнозов: чтение сохраненного результата, счетчики и вытеснение давно не использованных записей
+"""
+import pandas as pd
+import pytest
+
+import forecast_cache as forecast_cache_module
+from forecast_cache import ForecastCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Управляемое время: каждая запись и чтение получают свою отметку
+    now = [1000.0]
+    monkeypatch.setattr(forecast_cache_module.time, 'time', lambda: now[0])
+    return now
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = ForecastCache(str(tmp_path / 'cache.sqlite'))
+    result = (pd.DataFrame({'Month': ['October'], 'Loader': [9]}), None)
+    assert cache.get('a') is None
+
+    cache.put('a', result)
+    cached = cache.get('a')
+    pd.testing.assert_frame_equal(cached[0], result[0])
+    assert cached[1] is None
+
+    summary = cache.summary()
+    assert (summary['entries'], summary['hits'], summary['misses']) == (1, 1, 1)
+    cache.clear()
+    assert cache.summary()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ForecastCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    for key in ('a', 'b'):
+        clock[0] += 1
+        cache.put(key, key)
+    clock[0] += 1
+    cache.get('a')  # 'a' использован позже 'b'
+    clock[0] += 1
+    cache.put('c', 'c')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a' and cache.get('c') == 'c'
+    assert cache.summary()['evicted'] == 1
+
+
+def test_byte_limit_keeps_the_newest_entry(tmp_path, clock):
+    cache = ForecastCache(str(tmp_path / 'cache.sqlite'), max_bytes=100)
+    cache.put('small', 1)
+    clock[0] += 1
+    cache.put('large', 'x' * 500)
+
+    # Запись больше лимита остается (самая свежая), остальные вытесняются
+    assert cache.get('large') == 'x' * 500
+    assert cache.get('small') is None
@@ -0,0 +1,160 @@
+"""
+Модели прогноза, бэктест, онлайн-регрессия и бутстреп-интервалы
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import (FORECASTERS, SEASON_LENGTH, backtest_matrix, backtest_series, forecast_linear,
+                         forecast_seasonal_naive, forecast_series, select_best_models, series_from_frame)
+
+
+def test_linear_model_extends_exact_trend():
+    np.testing.assert_allclose(forecast_linear(np.array([3.0, 5.0, 7.0, 9.0]), 3), [11, 13, 15])
+
+
+def test_seasonal_naive_repeats_last_year():
+    y = np.arange(2 * SEASON_LENGTH, dtype=float)
+    np.testing.assert_array_equal(forecast_seasonal_naive(y, 3), y[SEASON_LENGTH:SEASON_LENGTH + 3])
+
+
+def test_short_history_falls_back_to_linear():
+    y = np.array([10.0, 12.0, 14.0, 16.0, 18.0])
+    np.testing.assert_allclose(forecast_series(y, 'seasonal_naive', 2), [20, 22])
+
+
+def test_backtest_errors_by_hand():
+    y = np.array([1.0, 2.0, 3.0, 4.0, 6.0])
+    errors = backtest_series(y, horizon=3, models=['linear', 'seasonal_naive'])
+    # origin=3: прогноз [4, 5] против [4, 6]; origin=4: прогноз 5 по 1..4 против 6
+    assert errors['linear'] == pytest.approx((0 + 1 + 1) / 3)
+    # Сезонному наивному прогнозу нужно SEASON_LENGTH точек - ни одной точки отсечения
+    assert np.isnan(errors['seasonal_naive'])
+
+
+def test_backtest_matrix_keys_by_site_and_matches_sequential():
+    df = pd.DataFrame({
+        'Month': ['May', 'June', 'July', 'August', 'September'] * 2,
+        'Site': ['A'] * 5 + ['B'] * 5,
+        'Loader': [1, 2, 3, 4, 5, 10, 8, 9, 7, 8],
+        'Goods_Storage': [5, 5, 6, 6, 7, 1, 2, 1, 3, 30],
+    })
+    series = series_from_frame(df, ['Loader', 'Goods_Storage'])
+    assert list(series) == [('A', 'Loader'), ('A', 'Goods_Storage'), ('B', 'Loader'), ('B', 'Goods_Storage')]
+
+    pooled = backtest_matrix(series, models=['linear', 'holt_winters'], max_workers=2)
+    sequential = backtest_matrix(series, models=['linear', 'holt_winters'], max_workers=1)
+    pd.testing.assert_frame_equal(pooled, sequential)
+    for (site, col), row in sequential.iterrows():
+        assert row['linear'] == pytest.approx(backtest_series(series[(site, col)], models=['linear'])['linear'])
+
+
+def test_select_best_models_ignores_unevaluated_models():
+    matrix = pd.DataFrame({'linear': [2.0, np.nan], 'seasonal_naive': [np.nan, np.nan], 'holt_winters': [1.0, np.nan]},
+                          index=pd.MultiIndex.from_tuples([('A', 'x'), ('A', 'y')]))
+    assert select_best_models(matrix).to_dict() == {('A', 'x'): 'holt_winters', ('A', 'y'): 'linear'}
+    assert set(FORECASTERS) >= {'linear', 'seasonal_naive', 'holt_winters', 'damped_trend'}
+
+
+def test_running_trend_matches_linear_regression():
+    from sklearn.linear_model import LinearRegression
+
+    from forecasting import RunningLinearTrend
+
+    rng = np.random.default_rng(1)
+    x = np.array([5, 6, 7, 8, 9])
+    values = rng.normal(100, 20, size=(5, 3))
+    values[1, 2] = np.nan  # пропуск учитывается только в своей колонке
+    df = pd.DataFrame(values, columns=['a', 'b', 'c'])
+    df.insert(0, 'Month', ['May', 'June', 'July', 'August', 'September'])
+    trend = RunningLinearTrend.from_frame(df, ['a', 'b', 'c'])
+
+    for i, col in enumerate(['a', 'b', 'c']):
+        observed = ~np.isnan(values[:, i])
+        model = LinearRegression().fit(x[observed, None], values[observed, i])
+        assert trend.predict(12)[i] == pytest.approx(model.predict([[12]])[0])
+
+    # Добавление месяца - то же, что переобучение на расширенной истории
+    trend.update(10, [50.0, 60.0, 70.0])
+    model = LinearRegression().fit(np.append(x, 10)[:, None], np.append(values[:, 0], 50.0))
+    assert trend.predict(11)[0] == pytest.approx(model.predict([[11]])[0])
+
+
+def test_running_trend_keeps_sites_apart():
+    from forecasting import RunningLinearTrend
+
+    df = pd.DataFrame({'Month': ['May', 'June', 'May', 'June'], 'Site': ['A', 'A', 'B', 'B'], 'v': [1.0, 2.0, 10.0, 5.0]})
+    trend = RunningLinearTrend.from_frame(df, ['v'])
+    assert trend.predict(7, site='A')[0] == pytest.approx(3.0)
+    assert trend.predict(7, site='B')[0] == pytest.approx(0.0)
+
+
+def test_bootstrap_paths_of_exact_line_have_no_spread():
+    from forecasting import bootstrap_linear_paths
+
+    x = np.arange(5, 10)
+    values = np.column_stack([2 * x + 1, 100 - 3 * x]).astype(float)
+    paths = bootstrap_linear_paths(values, x, [10, 11], n_resamples=50, seed=0)
+    assert paths.shape == (50, 2, 2)
+    expected = np.column_stack([2 * np.array([10, 11]) + 1, 100 - 3 * np.array([10, 11])])
+    np.testing.assert_allclose(paths, np.broadcast_to(expected, paths.shape), atol=1e-9)
+
+
+def test_intervals_cover_the_point_forecast(warehouse_df):
+    from forecasting import bootstrap_forecast_paths, prediction_intervals
+    from staffing import EMPLOYEE_COLUMNS, OPERATION_COLUMNS
+
+    months = ['October', 'November', 'December']
+    paths = bootstrap_forecast_paths(warehouse_df, months, n_resamples=500, seed=0)
+    assert set(paths) == set(OPERATION_COLUMNS + EMPLOYEE_COLUMNS)
+    lower, upper = prediction_intervals(paths, months, level=0.9)
+    assert list(lower.index) == months
+    assert (lower <= upper).all().all()
+
+    # Точечный прогноз линейного тренда внутри 90% интервала операций
+    x = np.array([5, 6, 7, 8, 9])
+    for col in OPERATION_COLUMNS:
+        y = pd.to_numeric(warehouse_df[col]).to_numpy(dtype=float)
+        point = max(0, np.round(np.polyval(np.polyfit(x, y, 1), 10)))
+        assert lower.loc['October', col] <= point <= upper.loc['October', col]
+
+    # Один и тот же seed - одни и те же пути
+    again = bootstrap_forecast_paths(warehouse_df, months, n_resamples=500, seed=0)
+    np.testing.assert_array_equal(paths['Loader'], again['Loader'])
+
+
+@pytest.mark.parametrize('model', ['holt_winters', 'damped_trend'])
+def test_intervals_follow_the_selected_model(warehouse_df, model):
+    from forecasting import DEFAULT_SITE, bootstrap_forecast_paths, prediction_intervals
+    from staffing import EMPLOYEE_COLUMNS, OPERATION_COLUMNS
+
+    # Короткая история (остатки линейного тренда) и длинная (ошибки самой модели на шаг вперед)
+    rng = np.random.default_rng(2)
+    history = pd.DataFrame({'Month': ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August']})
+    for i, col in enumerate(OPERATION_COLUMNS):
+        history[col] = np.round(40 + (i + 1) * np.arange(8) + rng.normal(scale=4, size=8))
+    history[EMPLOYEE_COLUMNS] = 5
+    for df, months in ((warehouse_df, ['October', 'November', 'December']), (history, ['September', 'October'])):
+        models = {(DEFAULT_SITE, col): model for col in OPERATION_COLUMNS}
+        paths = bootstrap_forecast_paths(df, months, n_resamples=500, seed=0, models=models)
+        lower, upper = prediction_intervals(paths, months, level=0.9)
+        for col in OPERATION_COLUMNS:
+            point = np.round(forecast_series(pd.to_numeric(df[col]), model, len(months)))
+            assert (lower[col].to_numpy() <= point).all() and (point <= upper[col].to_numpy()).all()
+
+
+def test_forecast_staff_rules_are_vectorized():
+    from staffing import derive_forecast_staff
+
+    baseline = {'Other_revenue': 100, 'Operation_manager': 4, 'Direct_Overloading_20': 50, 'Loader': 10,
+                'Pallet_Direct_Overloading': 20, 'Forklift_Operator': 3}
+    predicted = {'Other_revenue': np.array([130.0, 60.0, 100.0]), 'Direct_Overloading_20': np.array([50.0, 40.0, 80.0]),
+                 'Pallet_Direct_Overloading': np.array([0.0, 20.0, 30.0])}
+    staff = derive_forecast_staff(baseline, predicted)
+    for i in range(3):
+        single = derive_forecast_staff(baseline, {col: values[i] for col, values in predicted.items()})
+        for role in ['Operation_manager', 'Loader', 'Forklift_Operator']:
+            assert staff[role][i] == single[role]
+    # Рост операций не поднимает персонал выше базового месяца, без паллет - минимум операторов
+    assert staff['Operation_manager'][0] == 4
+    assert staff['Forklift_Operator'][0] == 1
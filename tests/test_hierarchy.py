@@ -0,0 +1,85 @@
+"""
+Иерархическое согласование: после любого метода агрегаты равны сумме площадок (S @ bottom)
+"""
+import numpy as np
+import pytest
+
+import hierarchy as hierarchy_module
+from forecasting import forecast_series
+from hierarchy import RECONCILIATION_METHODS, Hierarchy, hierarchical_forecast, linear_trend_forecasts, reconcile
+
+
+@pytest.fixture
+def hierarchy():
+    return Hierarchy(['North', 'South', 'East', 'West'],
+                     regions={'North': 'A', 'South': 'A', 'East': 'B', 'West': 'B'})
+
+
+@pytest.fixture
+def bottom_history():
+    rng = np.random.default_rng(11)
+    trend = np.arange(8)[None, :, None] * rng.uniform(0.5, 2, size=(4, 1, 3))
+    return 50 + trend + rng.normal(scale=3, size=(4, 8, 3))
+
+
+def test_summing_matrix(hierarchy):
+    assert hierarchy.nodes[:3] == [('Total', 'Total'), ('Region', 'A'), ('Region', 'B')]
+    np.testing.assert_array_equal(hierarchy.aggregation, [[1, 1, 1, 1], [1, 1, 0, 0], [0, 0, 1, 1]])
+    assert hierarchy.summing.shape == (7, 4)
+    assert hierarchy.coherence_gap(hierarchy.aggregate(np.ones((4, 2)))) == 0
+
+
+@pytest.mark.parametrize('method', RECONCILIATION_METHODS)
+def test_every_method_is_coherent(hierarchy, bottom_history, method):
+    reconciled, base = hierarchical_forecast(bottom_history, hierarchy, horizon=3, method=method)
+    assert reconciled.shape == base.shape == (7, 3, 3)
+
+    bottom = reconciled[hierarchy.n_aggregates:]
+    np.testing.assert_allclose(hierarchy.aggregate(bottom), reconciled, atol=1e-8)
+    assert hierarchy.coherence_gap(reconciled) < 1e-8
+
+
+def test_linear_base_forecasts_are_already_coherent(hierarchy, bottom_history):
+    # Линейный тренд сохраняет суммы - при одной линейной модели на всех узлах согласовывать нечего
+    _, base = hierarchical_forecast(bottom_history, hierarchy, horizon=2, method='ols')
+    assert hierarchy.coherence_gap(base) < 1e-8
+
+
+@pytest.mark.parametrize('method', ['mint_shrink', 'wls', 'ols'])
+def test_node_models_are_reconciled(hierarchy, bottom_history, method):
+    # Итог и регион A - затухающий тренд, площадки и регион B - линейный: базовые прогнозы расходятся
+    models = {(node, column): 'damped_trend' for node in (0, 1) for column in range(3)}
+    reconciled, base = hierarchical_forecast(bottom_history, hierarchy, horizon=3, method=method, models=models)
+    history = hierarchy.aggregate(bottom_history)
+
+    for column in range(3):
+        np.testing.assert_allclose(base[0, :, column], forecast_series(history[0, :, column], 'damped_trend', 3))
+    np.testing.assert_allclose(base[2:], linear_trend_forecasts(history, 3)[0][2:])
+    assert hierarchy.coherence_gap(base) > 0.1
+    assert hierarchy.coherence_gap(reconciled) < 1e-8
+
+
+def test_auto_models_follow_node_backtests(hierarchy, bottom_history, monkeypatch):
+    selected = []
+    select = hierarchy_module.select_node_models
+    monkeypatch.setattr(hierarchy_module, 'select_node_models', lambda *args: selected.append(select(*args)) or selected[0])
+    reconciled, base = hierarchical_forecast(bottom_history, hierarchy, horizon=3, models='auto')
+    history = hierarchy.aggregate(bottom_history)
+
+    assert set(selected[0]) == {(node, column) for node in range(7) for column in range(3)}
+    for (node, column), model in selected[0].items():
+        np.testing.assert_allclose(base[node, :, column], forecast_series(history[node, :, column], model, 3))
+    assert hierarchy.coherence_gap(reconciled) < 1e-8
+
+
+def test_ols_moves_incoherent_total(hierarchy):
+    base = hierarchy.aggregate(np.ones((4, 1, 1)))
+    base[0] += 7  # итог не совпадает с суммой площадок
+    reconciled = reconcile(base, hierarchy, 'ols')
+    assert hierarchy.coherence_gap(reconciled) < 1e-8
+    assert 4 < reconciled[0, 0, 0] < 11
+
+
+def test_unknown_method(hierarchy, bottom_history):
+    with pytest.raises(ValueError):
+        hierarchical_forecast(bottom_history, hierarchy, horizon=1, method='median')
@@ -0,0 +1,62 @@
+"""
+История на диске: таблица площадки совпадает с исходными строками, срезы и признак устаревания
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import DEFAULT_SITE, REGION_COLUMN, SITE_COLUMN
+from history_store import VALUES_FILE, HistoryStore
+
+
+@pytest.fixture
+def network():
+    return pd.DataFrame({
+        'Month': ['May', 'June', 'May', 'June'],
+        SITE_COLUMN: ['North', 'North', 'South', 'South'],
+        REGION_COLUMN: ['East', 'East', 'West', 'West'],
+        'Loader': [6, 7, 12, 14],
+        'Sales': [100, 120, 200, 240],
+    })
+
+
+def test_site_frames_match_source_rows(tmp_path, network):
+    store = HistoryStore.from_frame(str(tmp_path / 'store'), network)
+    assert store.sites == ['North', 'South']
+    assert store.regions == {'North': 'East', 'South': 'West'}
+    assert store.values.dtype == np.int64
+
+    for site, rows in network.groupby(SITE_COLUMN):
+        expected = rows[['Month', 'Loader', 'Sales']].reset_index(drop=True)
+        pd.testing.assert_frame_equal(store.frame(site), expected)
+
+
+def test_slices_and_site_cube(tmp_path, network):
+    store = HistoryStore.from_frame(str(tmp_path / 'store'), network)
+    np.testing.assert_array_equal(store.slice('South', periods=['June'], columns=['Sales']), [[240]])
+    assert store.frame('North', periods=slice(1, None))['Month'].tolist() == ['June']
+    assert store.site_cube(['Loader']).shape == (2, 2, 1)
+    np.testing.assert_array_equal(store.site_cube(['Loader'])[:, :, 0], [[6, 7], [12, 14]])
+
+
+def test_single_site_and_missing_values(tmp_path):
+    df = pd.DataFrame({'Month': ['May', 'June'], 'Loader': [6, None]})
+    store = HistoryStore.from_frame(str(tmp_path / 'store'), df)
+    assert store.sites == [DEFAULT_SITE]
+    assert store.values.dtype == np.float64
+    assert np.isnan(store.frame()['Loader'].iloc[1])
+
+
+def test_is_stale_after_source_changes(tmp_path, network):
+    path, source = str(tmp_path / 'store'), str(tmp_path / 'source.xlsx')
+    open(source, 'w').close()
+    assert HistoryStore.is_stale(path, source)
+
+    HistoryStore.from_frame(path, network)
+    built = os.path.getmtime(os.path.join(path, VALUES_FILE))
+    os.utime(source, (built - 10, built - 10))
+    assert not HistoryStore.is_stale(path, source)
+    os.utime(source, (built + 10, built + 10))
+    assert HistoryStore.is_stale(path, source)
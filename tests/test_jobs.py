@@ -0,0 +1,75 @@
+"""
+Фоновые задачи: объединение одинаковых запросов, ошибки и хеджированные вызовы с бюджетом
+"""
+import threading
+import time
+
+from jobs import JobRunner, hedged_call
+
+
+def wait_done(runner, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while not runner.get(job_id).done:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return runner.get(job_id)
+
+
+def test_identical_running_jobs_are_coalesced():
+    runner = JobRunner(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def work(report, value):
+        calls.append(value)
+        report(0.5, "Working...")
+        release.wait(5)
+        return value * 2
+
+    first = runner.submit(('forecast', 'a'), 'forecast', work, 21)
+    second = runner.submit(('forecast', 'a'), 'forecast', work, 21)
+    other = runner.submit(('forecast', 'b'), 'forecast', work, 1)
+    assert first == second != other
+    release.set()
+    assert wait_done(runner, first).result == 42
+    wait_done(runner, other)
+    assert sorted(calls) == [1, 21]
+    assert runner.stats == {'executed': 2, 'coalesced': 1}
+
+    # После завершения тот же ключ снова выполняется
+    assert runner.submit(('forecast', 'a'), 'forecast', work, 21) != first
+
+
+def test_failed_job_keeps_error_and_stage_timings():
+    runner = JobRunner(max_workers=1)
+
+    def fail(report):
+        report(0.2, "Loading...")
+        report(0.6, "Solving...")
+        raise ValueError("no data")
+
+    job = wait_done(runner, runner.submit(('x',), 'optimization', fail))
+    assert job.status == 'failed' and job.error == "no data" and job.result is None
+    assert list(job.stage_timings()) == ["Loading...", "Solving..."]
+
+
+def test_hedged_call_sources():
+    assert hedged_call(lambda timeout: 'ok', budget=1, hedge_after=0.5, fallback=lambda: 'local') == ('ok', 'primary')
+
+    timeouts = []
+
+    def slow_first(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) == 1:
+            time.sleep(0.5)
+        return len(timeouts)
+
+    assert hedged_call(slow_first, budget=0.4, hedge_after=0.1, fallback=lambda: 'local') == (2, 'hedge')
+    # Хеджированный запрос получает только оставшуюся часть бюджета
+    assert timeouts[0] == 0.4
+    assert 0.2 < timeouts[1] <= 0.3
+
+    def always_fail(timeout):
+        raise RuntimeError("API down")
+
+    assert hedged_call(always_fail, budget=0.3, hedge_after=0.05, fallback=lambda: 'local') == ('local', 'fallback')
@@ -0,0 +1,75 @@
+"""
+Статические отчеты: страницы по площадкам, операциям и месяцам, пропуск неизмененных страниц и архив
+"""
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from dashboards import executive_dashboard, operation_trend_chart
+from reports import INDEX_FILE, MANIFEST_FILE, PLOTLY_JS_FILE, archive_reports, generate_reports, page_path
+
+OPERATIONS = ['Direct_Overloading_20', 'Pallet_Cross_Docking']
+
+
+@pytest.fixture
+def site_data(warehouse_df):
+    # Исходная таблица и объединенная с одним прогнозным месяцем
+    forecast = warehouse_df.tail(1).copy()
+    forecast[forecast.columns[0]] = 'October'
+    combined = pd.concat([warehouse_df, forecast], ignore_index=True)
+    return warehouse_df, combined, 1, None
+
+
+def test_dashboard_and_trend_chart(site_data):
+    original_df, combined_df, forecast_rows, _ = site_data
+    month = str(original_df.iloc[0, 0]).strip()
+    dashboard = executive_dashboard(original_df, combined_df, OPERATIONS[0], month)
+    assert dashboard['metrics'] and dashboard['figures']
+    assert operation_trend_chart(combined_df, forecast_rows, OPERATIONS[0]).data
+
+
+def test_unchanged_pages_are_skipped(tmp_path, site_data):
+    output_dir = str(tmp_path / 'reports')
+    months = ['May', 'June']
+    first = generate_reports(output_dir, {'North': site_data}, operations=OPERATIONS, months=months, max_workers=1)
+    # Две операции x (два месяца + страница прогноза)
+    assert first == {'rendered': 6, 'skipped': 0, 'pages': 6}
+    assert os.path.exists(os.path.join(output_dir, f"{page_path('North', OPERATIONS[0], 'May')}.html"))
+
+    second = generate_reports(output_dir, {'North': site_data}, operations=OPERATIONS, months=months, max_workers=1)
+    assert second == {'rendered': 0, 'skipped': 6, 'pages': 6}
+
+    # Удаленная страница и измененные данные площадки перестраиваются
+    os.remove(os.path.join(output_dir, f"{page_path('North', OPERATIONS[1], None)}.html"))
+    assert generate_reports(output_dir, {'North': site_data}, operations=OPERATIONS, months=months,
+                            max_workers=1)['rendered'] == 1
+    original_df, combined_df, forecast_rows, intervals = site_data
+    changed = (original_df, combined_df.assign(**{OPERATIONS[0]: 0}), forecast_rows, intervals)
+    assert generate_reports(output_dir, {'North': changed}, operations=OPERATIONS, months=months,
+                            max_workers=1)['rendered'] == 6
+
+
+def test_concurrent_runs_take_turns(tmp_path, site_data):
+    # Две задачи с одним каталогом: вторая ждет первую и пропускает уже построенные страницы
+    output_dir = str(tmp_path / 'reports')
+    with ThreadPoolExecutor(max_workers=2) as threads:
+        runs = [threads.submit(generate_reports, output_dir, {'North': site_data}, operations=OPERATIONS,
+                               months=['May'], max_workers=1) for _ in range(2)]
+        results = sorted((run.result() for run in runs), key=lambda result: result['rendered'])
+    assert results == [{'rendered': 0, 'skipped': 4, 'pages': 4}, {'rendered': 4, 'skipped': 0, 'pages': 4}]
+    with open(os.path.join(output_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        assert len(json.load(f)) == 4
+    assert not [name for name in os.listdir(output_dir) if name.startswith('.tmp-')]
+
+
+def test_archive_contains_index_and_pages(tmp_path, site_data):
+    output_dir = str(tmp_path / 'reports')
+    generate_reports(output_dir, {'North': site_data}, operations=OPERATIONS[:1], months=['May'], max_workers=1)
+    with zipfile.ZipFile(io.BytesIO(archive_reports(output_dir))) as archive:
+        names = set(archive.namelist())
+    assert {INDEX_FILE, MANIFEST_FILE, PLOTLY_JS_FILE, f"{page_path('North', OPERATIONS[0], 'May')}.html"} <= names
@@ -0,0 +1,58 @@
+"""
+История запусков: сохранение и чтение таблиц, фильтры списка, сравнение и удаление запусков
+"""
+import pandas as pd
+import pytest
+
+from forecasting import SITE_COLUMN
+from run_history import RunHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    return RunHistory(str(tmp_path / 'runs.sqlite'))
+
+
+def make_table(loader, site='North'):
+    return pd.DataFrame({'Month': ['May', 'June'], SITE_COLUMN: [site, site],
+                         'Loader': loader, 'Sales': [120, 80]})
+
+
+def test_record_and_load_round_trip(history):
+    table = make_table([6, 7])
+    run_id = history.record_run('optimization', 'abc', {'Optimized': table}, model='milp', source='milp',
+                                parameters={'budget': 5}, output_text='raw', timings={'solve': 1.5, 'parse': 0.25},
+                                site='North')
+    run = history.load_run(run_id)
+
+    pd.testing.assert_frame_equal(run['tables']['Optimized'], table, check_dtype=False)
+    assert run['parameters'] == {'budget': 5}
+    assert run['output_text'] == 'raw'
+    assert run['timings'] == {'solve': 1.5, 'parse': 0.25}
+    assert history.find_runs('optimization', 'abc') == [run_id]
+    assert history.find_runs('forecast', 'abc') == []
+
+
+def test_list_runs_filters_and_duration(history):
+    first = history.record_run('optimization', 'a', {}, site='North', timings={'solve': 2.0})
+    second = history.record_run('forecast', 'b', {}, site='South')
+    runs = history.list_runs()
+    assert set(runs['run_id']) == {first, second}
+    assert history.list_runs(kind='forecast')['run_id'].tolist() == [second]
+    assert history.list_runs(site='North')['duration_s'].tolist() == [2.0]
+    assert history.list_runs(since='2999-01-01').empty
+
+
+def test_compare_and_delete(history):
+    run_a = history.record_run('optimization', 'a', {'Optimized': make_table([6, 7])})
+    run_b = history.record_run('optimization', 'a', {'Optimized': make_table([8, 7])})
+    comparison = history.compare_runs(run_a, run_b, 'Optimized')
+
+    loader = comparison[comparison['Column'] == 'Loader']
+    assert loader['Row'].tolist() == ['May', 'June']
+    assert loader['Change'].tolist() == [2.0, 0.0]
+
+    history.delete_run(run_b)
+    with pytest.raises(KeyError):
+        history.load_run(run_b)
+    assert history.compare_runs(run_a, run_b, 'Optimized').empty
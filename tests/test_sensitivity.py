@@ -0,0 +1,35 @@
+"""
+What-if перебор параметров: векторный расчет совпадает с расчетом по одному сценарию
+"""
+import dataclasses
+
+import numpy as np
+
+from sensitivity import build_parameter_grid, sweep_staffing, tornado_table
+from staffing import EMPLOYEE_COLUMNS, SWEEP_PARAMETERS, StaffingParameters, compute_rule_based_staff, operations_matrix
+
+
+def test_grid_is_full_cartesian_product():
+    grid = build_parameter_grid()
+    assert len(grid) == 3 ** len(SWEEP_PARAMETERS)
+    assert not grid.duplicated().any()
+
+
+def test_sweep_matches_scalar_rule_based(warehouse_df):
+    sweep = sweep_staffing(warehouse_df)
+    operations = operations_matrix(warehouse_df)
+    for row in sweep.sample(20, random_state=0).itertuples(index=False):
+        params = dataclasses.replace(StaffingParameters(), **{name: getattr(row, name) for name in SWEEP_PARAMETERS})
+        staff = compute_rule_based_staff(operations, params).sum(axis=0)
+        assert [getattr(row, col) for col in EMPLOYEE_COLUMNS] == staff.tolist()
+        assert row.Total_staff == staff.sum()
+
+
+def test_tornado_changes_are_one_at_a_time(warehouse_df):
+    sweep = sweep_staffing(warehouse_df)
+    tornado = tornado_table(sweep, role='Loader').set_index('Parameter')
+    base = compute_rule_based_staff(operations_matrix(warehouse_df))[:, EMPLOYEE_COLUMNS.index('Loader')].sum()
+    low = dataclasses.replace(StaffingParameters(), cross_hours=StaffingParameters.cross_hours * 0.75)
+    low_total = compute_rule_based_staff(operations_matrix(warehouse_df), low)[:, EMPLOYEE_COLUMNS.index('Loader')].sum()
+    assert tornado.loc['cross_hours', 'Low change'] == low_total - base
+    assert np.isfinite(tornado['Range']).all()
@@ -0,0 +1,58 @@
+"""
+Общая память для пула процессов: результат пула совпадает с последовательным расчетом, блоки освобождаются
+"""
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import shared_arrays
+from shared_arrays import POOL_CONTEXT, SharedArray, map_rows
+
+
+def _scaled_row_sums(inputs, output, rows, scale=1.0):
+    # Воркер: сумма первых lengths[i] значений строки i и ее максимум
+    for row in rows:
+        values = inputs['values'][row, :inputs['lengths'][row]]
+        output[row] = values.sum() * scale, values.max()
+
+
+@pytest.fixture
+def inputs():
+    rng = np.random.default_rng(5)
+    return {'values': rng.normal(size=(23, 12)), 'lengths': rng.integers(1, 13, 23)}
+
+
+def test_pool_matches_sequential(inputs):
+    sequential = map_rows(_scaled_row_sums, inputs, (23, 2), max_workers=1, scale=2.0)
+    pooled = map_rows(_scaled_row_sums, inputs, (23, 2), max_workers=2, chunk_size=4, scale=2.0)
+
+    expected = np.array([(row[:n].sum() * 2.0, row[:n].max()) for row, n in zip(inputs['values'], inputs['lengths'])])
+    np.testing.assert_allclose(sequential, expected)
+    np.testing.assert_array_equal(pooled, sequential)
+
+
+def test_background_thread_runs_in_process(inputs, monkeypatch):
+    # Как в фоновой задаче приложения: пул процессов не создается, результат тот же
+    sequential = map_rows(_scaled_row_sums, inputs, (23, 2), max_workers=1)
+    monkeypatch.setattr(shared_arrays, 'process_pool', None)
+    with ThreadPoolExecutor(max_workers=1) as thread:
+        result = thread.submit(map_rows, _scaled_row_sums, inputs, (23, 2), max_workers=2).result()
+    np.testing.assert_array_equal(result, sequential)
+    assert POOL_CONTEXT.get_start_method() == 'spawn'
+
+
+def test_shared_array_round_trip_and_unlink():
+    source = np.arange(6, dtype=np.int64).reshape(2, 3)
+    with SharedArray.from_array(source) as shared:
+        name = shared.spec[0]
+        attached = SharedArray.attach(shared.spec)
+        attached.array[1, 2] = 50
+        attached.close()
+        assert shared.array[1, 2] == 50
+        assert shared.array.dtype == source.dtype
+
+    # Владелец удаляет блок при закрытии
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
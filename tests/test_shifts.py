@@ -0,0 +1,58 @@
+"""
+План смен: Erlang C против формулы в замкнутом виде, минимальное число серверов и почасовые прибытия
+"""
+import math
+
+import numpy as np
+import pytest
+
+from shifts import ShiftParameters, compute_shift_plan, erlang_c_waits, hourly_arrival_rates, required_servers
+from staffing import OPERATION_COLUMNS
+
+
+def closed_form_wait(arrival_rate, service_hours, servers):
+    # Wq = C(c, a) / (c * mu - lambda), C(c, a) - вероятность ожидания по формуле Erlang C
+    load = arrival_rate * service_hours
+    if load >= servers:
+        return math.inf
+    top = load ** servers / math.factorial(servers) * servers / (servers - load)
+    wait_probability = top / (sum(load ** k / math.factorial(k) for k in range(servers)) + top)
+    return wait_probability / (servers / service_hours - arrival_rate)
+
+
+@pytest.mark.parametrize('arrival_rate, service_hours', [(0.5, 1.0), (2.0, 1.5), (3.7, 0.8), (0.05, 4.0)])
+def test_erlang_c_matches_closed_form(arrival_rate, service_hours):
+    waits = erlang_c_waits(np.array([arrival_rate]), service_hours, max_servers=8)[:, 0]
+    expected = [closed_form_wait(arrival_rate, service_hours, servers) for servers in range(1, 9)]
+    np.testing.assert_allclose(waits, expected, rtol=1e-10)
+
+
+def test_required_servers_is_minimal():
+    rates = np.array([0.0, 0.5, 2.0, 3.7, 50.0])
+    servers, overloaded = required_servers(rates, 1.0, target_wait_hours=0.25, max_servers=6)
+
+    assert servers[0] == 0 and not overloaded[0]
+    for rate, count in zip(rates[1:4], servers[1:4]):
+        assert closed_form_wait(rate, 1.0, count) <= 0.25
+        assert count == 1 or closed_form_wait(rate, 1.0, count - 1) > 0.25
+    assert overloaded.tolist() == [False, False, False, False, True]
+    assert servers[4] == 6
+
+
+def test_hourly_rates_keep_monthly_volume():
+    params = ShiftParameters()
+    operations = np.arange(1, 1 + len(OPERATION_COLUMNS), dtype=float)[None] * 40
+    rates = hourly_arrival_rates(operations, params)
+
+    assert rates.shape == (1, 5, 24, len(OPERATION_COLUMNS))
+    weekly = rates.sum(axis=(1, 2)) / len(params.weekday_profile) * params.working_days_per_month
+    np.testing.assert_allclose(weekly, operations)
+    assert rates[0, :, :8].sum() == 0
+
+
+def test_shift_staffing_follows_peak_hour():
+    operations = np.full((2, len(OPERATION_COLUMNS)), 60.0)
+    plan = compute_shift_plan(operations)
+    assert plan['shift_loaders'].shape == (2, 5, 1)
+    np.testing.assert_array_equal(plan['shift_loaders'][..., 0], plan['hourly_loaders'][..., 8:16].max(axis=-1))
+    assert (plan['hourly_brigades'] <= ShiftParameters().max_parallel_operations).all()
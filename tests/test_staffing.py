@@ -0,0 +1,85 @@
+"""
+Точная MILP-оптимизация персонала: покрытие обязанностей, лимиты ролей и параллельность
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from staffing import (DUTIES, EMPLOYEE_COLUMNS, OPERATION_COLUMNS, StaffingParameters, compute_duty_hours,
+                      compute_rule_based_staff, optimize_employees_milp, solve_staffing_milp, unmet_hours_frame)
+
+
+def operations_row(**values):
+    return np.array([[values.get(col, 0) for col in OPERATION_COLUMNS]], dtype=float)
+
+
+def solve(**values):
+    params = StaffingParameters()
+    staff, unmet = solve_staffing_milp(compute_duty_hours(operations_row(**values), params), params)
+    return dict(zip(EMPLOYEE_COLUMNS, staff[0])), dict(zip(DUTIES, unmet[0]))
+
+
+def test_minimums_cover_small_demand():
+    # 100 паллетных часов: один оператор (160 ч) возит и помогает 60 ч, остальное - минимальные 2 грузчика;
+    # координацию (40 ч) делят Director (20 ч) и менеджеры
+    staff, unmet = solve(Pallet_Direct_Overloading=100)
+    assert staff == {'Director': 1, 'Sales': 1, 'Operation_manager': 2, 'Loader': 2, 'Forklift_Operator': 1}
+    assert sum(unmet.values()) == pytest.approx(0)
+
+
+def test_forklift_spare_hours_replace_a_loader():
+    # Паллеты: 170 ч вождения -> 2 оператора, 150 свободных часов уходят на помощь (170 ч).
+    # Ручные: 80 x 3 ч x 4 = 960 ч; грузчики закрывают 960 + 20 = 980 ч -> 7, а не ceil(1130 / 160) = 8
+    staff, unmet = solve(Pallet_Direct_Overloading=170, Direct_Overloading_20=80)
+    assert staff['Forklift_Operator'] == 2
+    assert staff['Loader'] == 7
+    assert sum(unmet.values()) == pytest.approx(0)
+
+
+def test_manager_cap_leaves_unmet_hours():
+    # 1000 офисных операций = 1066.7 ч + 20 ч координации сверх Director, у 5 менеджеров 800 ч
+    staff, unmet = solve(Other_revenue=1000)
+    assert staff['Operation_manager'] == 5
+    assert unmet['office'] + unmet['coordination'] == pytest.approx(1000 * 160 / 150 + 20 - 800)
+
+
+def test_parallel_operations_cap_manual_handling():
+    # 700 x 3 ч x 4 = 8400 ч, а 3 бригады по 4 человека успевают 3 x 4 x 160 = 1920 ч
+    staff, unmet = solve(Direct_Overloading_20=700)
+    assert unmet['manual_handling'] == pytest.approx(8400 - 1920)
+    # Лишние грузчики не помогают: свободный оператор погрузчика добирает последние 160 ч
+    assert staff['Loader'] == 11
+
+
+def test_batch_matches_single_rows():
+    params = StaffingParameters()
+    rng = np.random.default_rng(0)
+    operations = rng.integers(0, 120, size=(6, len(OPERATION_COLUMNS))).astype(float)
+    duty_hours = compute_duty_hours(operations, params)
+    batch_staff, batch_unmet = solve_staffing_milp(duty_hours, params)
+    for i in range(len(operations)):
+        staff, unmet = solve_staffing_milp(duty_hours[i:i + 1], params)
+        np.testing.assert_array_equal(batch_staff[i], staff[0])
+        np.testing.assert_allclose(batch_unmet[i].sum(), unmet[0].sum(), atol=1e-6)
+
+
+def test_optimized_frame_and_unmet_report():
+    df = pd.DataFrame([['May'] + list(operations_row(Other_revenue=1000)[0]) + [1, 1, 2, 2, 1],
+                       ['June '] + list(operations_row(Other_revenue=100)[0]) + [1, 1, 2, 2, 1]],
+                      columns=['Month'] + OPERATION_COLUMNS + EMPLOYEE_COLUMNS)
+    optimized = optimize_employees_milp(df)
+    assert list(optimized.columns) == list(df.columns)
+    assert optimized['Operation_manager'].tolist() == [5, 2]
+
+    unmet = unmet_hours_frame(df)
+    assert unmet['Month'].tolist() == ['May']
+    assert unmet['Total'].iloc[0] == pytest.approx(1000 * 160 / 150 + 20 - 800)
+
+
+def test_rule_based_matches_prompt_example():
+    # Пример из промпта: май - (6+40)x3 + (2+0)x5 = 148 ч -> 3.7 -> 4 Loader
+    staff = compute_rule_based_staff(operations_row(Direct_Overloading_20=6, Direct_Overloading_40=40,
+                                                    Cross_Docking_20=2, Pallet_Direct_Overloading=73,
+                                                    Pallet_Cross_Docking=93))
+    assert dict(zip(EMPLOYEE_COLUMNS, staff[0]))['Loader'] == 4
+    assert dict(zip(EMPLOYEE_COLUMNS, staff[0]))['Forklift_Operator'] == 2
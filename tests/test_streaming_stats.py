@@ -0,0 +1,68 @@
+"""
+Потоковые ковариации и корреляции против pandas
+"""
+import numpy as np
+import pandas as pd
+
+from streaming_stats import AppendOnlyCovariance, StreamingCovariance
+
+
+def sample_frame(rows=200, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(rows, 1))
+    values = np.hstack([base + rng.normal(scale=s, size=(rows, 1)) for s in (0.1, 1.0, 5.0)]) * 1000 + 5e6
+    values[rng.random(values.shape) < 0.1] = np.nan  # попарные пропуски
+    return pd.DataFrame(values, columns=['a', 'b', 'c'])
+
+
+def test_matches_pandas_with_missing_values():
+    df = sample_frame()
+    accumulator = StreamingCovariance.from_frame(df, df.columns)
+    np.testing.assert_allclose(accumulator.correlation().to_numpy(), df.corr().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(accumulator.covariance().to_numpy(), df.cov().to_numpy(), rtol=1e-9)
+
+
+def test_row_by_row_and_merged_partitions_match_batch():
+    df = sample_frame(rows=60, seed=1)
+    rows = StreamingCovariance(df.columns)
+    for row in df.to_numpy():
+        rows.update(row)
+    left = StreamingCovariance.from_frame(df.iloc[:25], df.columns)
+    merged = left.merge(StreamingCovariance.from_frame(df.iloc[25:], df.columns))
+    expected = df.corr().to_numpy()
+    np.testing.assert_allclose(rows.correlation().to_numpy(), expected, rtol=1e-9)
+    np.testing.assert_allclose(merged.correlation().to_numpy(), expected, rtol=1e-9)
+
+
+def test_by_site_accumulators():
+    df = sample_frame(rows=40)
+    df['Site'] = ['A', 'B'] * 20
+    accumulators = StreamingCovariance.by_site(df, ['a', 'b', 'c'])
+    site_a = df[df['Site'] == 'A'][['a', 'b', 'c']]
+    np.testing.assert_allclose(accumulators['A'].correlation().to_numpy(), site_a.corr().to_numpy(), rtol=1e-9)
+
+
+def test_constant_column_has_no_correlation():
+    df = pd.DataFrame({'a': [1.0, 2.0, 3.0], 'b': [5.0, 5.0, 5.0]})
+    correlation = StreamingCovariance.from_frame(df, ['a', 'b']).correlation()
+    assert np.isnan(correlation.loc['a', 'b'])
+    assert correlation.loc['a', 'a'] == 1.0
+
+
+def test_append_only_sync_reads_only_new_rows(monkeypatch):
+    df = sample_frame(rows=80, seed=2)
+    tracker = AppendOnlyCovariance(df.columns)
+    tracker.sync(df.iloc[:50])
+
+    updates = []
+    original_update = StreamingCovariance.update
+    monkeypatch.setattr(StreamingCovariance, 'update', lambda self, rows: updates.append(len(rows)) or original_update(self, rows))
+    accumulator = tracker.sync(df)
+    assert updates == [30]
+    np.testing.assert_allclose(accumulator.correlation().to_numpy(), df.corr().to_numpy(), rtol=1e-9)
+
+    # Измененная история - пересчет с нуля
+    edited = df.copy()
+    edited.iloc[-1, 0] += 1
+    np.testing.assert_allclose(tracker.sync(edited).covariance().to_numpy(), edited.cov().to_numpy(), rtol=1e-9)
+    assert updates == [30, 80]
@@ -0,0 +1,49 @@
+"""
+Индекс постраничного показа: фильтры, сортировка и страницы против тех же операций pandas
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import SITE_COLUMN
+from tables import TableIndex, label_columns
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(3)
+    months = ['May', 'June', 'July', 'August', 'September'] * 6
+    sites = np.repeat(['North', 'South', 'East'], 10)
+    return pd.DataFrame({'Month': months, SITE_COLUMN: sites,
+                         'Loader': rng.integers(0, 20, 30).astype(str), 'Sales': rng.integers(0, 100, 30)})
+
+
+def test_label_and_value_columns(table):
+    index = TableIndex(table)
+    assert label_columns(table) == ['Month', SITE_COLUMN]
+    assert index.value_columns == ['Loader', 'Sales']
+    assert index.frame['Loader'].dtype.kind == 'i'
+    assert len(index) == len(table)
+
+
+def test_query_matches_pandas_filter_and_sort(table):
+    index = TableIndex(table)
+    frame = index.frame
+    filters = {'Month': ['June', 'July'], SITE_COLUMN: ['South']}
+    positions = index.query(filters, sort_by='Sales', ascending=False)
+
+    expected = frame[frame['Month'].isin(filters['Month']) & frame[SITE_COLUMN].isin(filters[SITE_COLUMN])]
+    assert sorted(positions.tolist()) == expected.index.tolist()
+    assert frame['Sales'].to_numpy()[positions].tolist() == sorted(expected['Sales'], reverse=True)
+
+    # Пустой список значений фильтра не ограничивает выборку, без сортировки - исходный порядок
+    assert index.query({'Month': []}).tolist() == list(range(len(table)))
+
+
+def test_page_slices_rows_and_keeps_label_columns(table):
+    index = TableIndex(table)
+    positions = index.query(sort_by='Sales')
+    page = index.page(positions, page=2, page_size=8, columns=['Sales'])
+    assert list(page.columns) == ['Month', SITE_COLUMN, 'Sales']
+    assert page.index.tolist() == positions[8:16].tolist()
+    assert index.page(positions, page=4, page_size=8).shape[0] == len(table) - 24
@@ -0,0 +1,51 @@
+"""
+Телеметрия: спаны, сводка по этапам, выгрузка в JSONL и формат Prometheus
+"""
+import json
+
+import pytest
+
+from telemetry import Telemetry
+
+
+@pytest.fixture
+def telemetry():
+    telemetry = Telemetry(max_spans=5)
+    for seconds in (0.01, 0.02, 0.03):
+        telemetry.record('load_data', seconds)
+    telemetry.record('render', 0.5, alloc_bytes=2048)
+    return telemetry
+
+
+def test_summary_per_stage(telemetry):
+    summary = telemetry.summary().set_index('stage')
+    assert summary.loc['load_data', 'count'] == 3
+    assert summary.loc['load_data', 'p50_ms'] == pytest.approx(20)
+    assert summary.loc['render', 'mean_alloc_kb'] == 2
+    assert summary.index[0] == 'render'  # сортировка по общему времени
+    assert Telemetry().summary().empty
+
+
+def test_span_decorator_and_ring_buffer(telemetry):
+    @telemetry.timed('parse')
+    def parse(value):
+        return value * 2
+
+    assert parse(4) == 8
+    with pytest.raises(RuntimeError):
+        with telemetry.span('failing', site='North'):
+            raise RuntimeError
+    spans = telemetry.spans()
+    assert len(spans) == 5
+    assert [span['stage'] for span in spans[-2:]] == ['parse', 'failing']
+    assert spans[-1]['site'] == 'North'
+
+
+def test_exports(telemetry):
+    lines = telemetry.to_jsonl().strip().split('\n')
+    assert [json.loads(line)['stage'] for line in lines] == ['load_data'] * 3 + ['render']
+
+    prometheus = telemetry.to_prometheus(metric='app_seconds')
+    assert 'app_seconds_count{stage="load_data"} 3' in prometheus
+    assert 'app_seconds_sum{stage="render"} 0.500000' in prometheus
+    assert 'app_seconds{stage="load_data",quantile="0.5"} 0.020000' in prometheus